@@ -1,16 +1,20 @@
 import streamlit as st
-import os
-import requests
+import time
 from dotenv import load_dotenv
-from pathlib import Path
 
 # Import modules
-from modules.auth_service import AuthService
-from modules.data_layer import DataLayer
-from modules.website_checker import WebsiteChecker
+from modules.services import get_services
+from modules.session_snapshot import get_session_snapshot, clear_session_snapshot
+from modules.practice_counters import count_practices
+from modules.metrics import metrics
+from modules.profiler import profiler
+
+render_started = time.perf_counter()
+profiler.start_rerun('home')
 
 # Load environment variables
 load_dotenv()
+metrics.configure()
 
 # Configure page
 st.set_page_config(
@@ -20,15 +24,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize services
-@st.cache_resource
-def initialize_services():
-    data_layer = DataLayer()
-    auth_service = AuthService(data_layer)
-    website_checker = WebsiteChecker(data_layer)
-    return data_layer, auth_service, website_checker
-
-data_layer, auth_service, website_checker = initialize_services()
+# Initialize services, shared by all pages
+data_layer, auth_service, website_checker = get_services()
 
 # Set up session state
 if 'user' not in st.session_state:
@@ -50,6 +47,7 @@ def login():
 def logout():
     st.session_state.user = None
     st.session_state.logged_in = False
+    clear_session_snapshot()
 
 # Sidebar
 with st.sidebar:
@@ -93,14 +91,14 @@ else:
     # Quick stats
     col1, col2, col3 = st.columns(3)
     with col1:
-        practices = data_layer.get_practices_by_user(st.session_state.user['userId'])
-        st.metric("Huisartsenpraktijken", len(practices))
+        practices = get_session_snapshot(data_layer, st.session_state.user['userId']).get_practices()
+        # Counters are kept per user; a user the counters do not know yet is counted from the list
+        counts = data_layer.get_practice_counters().get(st.session_state.user['userId']) or count_practices(practices)
+        st.metric("Huisartsenpraktijken", counts['total'])
     with col2:
-        accepting_count = sum(1 for p in practices if p.get('status') == 'ACCEPTING')
-        st.metric("Open voor inschrijving", accepting_count)
+        st.metric("Open voor inschrijving", counts['ACCEPTING'])
     with col3:
-        not_accepting_count = sum(1 for p in practices if p.get('status') == 'NOT_ACCEPTING')
-        st.metric("Gesloten voor inschrijving", not_accepting_count)
+        st.metric("Gesloten voor inschrijving", counts['NOT_ACCEPTING'])
     
     # Recent practices
     if practices:
@@ -110,4 +108,7 @@ else:
             st.write(f"{status_color} **{practice.get('name')}** - {practice.get('websiteUrl')}")
         st.button("Alle huisartsenpraktijken bekijken", type="primary", help="Ga naar de pagina met huisartsenpraktijken")
     else:
-        st.info("Je hebt nog geen huisartsenpraktijken toegevoegd. Ga naar 'Huisartsenpraktijken' om te beginnen.")
\ No newline at end of file
+        st.info("Je hebt nog geen huisartsenpraktijken toegevoegd. Ga naar 'Huisartsenpraktijken' om te beginnen.")
+
+metrics.observe('page_render_seconds', time.perf_counter() - render_started, page='home')
+profiler.stop_rerun()
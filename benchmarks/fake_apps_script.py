@@ -0,0 +1,258 @@
+"""
+Local HTTP server that imitates the Google Apps Script OpenAI bridge.
+
+It answers the 'testConnection', 'analyzeWebsite', 'submitAnalysis' and
+'getAnalyses' actions of the script in the README, with a configurable delay and error rates, so the website
+checks can be benchmarked without calling OpenAI. Like the script, it
+returns the analyzed page text, made up by practice_page_text, and works
+through the submitted jobs with one processor that analyzes up to
+batch_size of them at a time.
+"""
+
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATUSES = ('ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN')
+STATUS_TEXTS = {
+    'ACCEPTING': 'Wij nemen nieuwe patiënten aan uit de postcodegebieden rond de praktijk. Inschrijven kan met het inschrijfformulier.',
+    'NOT_ACCEPTING': 'Helaas nemen wij op dit moment geen nieuwe patiënten aan. U kunt zich aanmelden voor de wachtlijst.',
+    'UNKNOWN': 'Neem voor vragen over inschrijven contact op met de assistente.'
+}
+TEAM = ('Jansen', 'de Vries', 'van den Berg', 'Bakker', 'Visser', 'Smit', 'Meijer', 'de Boer', 'Mulder', 'de Groot')
+DAYS = ('maandag', 'dinsdag', 'woensdag', 'donderdag', 'vrijdag')
+NEWS = ('gesloten wegens scholing', "'s middags beperkt bereikbaar", 'verhuisd naar de nieuwe locatie')
+
+def practice_page_text(url, status, revision=0):
+    """
+    Make up the text of a practice website, as the Apps Script extracts it.
+
+    The same URL always gets the same page; the registration paragraph
+    follows the status, and every revision adds a news item and now and
+    then changes the opening hours, like pages that are edited over time.
+    """
+    site = random.Random(url)
+    team = site.sample(TEAM, 4)
+    paragraphs = [
+        f'Huisartsenpraktijk {team[0]} Welkom op de website van onze praktijk. '
+        f'De praktijk wordt gevoerd door dokter {team[0]} en dokter {team[1]}, '
+        f'met de praktijkondersteuners {team[2]} en {team[3]}.',
+        STATUS_TEXTS.get(status, STATUS_TEXTS['UNKNOWN']),
+        'Openingstijden ' + ' '.join(
+            f'{day} 08:00 tot {17 + (site.randrange(2) + revision // 10 + index) % 2}:00'
+            for index, day in enumerate(DAYS)
+        ),
+        'Spoed Bel bij spoed altijd eerst 112. Voor dringende zaken buiten kantoortijden belt u de huisartsenpost.',
+        'Herhaalrecepten U kunt herhaalrecepten aanvragen via de receptenlijn of het patiëntenportaal. '
+        'Recepten die voor 10:00 zijn aangevraagd liggen de volgende werkdag na 15:00 klaar bij de apotheek.',
+        'Praktijkinformatie Afspraken maakt u telefonisch tussen 08:00 en 10:00. Een consult duurt tien minuten; '
+        'heeft u meer klachten, vraag dan om een dubbel consult. Huisbezoeken zijn voor patiënten die echt niet naar de praktijk kunnen komen.'
+    ]
+    news = [
+        f'Nieuws {1 + item % 28} {DAYS[item % 5]}: de praktijk is {NEWS[(item + site.randrange(3)) % 3]}.'
+        for item in range(max(0, revision - 4), revision + 1)
+    ]
+    return ' '.join(paragraphs + news)
+
+class FakeAppsScript:
+    """
+    Fake Apps Script endpoint on localhost.
+
+    Args:
+        delay (float): Seconds every analysis takes; the processor takes
+            up to batch_size submitted jobs from the queue, finishes them
+            together after the delay (the script fetches them in parallel)
+            and posts them to their callback URL, if any
+        batch_size (int): Jobs analyzed at a time, ANALYSIS_BATCH_SIZE in
+            the script
+        error_rate (float): Fraction of analyses that fail with
+            success: false, like the script does when OpenAI fails
+        server_error_rate (float): Fraction of requests that get an HTTP 500
+        seed (int): Seed for the random errors, for repeatable runs
+        status_for (callable): Gives the status of an analyzed URL; by
+            default the same URL always gets the same random status
+    """
+
+    def __init__(self, delay=0.0, error_rate=0.0, server_error_rate=0.0, seed=None, status_for=None, batch_size=20):
+        self.delay = delay
+        self.batch_size = batch_size
+        self.status_for = status_for
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.requests = 0
+        self.errors = 0
+        self.callbacks = 0
+        self.jobs = {}  # job id -> result, None while queued or running
+        self._queue = []  # (job id, url, roll, callback URL) in submit order
+        self._processor = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/exec'
+
+    def start(self):
+        """Start serving on a free port in a background thread"""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-apps-script', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, request):
+        """
+        Answer a request of the Streamlit application.
+
+        Returns:
+            tuple: (HTTP status code, response dict)
+        """
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+        if roll < self.server_error_rate:
+            with self._lock:
+                self.errors += 1
+            return 500, {'success': False, 'message': 'Internal server error'}
+
+        action = request.get('action')
+        if action == 'testConnection':
+            return 200, {'success': True, 'message': 'Verbinding met Google Apps Script is succesvol'}
+        if action == 'getAnalyses':
+            with self._lock:
+                jobs = {job_id: self._job_state(job_id) for job_id in request.get('jobIds', [])}
+            return 200, {'success': True, 'jobs': jobs}
+        if action not in ('analyzeWebsite', 'submitAnalysis'):
+            return 200, {'success': False, 'message': f'Onbekende actie: {action}'}
+        if not request.get('url'):
+            return 200, {'success': False, 'message': 'Geen URL opgegeven'}
+
+        if action == 'submitAnalysis':
+            job_id = str(uuid.uuid4())
+            with self._lock:
+                self.jobs[job_id] = None
+                self._queue.append((job_id, request['url'], roll, request.get('callbackUrl')))
+                # Like the trigger, start a processor unless one is running
+                if self._processor is None:
+                    self._processor = threading.Thread(target=self._process_jobs, name='fake-apps-script-jobs', daemon=True)
+                    self._processor.start()
+            return 200, {'success': True, 'jobId': job_id}
+
+        if self.delay:
+            time.sleep(self.delay)
+        return 200, self._analysis(request['url'], roll)
+
+    def _job_state(self, job_id):
+        if job_id not in self.jobs:
+            return {'done': True, 'result': {'success': False, 'message': 'Onbekende taak'}}
+        if self.jobs[job_id] is None:
+            return {'done': False}
+        return {'done': True, 'result': self.jobs[job_id]}
+
+    def _process_jobs(self):
+        """Analyze the queued jobs batch_size at a time until the queue is empty"""
+        while True:
+            with self._lock:
+                batch = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+                if not batch:
+                    self._processor = None
+                    return
+            if self.delay:
+                time.sleep(self.delay)
+            for job in batch:
+                self._finish_job(*job)
+
+    def _finish_job(self, job_id, url, roll, callback_url):
+        """Store the result of a submitted job and post it to its callback URL"""
+        result = self._analysis(url, roll)
+        with self._lock:
+            self.jobs[job_id] = result
+        if callback_url:
+            request = urllib.request.Request(
+                callback_url,
+                data=json.dumps({'jobId': job_id, 'result': result}).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}
+            )
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+                with self._lock:
+                    self.callbacks += 1
+            except OSError:
+                # Like the script, leave the result for polling
+                pass
+
+    def _analysis(self, url, roll):
+        """The analysis result of a URL, failed when the roll falls in the error rate"""
+        if roll < self.server_error_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return {
+                'success': False,
+                'status': 'UNKNOWN',
+                'message': 'Fout bij verwerken OpenAI-antwoord: rate limit',
+                'url': url,
+                'timestamp': datetime.now().isoformat()
+            }
+
+        # The same URL always gets the same status, like the mock analysis
+        status = self.status_for(url) if self.status_for else STATUSES[sum(ord(c) for c in url) % len(STATUSES)]
+        return {
+            'success': True,
+            'status': status,
+            'confidence': 90,
+            'details': {
+                'waitingList': status == 'NOT_ACCEPTING',
+                'conditions': [],
+                'waitingTime': None,
+                'contactInfo': None
+            },
+            'reasoning': f'Fake analysis of {url}',
+            'url': url,
+            'timestamp': datetime.now().isoformat(),
+            'pageText': practice_page_text(url, status)
+        }
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    request = {}
+                status_code, response = fake.handle(request)
+                body = json.dumps(response).encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep the benchmark output readable
+                pass
+
+        return Handler
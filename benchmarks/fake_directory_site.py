@@ -0,0 +1,159 @@
+"""
+Local static site that imitates a directory of general practices.
+
+The home page links to a number of regions; every region lists practice
+websites over a few pages that link to each other. Some practices are listed
+in two regions, robots.txt keeps crawlers out of /beheer/ and the pages
+also link to sites that are not practices, so the discovery crawler
+(modules/discovery.py) can be benchmarked and checked without the internet.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class FakeDirectorySite:
+    """
+    Fake practice directory on localhost.
+
+    Args:
+        name (str): Name of the directory, part of the practice domains
+        regions (int): Regions linked from the home page
+        pages_per_region (int): Listing pages per region
+        practices_per_page (int): Practices listed per page
+        delay (float): Seconds every page takes
+        crawl_delay (float): Crawl-delay in robots.txt, if given
+    """
+
+    def __init__(self, name='gids', regions=5, pages_per_region=3, practices_per_page=20, delay=0.0, crawl_delay=None):
+        self.name = name
+        self.regions = regions
+        self.pages_per_region = pages_per_region
+        self.practices_per_page = practices_per_page
+        self.delay = delay
+        self.crawl_delay = crawl_delay
+        self.requests = 0
+        self.disallowed_requests = 0  # Requests for pages that robots.txt disallows
+        self.concurrent = 0
+        self.max_concurrent = 0  # Most requests served at the same time
+        self.paths = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def practice_urls(self):
+        """The home pages of all listed practices, as the crawler should find them"""
+        return {
+            self._practice_url(region, page, index)
+            for region in range(self.regions)
+            for page in range(self.pages_per_region)
+            for index in range(self.practices_per_page)
+        }
+
+    def start(self):
+        """Start serving on a free port in a background thread"""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f'fake-directory-{self.name}', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def page(self, path):
+        """
+        Render a page of the directory.
+
+        Returns:
+            tuple: (HTTP status code, content type, body)
+        """
+        parts = urlsplit(path)
+        if parts.path == '/robots.txt':
+            lines = ['User-agent: *', 'Disallow: /beheer/']
+            if self.crawl_delay:
+                lines.append(f'Crawl-delay: {self.crawl_delay}')
+            return 200, 'text/plain', '\n'.join(lines) + '\n'
+        if parts.path.startswith('/beheer/'):
+            with self._lock:
+                self.disallowed_requests += 1
+            return 200, 'text/html', '<html><body><a href="/beheer/export">Export</a></body></html>'
+        if parts.path in ('', '/'):
+            links = [f'<li><a href="/regio/{region}/">Regio {region}</a></li>' for region in range(self.regions)]
+            links.append('<li><a href="/beheer/">Beheer</a></li>')
+            links.append('<li><a href="https://www.example.org/over-ons">Over deze gids</a></li>')
+            return 200, 'text/html; charset=utf-8', _html(f'Huisartsengids {self.name}', links)
+        if parts.path.startswith('/regio/'):
+            try:
+                region = int(parts.path.strip('/').split('/')[1])
+                page = int(parse_qs(parts.query).get('pagina', ['0'])[0])
+            except (IndexError, ValueError):
+                return 404, 'text/plain', 'Niet gevonden'
+            if region >= self.regions or page >= self.pages_per_region:
+                return 404, 'text/plain', 'Niet gevonden'
+            links = [
+                f'<li><a href="{self._practice_url(region, page, index)}/contact#adres">'
+                f'Huisartsenpraktijk {self.name} {region}-{page}-{index}</a></li>'
+                for index in range(self.practices_per_page)
+            ]
+            # The first practice of the next region is listed here as well, with a generic link text
+            if region + 1 < self.regions:
+                links.append(f'<li><a href="{self._practice_url(region + 1, 0, 0)}/">Bezoek website</a></li>')
+            links.append('<li><a href="/">Terug naar de gids</a></li>')
+            links.append('<li><a href="/folder.pdf">Folder (pdf)</a></li>')
+            links.extend(
+                f'<li><a href="/regio/{region}/?pagina={other}">{other + 1}</a></li>'
+                for other in range(self.pages_per_region) if other != page
+            )
+            return 200, 'text/html; charset=utf-8', _html(f'Regio {region}, pagina {page + 1}', links)
+        return 404, 'text/plain', 'Niet gevonden'
+
+    def _practice_url(self, region, page, index):
+        return f'https://www.huisarts-{self.name}-{region}-{page}-{index}.nl'
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    fake.paths.append(self.path)
+                    fake.concurrent += 1
+                    fake.max_concurrent = max(fake.max_concurrent, fake.concurrent)
+                try:
+                    if fake.delay:
+                        time.sleep(fake.delay)
+                    status_code, content_type, body = fake.page(self.path)
+                    body = body.encode('utf-8')
+                    self.send_response(status_code)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with fake._lock:
+                        fake.concurrent -= 1
+
+            def log_message(self, format, *args):
+                # Keep the benchmark output readable
+                pass
+
+        return Handler
+
+def _html(title, links):
+    return f'<html><head><title>{title}</title></head><body><h1>{title}</h1><ul>{"".join(links)}</ul></body></html>'
@@ -0,0 +1,130 @@
+"""
+Local static sites of general practices, for the registration-page locator.
+
+One server hosts many practices under /p<number>/. Like on real practice
+websites, the registration information is on the home page for some
+practices, on a page linked from the home page for others, and one level
+deeper (under "Praktijkinformatie") for the rest, between pages about the
+team, opening hours and emergencies.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REGISTRATION_TEXT = (
+    '<p>Wij nemen nieuwe patiënten aan uit postcodegebied 1011-1018. '
+    'Inschrijven kan met het inschrijfformulier.</p>'
+)
+
+class FakePracticeSite:
+    """
+    Fake practice websites on localhost.
+
+    Args:
+        practices (int): Number of practice sites
+        delay (float): Seconds every page takes
+    """
+
+    def __init__(self, practices=20, delay=0.0):
+        self.practices = practices
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def website_url(self, number):
+        return f'{self.url}/p{number}/'
+
+    def registration_path(self, number):
+        """Path of the page that holds the registration information of a practice"""
+        return [f'/p{number}/', f'/p{number}/nieuwe-patienten', f'/p{number}/praktijkinformatie/inschrijven'][number % 3]
+
+    def start(self):
+        """Start serving on a free port in a background thread"""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-practice-site', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def page(self, path):
+        """
+        Render a page of a practice site.
+
+        Returns:
+            tuple: (HTTP status code, body) of an HTML page
+        """
+        parts = path.split('?')[0].strip('/').split('/')
+        try:
+            number = int(parts[0][1:])
+        except (IndexError, ValueError):
+            return 404, '<html><body>Niet gevonden</body></html>'
+        if not parts[0].startswith('p') or number >= self.practices:
+            return 404, '<html><body>Niet gevonden</body></html>'
+
+        base = f'/p{number}'
+        menu = ''.join(
+            f'<li><a href="{base}/{href}">{text}</a></li>'
+            for href, text in (('', 'Home'), ('team', 'Ons team'), ('openingstijden', 'Openingstijden'),
+                               ('spoed', 'Spoed'), ('contact', 'Contact'), ('praktijkinformatie', 'Praktijkinformatie'))
+        )
+        if number % 3 == 1:
+            menu += f'<li><a href="{base}/nieuwe-patienten">Nieuwe patiënten</a></li>'
+        subpage = '/'.join(parts[1:])
+        if subpage == '':
+            body = f'<h1>Huisartsenpraktijk {number}</h1><p>Welkom op onze website.</p>'
+            if number % 3 == 0:
+                body += REGISTRATION_TEXT
+        elif subpage == 'praktijkinformatie':
+            body = '<h1>Praktijkinformatie</h1><ul>' + ''.join(
+                f'<li><a href="{base}/praktijkinformatie/{href}">{text}</a></li>'
+                for href, text in (('inschrijven', 'Inschrijven'), ('herhaalrecepten', 'Herhaalrecepten'), ('tarieven', 'Tarieven'))
+            ) + '</ul>'
+        elif f'{base}/{subpage}' == self.registration_path(number):
+            body = '<h1>Inschrijven</h1>' + REGISTRATION_TEXT
+        elif subpage in ('team', 'openingstijden', 'spoed', 'contact', 'nieuwe-patienten',
+                         'praktijkinformatie/inschrijven', 'praktijkinformatie/herhaalrecepten', 'praktijkinformatie/tarieven'):
+            body = f'<h1>{subpage.split("/")[-1].capitalize()}</h1><p>Informatie over de praktijk.</p>'
+        else:
+            return 404, '<html><body>Niet gevonden</body></html>'
+        return 200, f'<html><body><nav><ul>{menu}</ul></nav><main>{body}</main></body></html>'
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                status_code, body = fake.page(self.path)
+                body = body.encode('utf-8')
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep the benchmark output readable
+                pass
+
+        return Handler
@@ -0,0 +1,186 @@
+"""
+In-memory stand-in for a gspread spreadsheet, for benchmarks that run offline.
+
+Only the calls that the DataLayer uses are implemented. Every call sleeps
+for a configurable latency, so the number of round trips shows up in the
+timings like it would against Google Sheets. A request quota per minute
+can be set; calls over the quota fail with a 429 APIError, like gspread
+raises for RESOURCE_EXHAUSTED responses.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import deque
+import gspread
+
+A1_CELL = re.compile(r'([A-Z]+)(\d+)')
+
+def parse_cell(cell):
+    """Convert an A1 cell like 'B12' to (row, column)"""
+    match = A1_CELL.match(cell)
+    column = 0
+    for letter in match.group(1):
+        column = column * 26 + ord(letter) - ord('A') + 1
+    return int(match.group(2)), column
+
+class FakeResponse:
+    """The parts of a requests response that gspread.exceptions.APIError reads"""
+
+    def __init__(self, status_code, message, status):
+        self.status_code = status_code
+        self.text = json.dumps({'error': {'code': status_code, 'message': message, 'status': status}})
+
+    def json(self):
+        return json.loads(self.text)
+
+class FakeSession:
+    """Holds the response hooks that are called for every API call, like a requests session"""
+
+    def __init__(self):
+        self.hooks = {'response': []}
+
+    def respond(self, response):
+        for hook in self.hooks['response']:
+            hook(response)
+        return response
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = []
+        self.col_count = 26
+
+    @property
+    def row_count(self):
+        return max(len(self.rows), 1)
+
+    def row_values(self, row):
+        self.spreadsheet.request()
+        return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def get_values(self, range_name):
+        self.spreadsheet.request()
+        first, last = range_name.split(':')
+        first_row, _ = parse_cell(first)
+        last_row, _ = parse_cell(last)
+        return [list(row) for row in self.rows[first_row - 1:last_row]]
+
+    def append_row(self, values, value_input_option=None):
+        self.spreadsheet.request()
+        self.rows.append([str(value) for value in values])
+        row = len(self.rows)
+        return {'updates': {'updatedRange': f"{self.title}!A{row}:{gspread.utils.rowcol_to_a1(row, len(values))}"}}
+
+    def append_rows(self, values, value_input_option=None):
+        self.spreadsheet.request()
+        self.rows.extend([str(value) for value in row] for row in values)
+
+    def insert_rows(self, values, row=1, value_input_option=None):
+        self.spreadsheet.request()
+        self.rows[row - 1:row - 1] = [[str(value) for value in new_row] for new_row in values]
+
+    def update(self, range_name, values, raw=True):
+        self.spreadsheet.request()
+        first_row, first_column = parse_cell(range_name.split(':')[0])
+        for offset, new_values in enumerate(values):
+            while len(self.rows) < first_row + offset:
+                self.rows.append([])
+            row = self.rows[first_row + offset - 1]
+            row.extend([''] * (first_column - 1 + len(new_values) - len(row)))
+            for column, value in enumerate(new_values, start=first_column - 1):
+                row[column] = str(value)
+
+    def batch_clear(self, ranges):
+        self.spreadsheet.request()
+        self.rows = self.rows[:1]
+
+    def clear(self):
+        self.spreadsheet.request()
+        self.rows = []
+
+    def add_cols(self, cols):
+        self.spreadsheet.request()
+        self.col_count += cols
+
+class FakeSpreadsheet:
+    """
+    A spreadsheet of in-memory worksheets.
+
+    Args:
+        latency (float): Seconds every API call takes
+        quota_per_minute (int): Maximum number of calls per quota window,
+            None for no quota
+        quota_window (float): Length of the quota window in seconds
+    """
+
+    def __init__(self, latency=0.0, quota_per_minute=None, quota_window=60.0):
+        self.id = 'fake-spreadsheet'
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.quota_window = quota_window
+        self.requests = 0
+        self.quota_errors = 0
+        self.session = FakeSession()
+        self._request_times = deque()
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def request(self):
+        """Account for one API call, failing when it exceeds the quota"""
+        with self._lock:
+            self.requests += 1
+            if self.quota_per_minute:
+                now = time.monotonic()
+                while self._request_times and self._request_times[0] <= now - self.quota_window:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.quota_per_minute:
+                    self.quota_errors += 1
+                    response = FakeResponse(429, 'Quota exceeded for quota metric \'Read requests\'', 'RESOURCE_EXHAUSTED')
+                    raise gspread.exceptions.APIError(self.session.respond(response))
+                self._request_times.append(now)
+        self.session.respond(FakeResponse(200, 'OK', 'OK'))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def worksheet(self, title):
+        self.request()
+        if title not in self._worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.request()
+        return list(self._worksheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.request()
+        worksheet = self._worksheets[title] = FakeWorksheet(self, title)
+        return worksheet
+
+    def del_worksheet(self, worksheet):
+        self.request()
+        del self._worksheets[worksheet.title]
+
+    def fill(self, title, headers, rows):
+        """Create a worksheet with data, without counting API calls"""
+        worksheet = self._worksheets[title] = FakeWorksheet(self, title)
+        worksheet.rows = [list(headers)] + [[str(value) for value in row] for row in rows]
+        return worksheet
+
+class FakeClient:
+    """Stand-in for an authorized gspread client, serving one fake spreadsheet"""
+
+    def __init__(self, spreadsheet=None):
+        self.spreadsheet = spreadsheet or FakeSpreadsheet()
+        self.session = self.spreadsheet.session
+
+    def open_by_key(self, key):
+        self.spreadsheet.request()
+        return self.spreadsheet
+
+    def create(self, title):
+        self.spreadsheet.request()
+        return self.spreadsheet
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Importtijd per entrypoint, gemeten met python -X importtime.
+
+Voor de Streamlit-pagina's, app.py en de scripts worden de imports bovenaan
+het bestand uitgevoerd, voor de modules een import van de module. Elke meting
+draait in een nieuw proces, zodat niets al geladen is; de mediaan van een
+aantal metingen wordt gerapporteerd, met de zwaarste imports erbij.
+
+Gebruik:
+python benchmarks/import_time.py [--repeat 5] [--top 5] [--only app pages.dashboard]
+"""
+
+import argparse
+import ast
+import glob
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ['app.py', 'export_data.py', 'test_openai_bridge.py']
+
+def entry_points():
+    """Map every entry point to the Python code that performs its imports"""
+    entries = {}
+    for path in SCRIPTS + sorted(glob.glob(os.path.join(ROOT, 'pages', '*.py'))):
+        path = os.path.relpath(os.path.join(ROOT, path), ROOT)
+        with open(os.path.join(ROOT, path), encoding='utf-8') as file:
+            tree = ast.parse(file.read())
+        imports = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        entries[os.path.splitext(path)[0].replace(os.sep, '.')] = '\n'.join(imports)
+    for path in sorted(glob.glob(os.path.join(ROOT, 'modules', '*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name != '__init__':
+            entries[f'modules.{name}'] = f'import modules.{name}'
+    return entries
+
+def measure(code, baseline=()):
+    """
+    Run the imports in a new interpreter.
+
+    Args:
+        code (str): The import statements
+        baseline: Modules every interpreter imports at start-up, left out
+
+    Returns:
+        tuple: (total import time in ms, {top-level module: cumulative ms})
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            # Not imported by another module, so not counted twice
+            modules[name.strip()] = int(cumulative) / 1000
+    for name in baseline:
+        modules.pop(name, None)
+    return sum(modules.values()), modules
+
+def measure_all(repeat=5, only=None):
+    """
+    Measure the import time of every entry point.
+
+    Returns:
+        dict: Entry point -> {'ms': median total, 'top': heaviest imports}
+    """
+    # Loaded by the interpreter itself (site, encodings, ...), not by the entry point
+    baseline = set(measure('pass')[1])
+    results = {}
+    for entry, code in entry_points().items():
+        if only and entry not in only:
+            continue
+        totals = []
+        heaviest = {}
+        for _ in range(repeat):
+            total, modules = measure(code, baseline)
+            totals.append(total)
+            for name, ms in modules.items():
+                heaviest.setdefault(name, []).append(ms)
+        top = sorted(((statistics.median(values), name) for name, values in heaviest.items()), reverse=True)
+        results[entry] = {'ms': statistics.median(totals), 'top': [(name, ms) for ms, name in top]}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time of every entry point')
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per entry point')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest imports to show per entry point')
+    parser.add_argument('--only', nargs='+', help='Entry points to measure, e.g. app pages.dashboard modules.data_layer')
+    args = parser.parse_args()
+
+    for entry, result in measure_all(args.repeat, args.only).items():
+        print(f"{entry:<32}{result['ms']:>8.0f} ms")
+        for name, ms in result['top'][:args.top]:
+            print(f"    {name:<28}{ms:>8.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Loadtest met veel gelijktijdige Streamlit-sessies in één proces.
+
+Elke gesimuleerde sessie is een AppTest die inlogt op app.py, het dashboard
+opent, de praktijkenpagina opent, daar een praktijk controleert en terug
+gaat naar het dashboard. Alle sessies delen, net als in een echte server,
+de services uit st.cache_resource; Google Sheets en het Apps Script worden
+nagebootst (benchmarks/fake_sheets.py en benchmarks/fake_apps_script.py).
+
+Per aantal gelijktijdige sessies worden de p50/p95/p99 van de rerun-latentie,
+het aantal backend-aanroepen per sessie en het piekgeheugen gerapporteerd.
+
+Gebruik:
+python benchmarks/load_test.py [--sessions 1 5 10 20] [--iterations 3]
+                               [--check-all] [--output resultaat.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_benchmarks import ROOT, make_spreadsheet, user_practices
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def current_rss():
+    """Resident memory of this process in bytes, or None when unknown"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class MemorySampler:
+    """Tracks the peak resident memory while running, in a background thread"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if self.peak is None:
+            # No /proc: fall back to the peak of the whole process
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            if rss is not None and rss > (self.peak or 0):
+                self.peak = rss
+
+def run_session(session, config, reruns, errors):
+    """Drive one simulated session through the pages, timing every rerun"""
+    try:
+        simulate_session(session, config, reruns, errors)
+    except Exception as e:
+        errors.append(f"session {session}: {type(e).__name__}: {e}")
+
+def simulate_session(session, config, reruns, errors):
+    from streamlit.testing.v1 import AppTest
+
+    def timed_run(step, action):
+        started = time.perf_counter()
+        app = action()
+        reruns.append((step, time.perf_counter() - started))
+        for exception in app.exception:
+            errors.append(f"session {session}, {step}: {exception.value}")
+        return app
+
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=600)
+    timed_run('login_page', app.run)
+    app.text_input(key='email').input(f'gebruiker{session}@example.com')
+    timed_run('login', lambda: app.button[0].click().run())
+
+    for iteration in range(config['iterations']):
+        timed_run('dashboard', lambda: app.switch_page('pages/dashboard.py').run())
+        if config['checkAll']:
+            timed_run('check_all', lambda: next(
+                b for b in app.button if b.label == 'Alle praktijken controleren'
+            ).click().run())
+        timed_run('practices', lambda: app.switch_page('pages/practices.py').run())
+        check_buttons = [b for b in app.button if b.key and b.key.startswith('check_')]
+        if check_buttons:
+            button = check_buttons[(session + iteration) % len(check_buttons)]
+            timed_run('check', lambda: button.click().run())
+        timed_run('dashboard_rerun', lambda: app.switch_page('pages/dashboard.py').run())
+
+def run_level(sessions, config, spreadsheet, apps_script):
+    """Run a number of sessions at the same time and summarize their reruns"""
+    reruns = []
+    errors = []
+    sheet_requests = spreadsheet.requests
+    script_requests = apps_script.requests
+    threads = [
+        threading.Thread(target=run_session, args=(session, config, reruns, errors), name=f'session-{session}')
+        for session in range(sessions)
+    ]
+    started = time.perf_counter()
+    with MemorySampler() as memory:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    seconds = time.perf_counter() - started
+
+    durations = [duration for _, duration in reruns]
+    steps = {}
+    for step, duration in reruns:
+        steps.setdefault(step, []).append(duration)
+    return {
+        'sessions': sessions,
+        'seconds': seconds,
+        'reruns': len(reruns),
+        'rerunsPerSecond': len(reruns) / seconds,
+        'p50Ms': percentile(durations, 0.5) * 1000,
+        'p95Ms': percentile(durations, 0.95) * 1000,
+        'p99Ms': percentile(durations, 0.99) * 1000,
+        'stepP50Ms': {step: percentile(values, 0.5) * 1000 for step, values in steps.items()},
+        'sheetRequestsPerSession': (spreadsheet.requests - sheet_requests) / sessions,
+        'scriptRequestsPerSession': (apps_script.requests - script_requests) / sessions,
+        'peakMemoryMb': memory.peak / 2 ** 20 if memory.peak else None,
+        'quotaErrors': spreadsheet.quota_errors,
+        'errors': errors[:10]
+    }
+
+def print_level(result):
+    print(
+        f"{result['sessions']:>8} {result['p50Ms']:>9.0f} {result['p95Ms']:>9.0f} {result['p99Ms']:>9.0f} "
+        f"{result['rerunsPerSecond']:>9.1f} {result['sheetRequestsPerSession']:>11.1f} "
+        f"{result['scriptRequestsPerSession']:>11.1f} {result['peakMemoryMb']:>9.0f}",
+        flush=True
+    )
+    for error in result['errors']:
+        print(f"         fout: {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test with concurrent simulated Streamlit sessions')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 20], help='Concurrent sessions per level')
+    parser.add_argument('--iterations', type=int, default=3, help='Rounds through the pages per session')
+    parser.add_argument('--check-all', action='store_true', help='Also click "Alle praktijken controleren"')
+    parser.add_argument('--practices', type=int, default=2000, help='Practices in the sheet')
+    parser.add_argument('--checks', type=int, default=1000, help='Checks in the current month')
+    parser.add_argument('--user-practices', type=int, default=20, help='Practices of the logged in user')
+    parser.add_argument('--sheets-latency', type=float, default=0.01, help='Seconds per Google Sheets call')
+    parser.add_argument('--quota', type=int, default=None, help='Google Sheets calls allowed per minute')
+    parser.add_argument('--script-delay', type=float, default=0.05, help='Seconds per Apps Script analysis')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    import streamlit
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    import streamlit.testing.v1.app_test as app_test
+    from benchmarks.fake_apps_script import FakeAppsScript
+    from benchmarks.fake_sheets import FakeClient
+    from modules.data_layer import DataLayer
+
+    config = {
+        'practices': args.practices,
+        'checks': args.checks,
+        'userPractices': args.user_practices,
+        'sheetsLatency': args.sheets_latency,
+        'quotaPerMinute': args.quota,
+        'iterations': args.iterations,
+        'checkAll': args.check_all
+    }
+    spreadsheet = make_spreadsheet(config)
+    practices = user_practices(config)
+
+    # AppTest sets and clears the global runtime around every run, which
+    # breaks sessions that run at the same time. Give all sessions one
+    # shared runtime instead, like the sessions of a real server.
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+
+    with tempfile.TemporaryDirectory() as directory, FakeAppsScript(delay=args.script_delay, seed=1) as apps_script:
+        environment = {
+            'SPREADSHEET_ID': 'fake-spreadsheet',
+            'CACHE_SNAPSHOT_PATH': os.path.join(directory, 'data_cache.pickle'),
+            'CACHE_SNAPSHOT_INTERVAL': '0',
+            'ARCHIVE_DIR': os.path.join(directory, 'archive'),
+            'LEASE_DB_PATH': os.path.join(directory, 'leases.sqlite3'),
+            'PAGE_SNAPSHOT_DB_PATH': os.path.join(directory, 'page_snapshots.sqlite3'),
+            'PROFILE_DIR': os.path.join(directory, 'profiles'),
+            'LOCATOR_MAX_PAGES': '0',
+            'APPS_SCRIPT_URL': apps_script.url
+        }
+        with mock.patch.dict(os.environ, environment), \
+                mock.patch('dotenv.load_dotenv', lambda *args, **kwargs: False), \
+                mock.patch.object(app_test, 'Runtime', type('DetachedRuntime', (), {})), \
+                mock.patch.object(Runtime, '_instance', runtime), \
+                mock.patch.object(streamlit, 'set_page_config', lambda **kwargs: None), \
+                mock.patch.object(DataLayer, '_create_client', lambda self: FakeClient(spreadsheet)), \
+                mock.patch.object(DataLayer, 'get_practices_by_user', lambda self, user_id: practices):
+            streamlit.cache_resource.clear()
+            streamlit.cache_data.clear()
+
+            print(f"{'sessies':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'reruns/s':>9} "
+                  f"{'sheets/sessie':>11} {'script/sessie':>11} {'piek MB':>9}")
+            results = []
+            for sessions in args.sessions:
+                result = run_level(sessions, config, spreadsheet, apps_script)
+                results.append(result)
+                print_level(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'config': config, 'levels': results}, file, indent=2)
+        print(f"Resultaten opgeslagen in {args.output}")
+
+if __name__ == '__main__':
+    main()
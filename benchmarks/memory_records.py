@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Geheugenbenchmark van de recordmodellen (modules/records.py).
+
+Vergelijkt het geheugengebruik van praktijken, gebruikers en controles als
+losse dicts met JSON-tekst, zoals ze uit Google Sheets komen, met de
+compacte records met __slots__, een Status-enum en eenmalig geparste details.
+
+Gebruik:
+python benchmarks/memory_records.py [--records 100000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.records import Practice, User, Check
+
+STATUSES = ('ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN')
+
+def sheet_text(value):
+    """Create a fresh string object, like every cell read from a sheet"""
+    return ''.join(list(str(value)))
+
+def make_practice_row(i, user_count):
+    status = random.choice(STATUSES)
+    return {
+        'practiceId': sheet_text(f'practice-{i:08d}'),
+        'userId': sheet_text(f'user-{i % user_count:05d}'),
+        'name': sheet_text(f'Huisartsenpraktijk {i}'),
+        'websiteUrl': sheet_text(f'https://www.huisarts{i}.nl'),
+        'status': sheet_text(status),
+        'lastChecked': sheet_text('2025-03-15T12:00:00'),
+        'lastStatusChange': sheet_text('2025-03-10T09:30:00'),
+        'details': sheet_text(json.dumps({
+            'waitingList': status == 'NOT_ACCEPTING',
+            'conditions': ['Alleen inwoners van postcodegebied'] if i % 2 else [],
+            'waitingTime': 'Ongeveer 3-6 maanden' if status == 'NOT_ACCEPTING' else None,
+            'contactInfo': f'info@huisarts{i}.nl'
+        }))
+    }
+
+def make_user_row(i):
+    return {
+        'userId': sheet_text(f'user-{i:05d}'),
+        'email': sheet_text(f'user{i}@example.com'),
+        'isActive': sheet_text('TRUE'),
+        'isAdmin': sheet_text('FALSE'),
+        'settings': sheet_text(json.dumps({'emailNotifications': True, 'notificationFrequency': 'daily'}))
+    }
+
+def make_check_row(i, practice_count):
+    status = random.choice(STATUSES)
+    return {
+        'checkId': sheet_text(f'check-{i:08d}'),
+        'practiceId': sheet_text(f'practice-{i % practice_count:08d}'),
+        'timestamp': sheet_text('2025-03-15T12:00:00'),
+        'status': sheet_text(status),
+        'previousStatus': sheet_text(status),
+        'details': sheet_text(json.dumps({'waitingList': False, 'conditions': [], 'contactInfo': None})),
+        'notificationSent': sheet_text('FALSE'),
+        'firstSeen': sheet_text('2025-03-15T12:00:00'),
+        'lastSeen': sheet_text('2025-03-15T12:00:00'),
+        'count': sheet_text('1')
+    }
+
+def measure(build):
+    """Measure the memory held by the result of build() in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory of dict rows and compact records')
+    parser.add_argument('--records', type=int, default=100000, help='Number of records per model')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated data')
+    args = parser.parse_args()
+
+    n = args.records
+    user_count = max(n // 100, 1)
+    cases = [
+        ('Practice', lambda i: make_practice_row(i, user_count), Practice),
+        ('User', make_user_row, User),
+        ('Check', lambda i: make_check_row(i, max(n // 10, 1)), Check)
+    ]
+
+    print(f"{'Model':<10}{'dict (MB)':>12}{'record (MB)':>14}{'bytes/dict':>12}{'bytes/record':>14}{'saving':>9}")
+    for name, make_row, model in cases:
+        random.seed(args.seed)
+        dict_size = measure(lambda: [make_row(i) for i in range(n)])
+        random.seed(args.seed)
+        record_size = measure(lambda: [model.from_dict(make_row(i)) for i in range(n)])
+        print(f"{name:<10}{dict_size / 2**20:>12.1f}{record_size / 2**20:>14.1f}"
+              f"{dict_size / n:>12.0f}{record_size / n:>14.0f}{1 - record_size / dict_size:>9.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,662 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarksuite voor Huisarts Check.
+
+Draait volledig lokaal: Google Sheets wordt nagebootst met een in-memory
+spreadsheet met instelbare vertraging en quota (benchmarks/fake_sheets.py)
+en het Apps Script met een lokale HTTP-server met instelbare vertraging en
+foutpercentages (benchmarks/fake_apps_script.py).
+
+De resultaten worden per commit opgeslagen in benchmarks/results/, zodat
+regressies tussen commits vergeleken kunnen worden.
+
+Gebruik:
+python benchmarks/run_benchmarks.py [--only NAAM ...] [--quick]
+                                    [--compare COMMIT|BESTAND] [--threshold 0.1]
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+STATUSES = ('ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN')
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark function that takes the config and returns its metrics"""
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+def free_port():
+    """A port that is free on this machine, for a receiver that must be known before it starts"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def timed(function, repeat):
+    """Run a function repeatedly and return its timings in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return {
+        'median': statistics.median(durations),
+        'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+        'min': durations[0]
+    }
+
+def practice_row(i):
+    return [f'practice-{i}', f'user-{i % 100}', f'Huisartsenpraktijk {i}',
+            f'https://www.huisarts{i}.nl', STATUSES[i % 3], '', '', '']
+
+def check_row(i, practice_count):
+    status = STATUSES[i % 3]
+    # Every seventh check is a status change
+    previous = STATUSES[(i + (i % 7 == 0)) % 3]
+    return [str(uuid.uuid4()), f'practice-{i % practice_count}', datetime.now().isoformat(),
+            status, previous, '', 'FALSE', '', '', '1']
+
+def make_spreadsheet(config):
+    """Create a fake spreadsheet filled with practices and this month's checks"""
+    from benchmarks.fake_sheets import FakeSpreadsheet
+    from modules.partitions import partition_key
+
+    spreadsheet = FakeSpreadsheet(latency=config['sheetsLatency'], quota_per_minute=config['quotaPerMinute'])
+    headers = sheet_headers()
+    spreadsheet.fill('Gebruikers', headers['USERS'], [])
+    spreadsheet.fill('Huisartsen', headers['PRACTICES'], [practice_row(i) for i in range(config['practices'])])
+    spreadsheet.fill(f'Controles_{partition_key()}', headers['CHECKS'],
+                     [check_row(i, config['practices']) for i in range(config['checks'])])
+    return spreadsheet
+
+def sheet_headers():
+    from modules.records import User, Practice, Check
+    return {'USERS': list(User.FIELDS), 'PRACTICES': list(Practice.FIELDS), 'CHECKS': list(Check.FIELDS)}
+
+def open_data_layer(spreadsheet):
+    from benchmarks.fake_sheets import FakeClient
+    from modules.data_layer import DataLayer
+    return DataLayer(client=FakeClient(spreadsheet))
+
+def user_practices(config):
+    """Practices of one user, in place of the mock get_practices_by_user"""
+    from modules.records import Practice
+    headers = sheet_headers()['PRACTICES']
+    return [Practice.from_dict(dict(zip(headers, practice_row(i)))) for i in range(config['userPractices'])]
+
+@benchmark('datalayer_read')
+def bench_datalayer_read(config):
+    """Read latency of the DataLayer against the fake spreadsheet"""
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    metrics = {}
+
+    requests = spreadsheet.requests
+    started = time.perf_counter()
+    rows = sum(len(batch) for batch in data_layer.iter_records('PRACTICES'))
+    metrics['iterPracticesSeconds'] = time.perf_counter() - started
+    metrics['iterPracticesRequests'] = spreadsheet.requests - requests
+    metrics['iterPracticesRowsPerSecond'] = rows / metrics['iterPracticesSeconds']
+
+    metrics['searchIndexBuildSeconds'] = timed(data_layer.get_search_index, 1)['min'] / 1000
+    metrics['searchMs'] = timed(lambda: data_layer.get_search_index().search('praktijk 123'), config['repeat'])['median']
+    metrics['statusChangesMs'] = timed(lambda: data_layer.get_status_changes(), config['repeat'])['median']
+    metrics['latestChecksMs'] = timed(data_layer.get_latest_checks, config['repeat'])['median']
+    metrics['statusHistoryBuildSeconds'] = timed(data_layer.get_status_history_index, 1)['min'] / 1000
+    metrics['statusHistoryMs'] = timed(lambda: data_layer.get_status_history('practice-1'), config['repeat'])['median']
+    metrics['quotaErrors'] = spreadsheet.quota_errors
+    return metrics
+
+@benchmark('datalayer_write')
+def bench_datalayer_write(config):
+    """Write latency of checks and practices"""
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    counter = iter(range(10 ** 9))
+
+    def new_check(status, previous):
+        return {
+            'checkId': str(uuid.uuid4()),
+            'practiceId': f'practice-{next(counter) % config["practices"]}',
+            'timestamp': datetime.now().isoformat(),
+            'status': status,
+            'previousStatus': previous
+        }
+
+    # Load the open runs first, the benchmark measures the steady state
+    data_layer.create_check(new_check('ACCEPTING', 'ACCEPTING'))
+    timings = timed(lambda: data_layer.create_check(new_check('ACCEPTING', 'NOT_ACCEPTING')), config['repeat'])
+    metrics = {'appendCheckMs': timings['median'], 'appendCheckP95Ms': timings['p95']}
+
+    practice_id = f'practice-{config["practices"] + 1}'
+    data_layer.create_check(dict(new_check('UNKNOWN', 'ACCEPTING'), practiceId=practice_id))
+    timings = timed(
+        lambda: data_layer.create_check(dict(new_check('UNKNOWN', 'UNKNOWN'), practiceId=practice_id)),
+        config['repeat']
+    )
+    metrics.update({'extendRunMs': timings['median'], 'extendRunP95Ms': timings['p95']})
+
+    practices = [dict(zip(sheet_headers()['PRACTICES'], practice_row(config['practices'] + i))) for i in range(100)]
+    metrics['createPractices100Ms'] = timed(lambda: data_layer.create_practices(practices), config['repeat'])['median']
+    metrics['quotaErrors'] = spreadsheet.quota_errors
+    return metrics
+
+@benchmark('check_all_user_websites')
+def bench_check_all_user_websites(config):
+    """Throughput of checking all websites of a user against the fake Apps Script"""
+    from benchmarks.fake_apps_script import FakeAppsScript
+    from modules.website_checker import WebsiteChecker
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    practices = user_practices(config)
+    data_layer.get_practices_by_user = lambda user_id: practices
+
+    with FakeAppsScript(
+        delay=config['scriptDelay'],
+        error_rate=config['scriptErrorRate'],
+        server_error_rate=config['scriptServerErrorRate'],
+        seed=1
+    ) as apps_script:
+        with mock.patch.dict(os.environ, {'APPS_SCRIPT_URL': apps_script.url}):
+            checker = WebsiteChecker(data_layer)
+        requests = spreadsheet.requests
+        started = time.perf_counter()
+        result = checker.check_all_user_websites('user-1')
+        seconds = time.perf_counter() - started
+
+    return {
+        'checks': result.get('totalChecked', 0),
+        'seconds': seconds,
+        'checksPerSecond': result.get('totalChecked', 0) / seconds,
+        'failedChecks': len(result.get('errors', [])),
+        'scriptRequests': apps_script.requests,
+        'sheetRequests': spreadsheet.requests - requests,
+        'quotaErrors': spreadsheet.quota_errors
+    }
+
+@benchmark('check_all_async')
+def bench_check_all_async(config):
+    """Checking all websites of a user with synchronous analyses, and as Apps Script jobs read by polling or callbacks"""
+    from benchmarks.fake_apps_script import FakeAppsScript
+    from modules.analysis_jobs import AnalysisJobs
+    from modules.website_checker import WebsiteChecker
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    practices = user_practices(config)
+    data_layer.get_practices_by_user = lambda user_id: practices
+
+    metrics = {}
+    for mode in ('sync', 'poll', 'callback'):
+        with FakeAppsScript(delay=config['scriptDelay'], error_rate=config['scriptErrorRate'], seed=1) as apps_script:
+            with mock.patch.dict(os.environ, {'APPS_SCRIPT_URL': apps_script.url, 'ANALYSIS_MODE': 'sync' if mode == 'sync' else 'async'}):
+                checker = WebsiteChecker(data_layer)
+            # With callbacks, polling only picks up lost results
+            callback_port = free_port() if mode == 'callback' else None
+            checker._analysis_jobs = AnalysisJobs(
+                checker.openai_bridge,
+                poll_interval=10 if mode == 'callback' else config['scriptDelay'],
+                callback_port=callback_port,
+                callback_url=f'http://127.0.0.1:{callback_port}/analysis' if callback_port else None
+            )
+            started = time.perf_counter()
+            result = checker.check_all_user_websites('user-1')
+            metrics[f'{mode}Seconds'] = time.perf_counter() - started
+            checker.analysis_jobs.stop()
+        metrics[f'{mode}ChecksPerSecond'] = result.get('totalChecked', 0) / metrics[f'{mode}Seconds']
+        metrics[f'{mode}ScriptRequests'] = apps_script.requests
+        metrics[f'{mode}FailedChecks'] = len(result.get('errors', []))
+    metrics['callbacks'] = apps_script.callbacks
+    return metrics
+
+@benchmark('check_all_asyncio')
+def bench_check_all_asyncio(config):
+    """Checking all websites of a user one after the other, against the asyncio pipeline at two concurrency limits"""
+    from benchmarks.fake_apps_script import FakeAppsScript
+    from modules.async_pipeline import AsyncCheckPipeline
+    from modules.website_checker import WebsiteChecker
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    practices = user_practices(config)
+    data_layer.get_practices_by_user = lambda user_id: practices
+
+    metrics = {}
+    for run, concurrency in (('sequential', None), ('asyncio10', 10), ('asyncio50', 50)):
+        with FakeAppsScript(delay=config['scriptDelay'], error_rate=config['scriptErrorRate'], seed=1) as apps_script:
+            with mock.patch.dict(os.environ, {'APPS_SCRIPT_URL': apps_script.url, 'ANALYSIS_MODE': 'sync'}):
+                checker = WebsiteChecker(data_layer)
+            requests = spreadsheet.requests
+            started = time.perf_counter()
+            if concurrency is None:
+                result = checker.check_all_user_websites('user-1')
+            else:
+                result = AsyncCheckPipeline(checker, concurrency).run('user-1')
+            metrics[f'{run}Seconds'] = time.perf_counter() - started
+        metrics[f'{run}ChecksPerSecond'] = result.get('totalChecked', 0) / metrics[f'{run}Seconds']
+        metrics[f'{run}FailedChecks'] = len(result.get('errors', []))
+        metrics[f'{run}SheetRequests'] = spreadsheet.requests - requests
+    return metrics
+
+@benchmark('registration_locator')
+def bench_registration_locator(config):
+    """Page fetches and analyses per check, before and after the registration page is cached"""
+    from benchmarks.fake_apps_script import FakeAppsScript
+    from benchmarks.fake_practice_site import FakePracticeSite
+    from modules.records import Practice
+    from modules.registration_locator import RegistrationPageLocator
+    from modules.website_checker import WebsiteChecker
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    count = config['userPractices']
+    with FakePracticeSite(practices=count, delay=config['pageDelay']) as site:
+        # Only the registration page tells the status, the other pages give UNKNOWN
+        registration_urls = {site.url + site.registration_path(i) for i in range(count)}
+        practices = {
+            f'practice-{i}': Practice.from_dict({
+                'practiceId': f'practice-{i}', 'userId': 'user-1', 'name': f'Huisartsenpraktijk {i}',
+                'websiteUrl': site.website_url(i), 'status': 'UNKNOWN'
+            })
+            for i in range(count)
+        }
+        # Keep the stored practices in memory, the DataLayer mocks these methods
+        def update_practice(practice_id, updates):
+            for field, value in updates.items():
+                practices[practice_id][field] = value
+            return practices[practice_id]
+        data_layer.get_practices_by_user = lambda user_id: list(practices.values())
+        data_layer.get_practice_by_id = lambda practice_id: practices.get(practice_id)
+        data_layer.update_practice = update_practice
+
+        with FakeAppsScript(delay=config['scriptDelay'], status_for=lambda url: (
+            'ACCEPTING' if url in registration_urls else 'UNKNOWN'
+        )) as apps_script:
+            with mock.patch.dict(os.environ, {'APPS_SCRIPT_URL': apps_script.url}):
+                checker = WebsiteChecker(data_layer)
+            checker.locator = RegistrationPageLocator(max_pages=5)
+
+            metrics = {}
+            for run in ('first', 'recheck'):
+                pages, analyses = site.requests, apps_script.requests
+                started = time.perf_counter()
+                result = checker.check_all_user_websites('user-1')
+                metrics[f'{run}Seconds'] = time.perf_counter() - started
+                metrics[f'{run}PagesPerCheck'] = (site.requests - pages) / count
+                metrics[f'{run}AnalysesPerCheck'] = (apps_script.requests - analyses) / count
+                metrics[f'{run}Accepting'] = sum(1 for practice in practices.values() if practice['status'] == 'ACCEPTING')
+            metrics['failedChecks'] = len(result.get('errors', []))
+    return metrics
+
+@benchmark('dashboard_render')
+def bench_dashboard_render(config):
+    """Time to render the dashboard page, the first time and on reruns"""
+    import streamlit
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fake_sheets import FakeClient
+    from modules.data_layer import DataLayer
+
+    spreadsheet = make_spreadsheet(config)
+    practices = user_practices(config)
+
+    def new_app():
+        app = AppTest.from_file(os.path.join(ROOT, 'pages', 'dashboard.py'), default_timeout=600)
+        app.session_state.user = {'userId': 'user-1', 'email': 'user@example.com', 'isAdmin': False, 'settings': {}}
+        app.session_state.logged_in = True
+        return app
+
+    with mock.patch.object(streamlit, 'set_page_config', lambda **kwargs: None), \
+            mock.patch.object(DataLayer, '_create_client', lambda self: FakeClient(spreadsheet)), \
+            mock.patch.object(DataLayer, 'get_practices_by_user', lambda self, user_id: practices):
+        streamlit.cache_resource.clear()
+        streamlit.cache_data.clear()
+        app = new_app()
+        started = time.perf_counter()
+        app.run()
+        first_render = time.perf_counter() - started
+        exceptions = [str(e.value) for e in app.exception]
+        rerender = timed(lambda: new_app().run(), config['repeat'])
+
+    metrics = {
+        'firstRenderSeconds': first_render,
+        'renderMs': rerender['median'],
+        'renderP95Ms': rerender['p95'],
+        'quotaErrors': spreadsheet.quota_errors
+    }
+    if exceptions:
+        metrics['exceptions'] = exceptions
+    return metrics
+
+# Condition texts with the postcode ranges they must parse to
+POSTCODE_CONDITIONS = [
+    ('Woonachtig in postcode gebied 1011-1018', [(1011, 1018)]),
+    ('postcode 1011AB t/m 1018ZZ', [(1011, 1018)]),
+    ('Postcodegebied: 1012AB, 1013 en 1015 t/m 1017', [(1012, 1013), (1015, 1017)]),
+    ('postcode 1012 of 1015', [(1012, 1012), (1015, 1015)]),
+    ('postcodes 10xx en 11xx', [(1000, 1199)]),
+    ('postcode 10**', [(1000, 1099)]),
+    ('maximaal 2500 patiënten in postcode 1012', [(1012, 1012)]),
+    ('maximaal 2500 patiënten', []),
+    ('Alleen inwoners van postcodegebied', [])
+]
+
+@benchmark('postcode_index')
+def bench_postcode_index(config):
+    """Postcode lookups in the interval index, against scanning the details of every practice"""
+    from modules.postcode_index import PostcodeIndex, parse_postcode_ranges
+    from modules.records import Details
+
+    parse_errors = [
+        {'condition': condition, 'expected': expected, 'parsed': parse_postcode_ranges([condition])}
+        for condition, expected in POSTCODE_CONDITIONS
+        if parse_postcode_ranges([condition]) != expected
+    ]
+
+    practices = []
+    for i in range(config['practices']):
+        low = 1000 + (i * 37) % 8900
+        conditions = [f'Woonachtig in postcode gebied {low}-{low + i % 40}'] if i % 4 else []
+        practices.append({
+            'practiceId': f'practice-{i}', 'userId': f'user-{i % 100}', 'name': f'Huisartsenpraktijk {i}',
+            'websiteUrl': f'https://www.huisarts{i}.nl', 'status': STATUSES[i % 3],
+            'details': json.dumps({'conditions': conditions})
+        })
+    postcodes = iter(range(10 ** 9))
+
+    def scan():
+        postcode = 1000 + next(postcodes) % 9000
+        return [
+            practice for practice in practices
+            if practice['status'] == 'ACCEPTING' and any(
+                low <= postcode <= high
+                for low, high in parse_postcode_ranges(Details.parse(practice['details']).get('conditions'))
+            )
+        ]
+
+    index = PostcodeIndex()
+    metrics = {'buildSeconds': timed(lambda: index.add_many(practices), 1)['min'] / 1000}
+    metrics['lookupMs'] = timed(lambda: index.eligible(1000 + next(postcodes) % 9000), config['repeat'] * 100)['median']
+    metrics['scanMs'] = timed(scan, config['repeat'])['median']
+    practice = dict(practices[1], status='ACCEPTING', details=json.dumps({'conditions': ['Postcodes 1011 t/m 1018']}))
+    metrics['updateMs'] = timed(lambda: index.on_practice_updated('practice-1', practice), config['repeat'])['median']
+    if parse_errors:
+        metrics['parseErrors'] = parse_errors
+    return metrics
+
+@benchmark('practice_counters')
+def bench_practice_counters(config):
+    """Metric tiles from the materialized counters, against counting the practices, and reconciling them"""
+    from modules.practice_counters import count_practices
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    started = time.perf_counter()
+    counters = data_layer.get_practice_counters()
+    metrics = {'buildSeconds': time.perf_counter() - started}
+    practices = [practice for batch in data_layer.iter_records('PRACTICES') for practice in batch]
+    metrics['readMs'] = timed(lambda: counters.get('user-1'), config['repeat'] * 100)['median']
+    metrics['scanMs'] = timed(lambda: count_practices(p for p in practices if p['userId'] == 'user-1'), config['repeat'])['median']
+    statuses = iter(range(10 ** 9))
+    metrics['updateMs'] = timed(
+        lambda: data_layer.update_practice('practice-1', {'status': STATUSES[next(statuses) % 3]}), config['repeat'] * 100
+    )['median']
+
+    # Every tenth practice changes status in the sheet itself, which the counters do not see
+    rows = [practice_row(i) for i in range(config['practices'])]
+    for row in rows[::10]:
+        row[4] = 'ACCEPTING' if row[4] != 'ACCEPTING' else 'NOT_ACCEPTING'
+    spreadsheet.fill('Huisartsen', sheet_headers()['PRACTICES'], rows)
+    started = time.perf_counter()
+    result = data_layer.reconcile_practice_counters()
+    metrics['reconcileSeconds'] = time.perf_counter() - started
+    metrics['drift'] = result['drift']
+    metrics['driftAfterReconcile'] = data_layer.reconcile_practice_counters()['drift']
+    return metrics
+
+@benchmark('discovery')
+def bench_discovery(config):
+    """Pages per second of the discovery crawler over fake directory sites, and storing what it finds"""
+    from benchmarks.fake_directory_site import FakeDirectorySite
+    from modules.discovery import DiscoveryCrawler
+
+    spreadsheet = make_spreadsheet(config)
+    data_layer = open_data_layer(spreadsheet)
+    sites = [
+        FakeDirectorySite(name=f'gids{i}', regions=config['discoveryRegions'], delay=config['pageDelay']).start()
+        for i in range(4)
+    ]
+    try:
+        crawler = DiscoveryCrawler(data_layer, max_workers=8, delay=config['pageDelay'], max_pages=10 ** 6)
+        requests = spreadsheet.requests
+        result = crawler.discover([site.url for site in sites], 'user-1', existing_practices=[])
+    finally:
+        for site in sites:
+            site.stop()
+
+    expected = set().union(*(site.practice_urls for site in sites))
+    found = {candidate['websiteUrl'] for candidate in result['candidates']}
+    return {
+        'pages': result['pagesFetched'],
+        'seconds': result['seconds'],
+        'pagesPerSecond': result['pagesPerSecond'],
+        'practicesFound': len(found),
+        'practicesMissed': len(expected - found),
+        'imported': result['imported'],
+        'sheetRequests': spreadsheet.requests - requests,
+        'disallowedRequests': sum(site.disallowed_requests for site in sites),
+        'duplicateRequests': sum(len(site.paths) - len(set(site.paths)) for site in sites)
+    }
+
+@benchmark('page_snapshots')
+def bench_page_snapshots(config):
+    """Storage per check of the page snapshot store and reading random historical versions"""
+    import random
+    import sqlite3
+    import zlib
+    from datetime import timedelta
+    from benchmarks.fake_apps_script import practice_page_text
+    from modules.page_snapshots import PageSnapshotStore
+
+    # Hourly checks; now and then a page gets a news item, and rarely the status changes
+    rng = random.Random(1)
+    pages = []
+    for i in range(config['snapshotPractices']):
+        url, status, revision = f'https://www.huisarts{i}.nl', STATUSES[i % 3], 0
+        for check in range(config['snapshotChecks']):
+            if rng.random() < 0.05:
+                revision += 1
+            if rng.random() < 0.005:
+                status = STATUSES[(STATUSES.index(status) + 1) % 3]
+            timestamp = (datetime(2024, 1, 1) + timedelta(hours=check)).isoformat()
+            pages.append((f'practice-{i}', timestamp, practice_page_text(url, status, revision)))
+    rng.shuffle(pages)
+    pages.sort(key=lambda page: page[1])  # Checks arrive in time order, practices interleaved
+
+    # A store of its own, without the snapshots of the website check benchmarks
+    path = os.path.join(os.path.dirname(os.environ['PAGE_SNAPSHOT_DB_PATH']), 'page_snapshots_benchmark.sqlite3')
+    store = PageSnapshotStore(path)
+    adds = []
+    for practice_id, timestamp, text in pages:
+        started = time.perf_counter()
+        store.add(practice_id, timestamp, text)
+        adds.append((time.perf_counter() - started) * 1000)
+    stats = store.stats()
+    # Count the database file without the write-ahead log
+    sqlite3.connect(path).execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    lookups = [(practice_id, timestamp) for practice_id, timestamp, _ in rng.sample(pages, min(len(pages), 1000))]
+    expected = {(practice_id, timestamp): text for practice_id, timestamp, text in pages}
+
+    def reads(store):
+        lookup = iter(lookups)
+        return lambda: store.get(*next(lookup))
+
+    fresh = PageSnapshotStore(path)
+    read = timed(reads(fresh), len(lookups))
+    uncached = timed(reads(PageSnapshotStore(path, cached_bases=0)), len(lookups))
+    checks = len(pages)
+    return {
+        'checks': checks,
+        'rawBytesPerCheck': round(stats['pageBytes'] / checks, 1),
+        'zlibBytesPerCheck': round(sum(len(zlib.compress(text.encode('utf-8'), 9)) for _, _, text in pages) / checks, 1),
+        'bytesPerCheck': round(stats['storedBytes'] / checks, 1),
+        'fileBytesPerCheck': round(os.path.getsize(path) / checks, 1),
+        'bases': stats['kinds'].get('base', 0),
+        'addMs': statistics.median(adds),
+        'readMs': read['median'],
+        'readP95Ms': read['p95'],
+        'readUncachedMs': uncached['median'],
+        'correct': all(fresh.get(*key) == expected[key] for key in lookups)
+    }
+
+@benchmark('import_time')
+def bench_import_time(config):
+    """Import time of every entry point in a new interpreter (python -X importtime)"""
+    from benchmarks.import_time import measure_all
+    return {f'{entry}ImportMs': result['ms'] for entry, result in measure_all(config['importRepeat']).items()}
+
+def current_commit():
+    """Get the short hash of HEAD, marked dirty when there are uncommitted changes"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, text=True)
+        return commit + ('-dirty' if dirty.strip() else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def load_results(reference):
+    """Load stored results by commit hash or file path"""
+    path = reference if os.path.exists(reference) else os.path.join(RESULTS_DIR, f'{reference}.json')
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def lower_is_better(metric):
+    return metric.endswith(('Ms', 'Seconds', 'Requests', 'Errors')) or metric in ('seconds', 'failedChecks')
+
+def compare(previous, current, threshold):
+    """Print the change of every metric and return the regressions"""
+    regressions = []
+    print(f"\nVergelijking met {previous['commit']} ({previous['date'][:10]}):")
+    for name, metrics in current['results'].items():
+        old_metrics = previous['results'].get(name, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            if lower_is_better(metric):
+                worse = change > threshold
+            else:
+                # Only throughput metrics have a better direction of their own
+                worse = metric.endswith('PerSecond') and change < -threshold
+            marker = '  REGRESSIE' if worse else ''
+            print(f"  {name}.{metric:<28}{old:>12.3f} -> {value:>12.3f} ({change:+.0%}){marker}")
+            if marker:
+                regressions.append(f'{name}.{metric}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Small data sets for a fast run')
+    parser.add_argument('--practices', type=int, help='Practices in the sheet')
+    parser.add_argument('--checks', type=int, help='Checks in the current month')
+    parser.add_argument('--user-practices', type=int, help='Practices checked by check_all_user_websites')
+    parser.add_argument('--sheets-latency', type=float, default=0.01, help='Seconds per Google Sheets call')
+    parser.add_argument('--quota', type=int, default=None, help='Google Sheets calls allowed per minute')
+    parser.add_argument('--script-delay', type=float, default=0.05, help='Seconds per Apps Script analysis')
+    parser.add_argument('--script-error-rate', type=float, default=0.05, help='Fraction of failed analyses')
+    parser.add_argument('--script-server-error-rate', type=float, default=0.0, help='Fraction of HTTP 500 responses')
+    parser.add_argument('--repeat', type=int, default=None, help='Repetitions of timed operations')
+    parser.add_argument('--compare', help='Commit hash or results file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change counted as regression')
+    parser.add_argument('--no-save', action='store_true', help='Do not store the results')
+    args = parser.parse_args()
+
+    config = {
+        'practices': args.practices or (2000 if args.quick else 20000),
+        'checks': args.checks or (1000 if args.quick else 10000),
+        'userPractices': args.user_practices or (20 if args.quick else 100),
+        'sheetsLatency': args.sheets_latency,
+        'quotaPerMinute': args.quota,
+        'scriptDelay': args.script_delay,
+        'scriptErrorRate': args.script_error_rate,
+        'scriptServerErrorRate': args.script_server_error_rate,
+        'repeat': args.repeat or (5 if args.quick else 20),
+        'importRepeat': 3 if args.quick else 7,
+        'discoveryRegions': 5 if args.quick else 25,
+        'snapshotPractices': 50 if args.quick else 500,
+        'snapshotChecks': 48 if args.quick else 168,
+        'pageDelay': 0.02
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep snapshots, archives and leases of the fake spreadsheet out of the working copy
+        environment = {
+            'SPREADSHEET_ID': 'fake-spreadsheet',
+            'CACHE_SNAPSHOT_PATH': os.path.join(directory, 'data_cache.pickle'),
+            'CACHE_SNAPSHOT_INTERVAL': '0',
+            'ARCHIVE_DIR': os.path.join(directory, 'archive'),
+            'LEASE_DB_PATH': os.path.join(directory, 'leases.sqlite3'),
+            'PAGE_SNAPSHOT_DB_PATH': os.path.join(directory, 'page_snapshots.sqlite3'),
+            'PRACTICE_COUNTERS_RECONCILE_INTERVAL': '0',
+            # The fake practices have no real websites to look for registration pages on
+            'LOCATOR_MAX_PAGES': '0',
+            'APPS_SCRIPT_URL': ''
+        }
+        results = {}
+        with mock.patch.dict(os.environ, environment):
+            for name in args.only or BENCHMARKS:
+                print(f"Running {name}...", flush=True)
+                results[name] = BENCHMARKS[name](config)
+
+    report = {
+        'commit': current_commit(),
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results
+    }
+
+    print()
+    for name, metrics in results.items():
+        print(name)
+        for metric, value in metrics.items():
+            print(f"  {metric:<30}{value:>12.3f}" if isinstance(value, float) else f"  {metric:<30}{value!s:>12}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults stored in {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        regressions = compare(load_results(args.compare), report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark van de koude en warme start van de datacache (modules/cache_snapshot.py).
+
+Meet de tijd tot de eerste pagina bediend kan worden (zoekindex en feed van
+statuswijzigingen geladen) tegen een nagebootste spreadsheet met vertraging
+per API-aanroep: eerst zonder snapshot, daarna vanuit de snapshot plus de
+rijen die sindsdien zijn toegevoegd.
+
+Gebruik:
+python benchmarks/warm_start.py [--practices 100000] [--checks 20000] [--latency 0.2]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_sheets import FakeSpreadsheet, FakeClient
+from modules.data_layer import DataLayer
+from modules.cache_snapshot import CacheSnapshot
+from modules.partitions import partition_key
+
+STATUSES = ('ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN')
+
+def practice_row(i):
+    return [f'practice-{i}', f'user-{i % 100}', f'Huisartsenpraktijk {i}',
+            f'https://www.huisarts{i}.nl', STATUSES[i % 3], '', '', '']
+
+def check_row(i, practice_count):
+    status = STATUSES[i % 3]
+    previous = STATUSES[(i + (i % 7 == 0)) % 3]
+    return [str(uuid.uuid4()), f'practice-{i % practice_count}', f'{time.strftime("%Y-%m-%dT%H:%M:%S")}',
+            status, previous, '', 'FALSE', '', '', '1']
+
+def open_data_layer(spreadsheet, snapshot_path):
+    data_layer = DataLayer(client=FakeClient(spreadsheet))
+    # No background saves, the benchmark saves explicitly
+    data_layer.cache_snapshot = CacheSnapshot(data_layer, path=snapshot_path, interval=0)
+    return data_layer
+
+def first_page(data_layer):
+    """Do the data layer work of the first dashboard view and time it"""
+    requests = data_layer.spreadsheet.requests
+    started = time.perf_counter()
+    data_layer.get_change_feed().get_changes('user-1')
+    data_layer.get_search_index()
+    return time.perf_counter() - started, data_layer.spreadsheet.requests - requests
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure time to first page with and without a cache snapshot')
+    parser.add_argument('--practices', type=int, default=100000, help='Number of practices in the sheet')
+    parser.add_argument('--checks', type=int, default=20000, help='Number of checks in the current month')
+    parser.add_argument('--new-rows', type=int, default=500, help='Rows added between snapshot and restart')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds per API call')
+    args = parser.parse_args()
+
+    # Open the fake spreadsheet instead of creating a new one
+    os.environ['SPREADSHEET_ID'] = 'fake-spreadsheet'
+    data_layer = DataLayer()
+    spreadsheet = FakeSpreadsheet(latency=args.latency)
+    spreadsheet.fill(data_layer.sheet_names['PRACTICES'], data_layer.headers['PRACTICES'],
+                     [practice_row(i) for i in range(args.practices)])
+    checks = spreadsheet.fill(f"{data_layer.sheet_names['CHECKS']}_{partition_key()}", data_layer.headers['CHECKS'],
+                              [check_row(i, args.practices) for i in range(args.checks)])
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'data_cache.pickle')
+
+        cold = open_data_layer(spreadsheet, snapshot_path)
+        cold_seconds, cold_requests = first_page(cold)
+        size = cold.cache_snapshot.save()
+
+        # Changes made while the application was down: renames, deletes and new rows
+        practices = spreadsheet.worksheet(data_layer.sheet_names['PRACTICES'])
+        for row in practices.rows[1:args.new_rows + 1]:
+            row[2] = f'Hernoemde praktijk {row[0]}'
+        del practices.rows[args.new_rows + 1:2 * args.new_rows + 1]
+        practices.rows.extend(practice_row(args.practices + i) for i in range(args.new_rows))
+        checks.rows.extend(check_row(args.checks + i, args.practices) for i in range(args.new_rows))
+
+        warm = open_data_layer(spreadsheet, snapshot_path)
+        warm_seconds, warm_requests = first_page(warm)
+        started = time.perf_counter()
+        warm.cache_reconciliation.join()
+        reconcile_seconds = time.perf_counter() - started + warm_seconds
+        expected = {row[0]: row[2] for row in practices.rows[1:]}
+        indexed = {practice_id: warm.search_index.get_practice(practice_id)['name']
+                   for practice_id in warm.search_index.practice_ids()}
+
+    print(f"Snapshot size: {size / 2**20:.1f} MB")
+    print(f"{'Start':<8}{'seconds':>10}{'API calls':>12}")
+    print(f"{'cold':<8}{cold_seconds:>10.2f}{cold_requests:>12}")
+    print(f"{'warm':<8}{warm_seconds:>10.2f}{warm_requests:>12}")
+    print(f"Warm start is {cold_seconds / warm_seconds:.1f}x faster")
+    print(f"Reconciled with the sheet after {reconcile_seconds:.2f} s, "
+          f"index {'matches' if indexed == expected else 'DOES NOT match'} the sheet")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Exportscript voor huisartsenpraktijken en de volledige controlehistorie.
+De gegevens worden in batches uit Google Sheets gelezen en direct naar het
+uitvoerbestand geschreven, zodat het geheugengebruik constant blijft.
+Voor Parquet is pyarrow nodig (pip install pyarrow).
+
+Gebruik:
+python export_data.py {practices,checks} UITVOER [--format csv|parquet]
+                      [--user USER_ID] [--practice PRACTICE_ID]
+                      [--from YYYY-MM-DD] [--until YYYY-MM-DD]
+"""
+
+import argparse
+import sys
+from dotenv import load_dotenv
+from modules.data_layer import DataLayer
+from modules.data_export import DataExporter, EXPORT_KINDS, EXPORT_FORMATS
+
+def main():
+    parser = argparse.ArgumentParser(description='Export practices or the check history')
+    parser.add_argument('kind', choices=sorted(EXPORT_KINDS), help='What to export')
+    parser.add_argument('output', help='Path of the output file')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                        help='Output format (default: derived from the file extension)')
+    parser.add_argument('--user', help='Only export records of this user ID')
+    parser.add_argument('--practice', help='Only export records of this practice ID')
+    parser.add_argument('--from', dest='start_date', help='First date to export (YYYY-MM-DD)')
+    parser.add_argument('--until', dest='end_date', help='Last date to export (YYYY-MM-DD)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows read per request')
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+
+    def show_progress(rows):
+        print(f"\r{rows} rows exported...", end='', flush=True)
+
+    exporter = DataExporter(DataLayer(), batch_size=args.batch_size)
+    result = exporter.export(
+        args.kind,
+        args.output,
+        fmt=fmt,
+        user_id=args.user,
+        practice_id=args.practice,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        progress_callback=show_progress
+    )
+    print()
+
+    if not result['success']:
+        print(f"❌ Export failed: {result['message']}")
+        sys.exit(1)
+
+    print(f"✅ Exported {result['rows']} rows to {args.output} in {result['seconds']:.2f} s "
+          f"({result['rowsPerSecond']:.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import json
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import parse_qs, urlsplit
+
+from modules.metrics import metrics
+
+class AnalysisJobs:
+    """
+    Website analyses that run as jobs in the Apps Script, so waiting for
+    OpenAI does not hold a thread per analysis.
+
+    submit() hands the URL to the script, which answers with a job id right
+    away, and returns a Future that is resolved with the analysis result,
+    the same dict analyze_website returns. One poller thread reads the
+    results of all outstanding jobs with a single getAnalyses request every
+    poll_interval seconds. With a callback port and a callback URL, a small
+    HTTP receiver is started as well and the script posts every result to
+    callback_url as soon as it is done; polling then only picks up lost
+    callbacks. The script runs at Google, so callback_url must be a public
+    URL that forwards to the receiver; without one no callbacks are asked
+    for.
+
+    Without an Apps Script URL, or when replaying a cassette, the analysis
+    is done directly and the Future is resolved before submit() returns.
+
+    Args:
+        bridge (OpenAIBridge): Bridge to the Apps Script
+        poll_interval (float): Seconds between two polls
+        job_timeout (float): Seconds after which a job counts as failed
+        callback_port (int): Port of the callback receiver, None for none
+        callback_url (str): Public URL under which the script reaches the
+            receiver, e.g. https://example.org/analysis
+        callback_host (str): Address the receiver binds to, 127.0.0.1 by
+            default for a reverse proxy on the same machine
+    """
+
+    CALLBACK_PATH = '/analysis'
+
+    def __init__(self, bridge, poll_interval=None, job_timeout=None, callback_port=None, callback_url=None,
+                 callback_host=None):
+        self.bridge = bridge
+        self.logger = bridge.logger
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('ANALYSIS_POLL_INTERVAL', '2'))
+        self.job_timeout = job_timeout if job_timeout is not None else float(os.getenv('ANALYSIS_JOB_TIMEOUT', '300'))
+        if callback_port is None and os.getenv('ANALYSIS_CALLBACK_PORT'):
+            callback_port = int(os.getenv('ANALYSIS_CALLBACK_PORT'))
+        self.callback_port = callback_port
+        self.callback_url = callback_url or os.getenv('ANALYSIS_CALLBACK_URL') or None
+        self.callback_host = callback_host or os.getenv('ANALYSIS_CALLBACK_HOST', '127.0.0.1')
+        # Sent along with the callback URL, so only the script can deliver results
+        self.token = secrets.token_urlsafe(16)
+        self.pending = {}  # job id -> (future, submitted at)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._poller = None
+        self._server = None
+
+    def submit(self, url):
+        """
+        Start the analysis of a website.
+
+        Returns:
+            Future: Resolved with the analysis result
+        """
+        future = Future()
+        if not self.bridge.apps_script_url or self.bridge.is_replaying():
+            # The mock analysis and recorded cassettes answer right away
+            future.set_result(self.bridge.analyze_website(url))
+            return future
+
+        self._start()
+        submitted = self.bridge.submit_analysis(url, self._callback_url())
+        if not submitted.get('success'):
+            metrics.inc('analysis_jobs_total', result='rejected')
+            future.set_result(submitted)
+            return future
+        metrics.inc('analysis_jobs_total', result='submitted')
+        with self._lock:
+            self.pending[submitted['jobId']] = (future, time.time())
+        self._wake.set()
+        return future
+
+    def complete(self, job_id, result, outcome=None):
+        """
+        Resolve a job with its result, from a poll or a callback.
+
+        Returns:
+            bool: Whether the job was outstanding
+        """
+        with self._lock:
+            job = self.pending.pop(job_id, None)
+        if job is None:
+            return False
+        future, submitted_at = job
+        metrics.observe('analysis_job_seconds', time.time() - submitted_at)
+        metrics.inc('analysis_jobs_total', result=outcome or ('done' if result.get('success') is not False else 'failed'))
+        future.set_result(result)
+        return True
+
+    def stop(self):
+        """Stop the poller and the callback receiver"""
+        self._stop.set()
+        self._wake.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _callback_url(self):
+        if self._server is None:
+            return None
+        separator = '&' if '?' in self.callback_url else '?'
+        return f'{self.callback_url}{separator}token={self.token}'
+
+    def _start(self):
+        """Start the poller and, with a callback port and URL, the receiver on first use"""
+        with self._lock:
+            if self._poller is not None:
+                return
+            if self.callback_port is not None and self.callback_url:
+                self._server = self._start_receiver()
+            elif self.callback_port is not None:
+                self.logger.warning("ANALYSIS_CALLBACK_PORT is set without ANALYSIS_CALLBACK_URL, polling only")
+            self._poller = threading.Thread(target=self._run_poller, name='analysis-jobs', daemon=True)
+        self._poller.start()
+
+    def _run_poller(self):
+        while not self._stop.is_set():
+            with self._lock:
+                idle = not self.pending
+            if idle:
+                # Sleep until a job is submitted
+                self._wake.wait()
+                self._wake.clear()
+            if self._stop.wait(self.poll_interval):
+                return
+            with self._lock:
+                job_ids = list(self.pending)
+            if not job_ids:
+                continue
+            try:
+                for start in range(0, len(job_ids), 100):
+                    results = self.bridge.get_analyses(job_ids[start:start + 100]) or {}
+                    for job_id, result in results.items():
+                        if result is not None:
+                            self.complete(job_id, result)
+            except Exception as e:
+                self.logger.error(f"Error polling analysis jobs: {str(e)}")
+            self._expire()
+
+    def _expire(self):
+        """Fail the jobs that have been running for longer than job_timeout"""
+        deadline = time.time() - self.job_timeout
+        with self._lock:
+            expired = [job_id for job_id, (_, submitted_at) in self.pending.items() if submitted_at < deadline]
+        for job_id in expired:
+            self.complete(job_id, {
+                'success': False,
+                'message': f'No analysis result after {self.job_timeout:.0f} seconds'
+            }, outcome='timeout')
+
+    def _start_receiver(self):
+        """Serve POST /analysis?token=... with {jobId, result} bodies, in a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        jobs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = urlsplit(self.path)
+                if parts.path.rstrip('/') != jobs.CALLBACK_PATH:
+                    self.send_error(404)
+                    return
+                if not secrets.compare_digest(parse_qs(parts.query).get('token', [''])[0], jobs.token):
+                    self.send_error(403)
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                    job_id, result = body['jobId'], body['result']
+                except (ValueError, KeyError, TypeError):
+                    self.send_error(400)
+                    return
+                if not isinstance(job_id, str) or not isinstance(result, dict):
+                    self.send_error(400)
+                    return
+                metrics.inc('analysis_callbacks_total')
+                known = jobs.complete(job_id, result)
+                self.send_response(200 if known else 404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((self.callback_host, self.callback_port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='analysis-callbacks', daemon=True).start()
+        self.logger.info(f"Receiving analysis callbacks on {self.callback_host}:{server.server_address[1]}")
+        return server
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import time
+
+from modules.metrics import metrics
+from modules.registration_locator import target_url
+from modules.website_checker import lease_key, run_summary
+
+class AsyncOpenAIBridge:
+    """
+    asyncio version of OpenAIBridge.analyze_website, on an httpx.AsyncClient.
+
+    Uses the configuration of a synchronous bridge (Apps Script URL,
+    timeout, retries, logger) and backs off with asyncio.sleep, so a
+    retry does not block the event loop. Without an Apps Script URL the
+    mock analysis is used; requests through a cassette are done by the
+    synchronous bridge in a worker thread.
+
+    Args:
+        bridge (OpenAIBridge): The bridge to take the configuration from
+        client (httpx.AsyncClient): Client for the requests
+    """
+
+    def __init__(self, bridge, client):
+        self.bridge = bridge
+        self.client = client
+        self.logger = bridge.logger
+
+    async def analyze_website(self, url):
+        """
+        Analyze a website through the Apps Script endpoint.
+
+        Returns:
+            dict: Analysis results with status, confidence, and details
+        """
+        started = time.perf_counter()
+        try:
+            return await self._analyze_website(url)
+        finally:
+            metrics.observe('openai_bridge_analyze_seconds', time.perf_counter() - started)
+
+    async def _analyze_website(self, url):
+        import httpx
+        if not url:
+            return {
+                'success': False,
+                'message': 'No URL provided for analysis'
+            }
+        if not self.bridge.apps_script_url and not self.bridge.is_replaying():
+            return self.bridge._mock_website_analysis(url)
+        if self.bridge.cassette is not None:
+            return await asyncio.to_thread(self.bridge.analyze_website, url)
+
+        for attempt in range(self.bridge.max_retries):
+            try:
+                response = await self._post({'action': 'analyzeWebsite', 'url': url})
+            except httpx.TimeoutException:
+                self.logger.warning(f"Timeout while calling Apps Script endpoint (attempt {attempt + 1})")
+                if attempt == self.bridge.max_retries - 1:
+                    return {
+                        'success': False,
+                        'message': 'Timeout while connecting to Apps Script endpoint'
+                    }
+                metrics.inc('openai_bridge_retries_total', reason='timeout')
+                await asyncio.sleep(2 ** (attempt + 1))
+                continue
+            except httpx.HTTPError as e:
+                self.logger.error(f"Error connecting to Apps Script endpoint: {str(e)}")
+                return {
+                    'success': False,
+                    'message': f'Error connecting to Apps Script endpoint: {str(e)}'
+                }
+
+            if response.status_code != 200:
+                if 500 <= response.status_code < 600 and attempt < self.bridge.max_retries - 1:
+                    metrics.inc('openai_bridge_retries_total', reason='server_error')
+                    await asyncio.sleep(1)
+                    continue
+                return {
+                    'success': False,
+                    'message': f'Error from Apps Script API: {response.status_code} - {response.text}'
+                }
+            try:
+                return response.json()
+            except ValueError as e:
+                return {
+                    'success': False,
+                    'message': f'Invalid response format from Apps Script: {str(e)}'
+                }
+
+        return {
+            'success': False,
+            'message': 'Failed to analyze website after multiple attempts'
+        }
+
+    async def _post(self, payload):
+        metrics.inc('apps_script_requests_total', action=payload.get('action'))
+        started = time.perf_counter()
+        try:
+            # Apps Script answers with a redirect to the result
+            return await self.client.post(
+                self.bridge.apps_script_url, json=payload, timeout=self.bridge.timeout, follow_redirects=True
+            )
+        finally:
+            metrics.observe('apps_script_request_seconds', time.perf_counter() - started)
+
+class AsyncCheckPipeline:
+    """
+    Check all websites of a user as a pipeline of async generators:
+    fetch (practices with their lease), classify (the analysis, at most
+    `concurrency` at a time) and persist (storing the check and the
+    practice, which marks the notification on a change to ACCEPTING like
+    every other check).
+
+    Analyses run concurrently on one event loop instead of one after the
+    other; the DataLayer, the leases and the registration page locator
+    are synchronous and run in worker threads. Storing is done one check
+    at a time, like the synchronous check. When the run ends early, the
+    stages are closed from the end, so running analyses are cancelled and
+    the leases that were not stored are released.
+
+    Args:
+        checker (WebsiteChecker): Checker whose bridge, leases, locator
+            and storage are used
+        concurrency (int): Analyses running at the same time
+    """
+
+    def __init__(self, checker, concurrency=None):
+        self.checker = checker
+        self.concurrency = concurrency or int(os.getenv('CHECK_CONCURRENCY', '10'))
+
+    def run(self, user_id):
+        """Check all websites of a user, for callers without an event loop like the Streamlit pages"""
+        return asyncio.run(self.check_all(user_id))
+
+    async def check_all(self, user_id):
+        """
+        Check all websites of a user.
+
+        Returns:
+            dict: The same summary as WebsiteChecker.check_all_user_websites
+        """
+        import httpx
+        checker = self.checker
+        practices = await asyncio.to_thread(checker.data_layer.get_practices_by_user, user_id)
+        if not practices:
+            return {
+                'success': True,
+                'message': 'No practices found for user',
+                'totalChecked': 0,
+                'statusChanges': 0
+            }
+
+        deferred = []
+        results = []
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(limits=limits) as client:
+            bridge = AsyncOpenAIBridge(checker.openai_bridge, client)
+            fetched = self.fetch(practices, deferred)
+            classified = self.classify(fetched, bridge)
+            persisted = self.persist(classified, user_id)
+            try:
+                async for practice, result in persisted:
+                    results.append((practice, result))
+            finally:
+                for stream in (persisted, classified, fetched):
+                    await stream.aclose()
+
+        # Websites that are being checked elsewhere wait for that check, like a single check
+        for practice in deferred:
+            result = await asyncio.to_thread(
+                checker.check_single_website, practice['websiteUrl'], user_id, practice['practiceId']
+            )
+            results.append((practice, result))
+
+        return run_summary(results)
+
+    async def fetch(self, practices, deferred):
+        """Yield (practice, lease) for every practice whose lease was acquired, defer the others"""
+        for practice in practices:
+            lease = await asyncio.to_thread(self.checker.leases.acquire, lease_key(practice['websiteUrl']))
+            if lease is None:
+                deferred.append(practice)
+                continue
+            metrics.inc('website_check_leases_total', result='acquired')
+            yield practice, lease
+
+    async def classify(self, stream, bridge):
+        """
+        Analyze the websites of the stream, at most `concurrency` at a time,
+        and yield (practice, lease, located path, analysis result) in the
+        order the analyses finish. When the stream is closed before every
+        analysis was handed over, the running analyses are cancelled and
+        the leases of all analyses not handed over are released.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = asyncio.Queue()
+        leases = {}  # token -> lease of the analyses not handed over yet
+
+        async def analyze(practice, lease):
+            path = None
+            try:
+                async with semaphore:
+                    url = practice['websiteUrl']
+                    cached_path = practice.get('targetPath')
+                    if not cached_path and self.checker.can_locate():
+                        path = await asyncio.to_thread(self.checker.locator.locate, url)
+                    analysis_result = await bridge.analyze_website(target_url(url, cached_path or path))
+            except Exception as e:
+                analysis_result = {
+                    'success': False,
+                    'message': f'Error checking website: {str(e)}'
+                }
+            await done.put((practice, lease, path, analysis_result))
+
+        tasks = []
+        handed_over = 0
+        try:
+            async for practice, lease in stream:
+                leases[lease.token] = lease
+                tasks.append(asyncio.create_task(analyze(practice, lease)))
+                # Hand over finished analyses while the rest is still being started
+                while not done.empty():
+                    handed_over += 1
+                    item = done.get_nowait()
+                    del leases[item[1].token]
+                    yield item
+            while handed_over < len(tasks):
+                handed_over += 1
+                item = await done.get()
+                del leases[item[1].token]
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            for lease in leases.values():
+                self.checker.leases.release(lease)
+
+    async def persist(self, stream, user_id):
+        """Store every analysis as a check and release its lease, yield (practice, result)"""
+        async for practice, lease, path, analysis_result in stream:
+            result = await asyncio.to_thread(
+                self.checker.finish_async_check, practice, lease, path, analysis_result, user_id
+            )
+            yield practice, result
@@ -1,4 +1,3 @@
-import streamlit as st
 import os
 import uuid
 
@@ -0,0 +1,108 @@
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+
+# Bump when the layout of the snapshot or of the cached objects changes
+SNAPSHOT_VERSION = 1
+
+class CacheSnapshot:
+    """
+    Local snapshot of the in-memory caches of the DataLayer.
+
+    The search index and the change feed are written to a pickle file at
+    a fixed interval. After a restart the DataLayer loads them from this
+    file and only reads the rows that were added since, instead of reading
+    every sheet from Google before the first page can be served. Changes
+    to existing rows are picked up by a reconciliation in the background.
+    """
+
+    def __init__(self, data_layer, path=None, interval=None):
+        self.data_layer = data_layer
+        self.path = path or os.getenv('CACHE_SNAPSHOT_PATH', os.path.join('cache', 'data_cache.pickle'))
+        self.interval = interval if interval is not None else int(os.getenv('CACHE_SNAPSHOT_INTERVAL', '300'))
+        self.saved_at = None
+        self.saved_bytes = 0
+        self.saved_generation = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def save(self):
+        """
+        Write the current caches to the snapshot file.
+
+        The file is replaced atomically, so a crash while saving leaves the
+        previous snapshot intact.
+
+        Returns:
+            int: Size of the snapshot in bytes, or 0 when there was nothing new to save
+        """
+        state = self.data_layer.get_cache_state()
+        if state is None or state['generation'] == self.saved_generation:
+            return 0
+        state.update({
+            'version': SNAPSHOT_VERSION,
+            'spreadsheetId': self.data_layer.spreadsheet_id,
+            'savedAt': datetime.now().isoformat()
+        })
+        # Cached objects serialize themselves under their own lock
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(payload)
+        os.replace(temporary_path, self.path)
+
+        self.saved_at = state['savedAt']
+        self.saved_bytes = len(payload)
+        self.saved_generation = state['generation']
+        return self.saved_bytes
+
+    def load(self):
+        """
+        Read the snapshot file.
+
+        Returns:
+            dict: The saved state, or None when there is no usable snapshot
+                for the current spreadsheet
+        """
+        if not os.path.exists(self.path):
+            return None
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as file:
+                state = pickle.load(file)
+        except Exception as e:
+            print(f"Error loading cache snapshot: {e}")
+            return None
+
+        if state.get('version') != SNAPSHOT_VERSION or state.get('spreadsheetId') != self.data_layer.spreadsheet_id:
+            # Written by another version or for another spreadsheet
+            return None
+        state['loadSeconds'] = time.perf_counter() - started
+        # Nothing has changed since this snapshot was written
+        self.saved_at = state['savedAt']
+        self.saved_generation = state['generation']
+        return state
+
+    def start(self):
+        """Save a snapshot now and then every interval, in a background thread"""
+        if self._thread is not None or not self.interval:
+            return
+        self._thread = threading.Thread(target=self._run, name='cache-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop saving snapshots"""
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error saving cache snapshot: {e}")
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+import requests
+
+CASSETTE_VERSION = 2
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """Raised in replay mode for a request that was never recorded"""
+
+class CassetteResponse:
+    """A recorded response, with the parts of a requests response the bridge uses"""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+class Cassette:
+    """
+    Recorded Apps Script request/response pairs in a local JSON Lines file.
+
+    In record mode every request is sent to the endpoint and appended to
+    the file with its response and duration, one interaction per line, so
+    recording does not rewrite the cassette. In replay mode the stored responses are
+    served in the order they were recorded, without network access,
+    optionally with the original latency.
+
+    Args:
+        path (str): Path of the cassette file
+        mode (str): 'record' or 'replay'
+        replay_latency (bool): Sleep for the recorded duration when replaying
+    """
+
+    MODES = ('record', 'replay')
+
+    def __init__(self, path, mode='replay', replay_latency=False):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.interactions = []
+        self._by_request = {}  # request key -> interactions in recorded order
+        self._positions = {}  # request key -> next interaction to replay
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_env(cls):
+        """Create the cassette configured in the environment, or None"""
+        mode = os.getenv('OPENAI_BRIDGE_CASSETTE_MODE', '').lower()
+        if not mode:
+            return None
+        return cls(
+            os.getenv('OPENAI_BRIDGE_CASSETTE', os.path.join('cassettes', 'apps_script.jsonl')),
+            mode,
+            os.getenv('OPENAI_BRIDGE_REPLAY_LATENCY', 'false').lower() == 'true'
+        )
+
+    @staticmethod
+    def request_key(payload):
+        """Identify a request by its JSON payload"""
+        return json.dumps(payload, sort_keys=True)
+
+    def load(self):
+        """Read the recorded interactions from the cassette file"""
+        if not os.path.exists(self.path):
+            if self.mode == 'replay':
+                raise FileNotFoundError(f"Cassette not found: {self.path}")
+            return
+        with open(self.path, encoding='utf-8') as file:
+            # A version line followed by one interaction per line
+            self.interactions = [json.loads(line) for line in file.read().splitlines()[1:] if line.strip()]
+        for interaction in self.interactions:
+            self._by_request.setdefault(self.request_key(interaction['request']), []).append(interaction)
+
+    def append(self, interaction):
+        """Append an interaction to the cassette file; the caller holds the lock"""
+        new_file = not os.path.exists(self.path)
+        if new_file:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            if new_file:
+                file.write(json.dumps({'version': CASSETTE_VERSION}) + '\n')
+            file.write(json.dumps(interaction) + '\n')
+
+    def post(self, url, payload, timeout):
+        """
+        Send or replay a POST request with a JSON payload.
+
+        Returns:
+            A requests response when recording, a CassetteResponse when replaying
+
+        Raises:
+            requests.exceptions.RequestException: Recorded or live request errors
+        """
+        if self.mode == 'replay':
+            return self._replay(payload)
+        return self._record(url, payload, timeout)
+
+    def _record(self, url, payload, timeout):
+        interaction = {'request': payload}
+        started = time.perf_counter()
+        try:
+            response = requests.post(url, json=payload, timeout=timeout)
+            interaction['response'] = {'status_code': response.status_code, 'text': response.text}
+            return response
+        except requests.exceptions.Timeout:
+            interaction['error'] = 'timeout'
+            raise
+        except requests.exceptions.RequestException as e:
+            interaction['error'] = str(e)
+            raise
+        finally:
+            interaction['seconds'] = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self.interactions.append(interaction)
+                self._by_request.setdefault(self.request_key(payload), []).append(interaction)
+                self.append(interaction)
+
+    def _replay(self, payload):
+        key = self.request_key(payload)
+        with self._lock:
+            matches = self._by_request.get(key)
+            if not matches:
+                raise CassetteMiss(f"No recorded response for request {key}")
+            # Serve repeated requests in recorded order, then keep serving the last one
+            position = self._positions.get(key, 0)
+            interaction = matches[min(position, len(matches) - 1)]
+            self._positions[key] = position + 1
+
+        if self.replay_latency and interaction.get('seconds'):
+            time.sleep(interaction['seconds'])
+        if interaction.get('error') == 'timeout':
+            raise requests.exceptions.Timeout(f"Recorded timeout for request {key}")
+        if 'error' in interaction:
+            raise requests.exceptions.ConnectionError(interaction['error'])
+        response = interaction['response']
+        return CassetteResponse(response['status_code'], response['text'])
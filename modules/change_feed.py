@@ -0,0 +1,76 @@
+import pickle
+import threading
+from collections import deque
+
+class ChangeFeed:
+    """
+    Recent status changes per user, kept in bounded in-memory ring buffers.
+
+    The feed remembers how far it has read the checks partitions, so every
+    refresh only fetches the rows that were added since the last one.
+    """
+
+    def __init__(self, data_layer, max_changes=50):
+        self.data_layer = data_layer
+        self.max_changes = max_changes
+        self.cursor = None  # (partition key, next row) of the checks to read
+        self._changes = {}  # userId -> deque of changes, newest first
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # The data layer is not part of the snapshot, it is set again on restore
+        with self._lock:
+            return pickle.dumps((self.max_changes, self.cursor, self._changes), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __setstate__(self, state):
+        max_changes, cursor, changes = pickle.loads(state)
+        self.__init__(None, max_changes)
+        self.cursor = cursor
+        self._changes = changes
+
+    def refresh(self):
+        """
+        Fetch the status changes that were stored since the last refresh.
+
+        The Sheets reads run outside the lock, so readers of the feed do not
+        wait for them; the changes are applied only if no other refresh moved
+        the cursor meanwhile, so no change is added twice.
+        """
+        with self._lock:
+            cursor = self.cursor
+        changes, next_cursor = self.data_layer.get_status_changes(cursor)
+
+        entries = []  # (userId, change), oldest first
+        if changes:
+            # The search index knows the name and owner of every practice
+            search_index = self.data_layer.get_search_index()
+            for check in changes:
+                practice = search_index.get_practice(check.get('practiceId'))
+                if not practice:
+                    continue
+                entries.append((practice['userId'], {
+                    'practiceId': check.get('practiceId'),
+                    'practice': practice.get('name'),
+                    'timestamp': check.get('timestamp'),
+                    'oldStatus': check.get('previousStatus'),
+                    'newStatus': check.get('status')
+                }))
+
+        with self._lock:
+            if self.cursor != cursor:
+                # Another refresh read these rows already
+                return 0
+            self.cursor = next_cursor
+            for user_id, change in entries:
+                user_changes = self._changes.get(user_id)
+                if user_changes is None:
+                    user_changes = self._changes[user_id] = deque(maxlen=self.max_changes)
+                user_changes.appendleft(change)
+        return len(changes)
+
+    def get_changes(self, user_id, limit=10, refresh=True):
+        """Get the most recent status changes of a user, newest first"""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return list(self._changes.get(user_id, ()))[:limit]
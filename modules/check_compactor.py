@@ -0,0 +1,54 @@
+def is_status_change(check):
+    """Check if a check changed the status of its practice"""
+    return bool(check.get('previousStatus')) and check.get('status') != check.get('previousStatus')
+
+def start_run(check):
+    """Turn a check into the first check of a run, filling the run columns"""
+    check['firstSeen'] = check.get('firstSeen') or check.get('timestamp')
+    check['lastSeen'] = check.get('lastSeen') or check.get('timestamp')
+    check['count'] = int(check.get('count') or 1)
+    return check
+
+def can_extend(run, check):
+    """
+    Check if a check can be merged into a run of its practice.
+
+    Only unchanged checks with the same status are merged, so every status
+    change keeps its own row with full details.
+    """
+    return run.get('status') == check.get('status') and not is_status_change(check)
+
+def extend_run(run, check):
+    """Merge an unchanged check into a run"""
+    last_seen = check.get('lastSeen') or check.get('timestamp')
+    if last_seen and str(last_seen) > str(run.get('lastSeen') or ''):
+        run['lastSeen'] = last_seen
+    run['count'] = int(run.get('count') or 1) + int(check.get('count') or 1)
+    return run
+
+def compact_checks(checks):
+    """
+    Run-length encode a list of checks.
+
+    Consecutive unchanged checks of a practice are stored as one row with
+    firstSeen, lastSeen and count. The first check of every run, including
+    every status change, keeps its details.
+
+    Args:
+        checks (list): Check records in the order they were stored
+
+    Returns:
+        list: The compacted checks, ordered by the start of their run
+    """
+    runs = []
+    open_runs = {}  # practiceId -> last run of that practice
+    for check in checks:
+        practice_id = check.get('practiceId')
+        run = open_runs.get(practice_id)
+        if run is not None and can_extend(run, check):
+            extend_run(run, check)
+        else:
+            run = start_run(dict(check))
+            runs.append(run)
+            open_runs[practice_id] = run
+    return runs
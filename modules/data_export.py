@@ -0,0 +1,184 @@
+import csv
+import os
+import time
+from datetime import date, datetime
+
+# Export kinds with their sheet and the column used for date filtering
+EXPORT_KINDS = {
+    'practices': ('PRACTICES', 'lastChecked'),
+    'checks': ('CHECKS', 'timestamp')
+}
+EXPORT_FORMATS = ('csv', 'parquet')
+
+class DataExporter:
+    """Stream practices and the check history to CSV or Parquet files"""
+
+    def __init__(self, data_layer, batch_size=1000):
+        self.data_layer = data_layer
+        self.batch_size = batch_size
+
+    def export(self, kind, output, fmt='csv', user_id=None, practice_id=None,
+               start_date=None, end_date=None, progress_callback=None):
+        """
+        Export all records of a kind, one batch at a time.
+
+        Only one batch of records is held in memory, so exporting the full
+        check history uses constant memory. An export to a path is written
+        to a temporary file that replaces the path only when it succeeds.
+
+        Args:
+            kind (str): 'practices' or 'checks'
+            output: Path or writable file object (text for CSV, binary for Parquet)
+            fmt (str): 'csv' or 'parquet'
+            user_id (str): Only export records of this user
+            practice_id (str): Only export records of this practice
+            start_date: First date (date or 'YYYY-MM-DD') to export, inclusive
+            end_date: Last date (date or 'YYYY-MM-DD') to export, inclusive
+            progress_callback (callable): Called after every batch with the
+                number of exported rows
+
+        Returns:
+            dict: Export result with the number of rows and the throughput
+        """
+        if kind not in EXPORT_KINDS:
+            return {'success': False, 'message': f'Unknown export kind: {kind}'}
+        if fmt not in EXPORT_FORMATS:
+            return {'success': False, 'message': f'Unknown export format: {fmt}'}
+        if fmt == 'parquet':
+            # pyarrow is optional, it is only needed for this format
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                return {'success': False, 'message': 'Parquet export requires pyarrow (pip install pyarrow)'}
+
+        sheet_key, date_column = EXPORT_KINDS[kind]
+        headers = self.data_layer.headers[sheet_key]
+        start_date = self._to_date_string(start_date)
+        end_date = self._to_date_string(end_date)
+
+        # Checks have no userId column, so filter them on the practices of the user
+        practice_ids = None
+        if user_id and kind == 'checks':
+            practice_ids = self._get_practice_ids(user_id)
+
+        started = time.perf_counter()
+        rows = 0
+        writer = None
+        temporary_path = output + '.tmp' if isinstance(output, str) else None
+        try:
+            writer = self._open_writer(temporary_path or output, fmt, headers)
+            # Checks are partitioned by month, so only the months in range are read
+            batches = self.data_layer.iter_records(sheet_key, self.batch_size, start=start_date, end=end_date)
+            for batch in batches:
+                records = [
+                    record for record in batch
+                    if self._matches(record, user_id, practice_id, practice_ids,
+                                     date_column, start_date, end_date)
+                ]
+                if records:
+                    writer.write(records)
+                    rows += len(records)
+                if progress_callback:
+                    progress_callback(rows)
+            writer.close()
+            writer = None
+            if temporary_path:
+                os.replace(temporary_path, output)
+        except Exception as e:
+            print(f"Error exporting {kind}: {str(e)}")
+            return {'success': False, 'message': f'Error exporting {kind}: {str(e)}', 'rows': rows}
+        finally:
+            if writer:
+                writer.close()
+            # Leave no partial file behind after a failed export
+            if temporary_path and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+        seconds = time.perf_counter() - started
+        return {
+            'success': True,
+            'message': f'Exported {rows} {kind} in {seconds:.1f} s',
+            'rows': rows,
+            'seconds': seconds,
+            'rowsPerSecond': rows / seconds if seconds > 0 else 0
+        }
+
+    def _get_practice_ids(self, user_id):
+        """Get the IDs of all practices of a user"""
+        practice_ids = set()
+        for batch in self.data_layer.iter_records('PRACTICES', self.batch_size):
+            practice_ids.update(p['practiceId'] for p in batch if p.get('userId') == user_id)
+        return practice_ids
+
+    def _matches(self, record, user_id, practice_id, practice_ids, date_column, start_date, end_date):
+        """Check if a record passes the export filters"""
+        if practice_id and record.get('practiceId') != practice_id:
+            return False
+        if practice_ids is not None:
+            if record.get('practiceId') not in practice_ids:
+                return False
+        elif user_id and record.get('userId') != user_id:
+            return False
+
+        if start_date or end_date:
+            # ISO timestamps compare correctly on their date prefix
+            record_date = str(record.get(date_column) or '')[:10]
+            if not record_date:
+                return False
+            if start_date and record_date < start_date:
+                return False
+            if end_date and record_date > end_date:
+                return False
+        return True
+
+    def _to_date_string(self, value):
+        """Convert a date, datetime or ISO string to 'YYYY-MM-DD'"""
+        if not value:
+            return None
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()[:10]
+        return str(value)[:10]
+
+    def _open_writer(self, output, fmt, headers):
+        """Create the writer for the export format"""
+        if fmt == 'parquet':
+            return _ParquetWriter(output, headers)
+        return _CsvWriter(output, headers)
+
+class _CsvWriter:
+    """Write record batches to a CSV file"""
+
+    def __init__(self, output, headers):
+        self.owns_file = isinstance(output, str)
+        self.file = open(output, 'w', newline='', encoding='utf-8') if self.owns_file else output
+        self.writer = csv.DictWriter(self.file, fieldnames=headers, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, records):
+        self.writer.writerows(records)
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+
+class _ParquetWriter:
+    """Write record batches as row groups of a Parquet file"""
+
+    def __init__(self, output, headers):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.headers = headers
+        self.schema = pa.schema([(header, pa.string()) for header in headers])
+        self.writer = pq.ParquetWriter(output, self.schema)
+
+    def write(self, records):
+        columns = {
+            header: [None if r.get(header) is None else str(r.get(header)) for r in records]
+            for header in self.headers
+        }
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
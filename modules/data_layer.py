@@ -1,15 +1,25 @@
-import streamlit as st
 import os
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import json
+import re
 import uuid
+import threading
+import time
 from datetime import datetime
+from modules.search_index import PracticeSearchIndex
+from modules.postcode_index import PostcodeIndex
+from modules.practice_counters import PracticeCounters
+from modules.change_feed import ChangeFeed
+from modules.cache_snapshot import CacheSnapshot
+from modules.status_history import StatusHistoryIndex, get_status_history
+from modules.check_compactor import start_run, can_extend, extend_run, compact_checks, is_status_change
+from modules.records import Record, Status, Practice, User, Check
+from modules.partitions import PartitionManager, PARTITIONED_SHEETS, partition_key, next_partition_key
+from modules.metrics import metrics
 
+@metrics.instrument('datalayer_method_seconds')
 class DataLayer:
-    def __init__(self):
-        # Initialize connection to Google Sheets
+    def __init__(self, client=None):
+        # Initialize connection to Google Sheets, or to the given gspread-compatible client
         self.spreadsheet_id = os.getenv('SPREADSHEET_ID', '')
         self.sheet_names = {
             'USERS': 'Gebruikers',
@@ -17,23 +27,48 @@ class DataLayer:
             'CHECKS': 'Controles',
             'LOGS': 'Logs'
         }
+        self.headers = {
+            'USERS': list(User.FIELDS),
+            'PRACTICES': list(Practice.FIELDS),
+            'CHECKS': list(Check.FIELDS),
+            'LOGS': ['timestamp', 'level', 'message', 'data']
+        }
+        self.client = client
+        self.spreadsheet = None
+        self.practice_listeners = []
+        self.search_index = None
+        self.postcode_index = None
+        self.practice_counters = None
+        self.change_feed = None
+        self.mock_checks = []
+        self.check_runs = None  # practiceId -> (partition key, row number, last stored run)
+        self.status_history = None
+        self.partitions = PartitionManager(self)
+        self.cache_snapshot = CacheSnapshot(self)
+        self.cache_stats = {}
+        self.practices_cursor = 2  # Next row of the practices sheet to add to the search index
+        self._cache_restored = False
+        self.cache_reconciliation = None  # Thread that checks the restored caches against the sheet
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
         self.initialize_database()
     
     def initialize_database(self, force_reinit=False):
         """Initialize the database connection"""
         try:
-            # Check if credentials exist
-            if os.path.exists('google_credentials.json'):
-                scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-                creds = ServiceAccountCredentials.from_json_keyfile_name('google_credentials.json', scope)
-                self.client = gspread.authorize(creds)
-                
+            if self.client is None:
+                self.client = self._create_client()
+            if getattr(self.client, 'session', None) is not None:
+                # Count every Sheets API request, by HTTP status
+                self.client.session.hooks['response'].append(self._count_api_request)
+            
+            if self.client is not None:
                 # Get or create the spreadsheet
                 if not self.spreadsheet_id:
                     # Create new spreadsheet
                     spreadsheet = self.client.create('Huisarts Check Database')
                     self.spreadsheet_id = spreadsheet.id
-                    st.session_state['spreadsheet_id'] = self.spreadsheet_id
+                    self._remember_spreadsheet_id()
                     print(f"Created new spreadsheet with ID: {self.spreadsheet_id}")
                 else:
                     # Try to open existing spreadsheet
@@ -44,11 +79,12 @@ class DataLayer:
                         # Create new spreadsheet if opening fails
                         spreadsheet = self.client.create('Huisarts Check Database')
                         self.spreadsheet_id = spreadsheet.id
-                        st.session_state['spreadsheet_id'] = self.spreadsheet_id
+                        self._remember_spreadsheet_id()
                         print(f"Created new spreadsheet with ID: {self.spreadsheet_id}")
                 
                 # Initialize sheets if needed
                 self.ensure_database_structure(spreadsheet)
+                self.spreadsheet = spreadsheet
                 return True
             else:
                 print("Google credentials file not found")
@@ -57,38 +93,48 @@ class DataLayer:
             print(f"Error initializing database: {e}")
             return False
     
+    def _create_client(self):
+        """Authorize a gspread client with the service account credentials, if they exist"""
+        if not os.path.exists('google_credentials.json'):
+            return None
+        # Imported here, so the modules load fast and without the Google libraries
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+        creds = ServiceAccountCredentials.from_json_keyfile_name('google_credentials.json', scope)
+        return gspread.authorize(creds)
+    
+    def _remember_spreadsheet_id(self):
+        """Keep the ID of a newly created spreadsheet in the session, for the settings page"""
+        import streamlit as st
+        st.session_state['spreadsheet_id'] = self.spreadsheet_id
+    
+    def _count_api_request(self, response, *args, **kwargs):
+        metrics.inc('sheets_api_requests_total', status=response.status_code)
+    
     def ensure_database_structure(self, spreadsheet):
         """Ensure all required sheets exist with proper headers"""
-        # User sheet
-        self.ensure_sheet(spreadsheet, self.sheet_names['USERS'], [
-            'userId', 'email', 'isActive', 'isAdmin', 'settings'
-        ])
-        
-        # Practices sheet
-        self.ensure_sheet(spreadsheet, self.sheet_names['PRACTICES'], [
-            'practiceId', 'userId', 'name', 'websiteUrl', 'status', 
-            'lastChecked', 'lastStatusChange', 'details'
-        ])
-        
-        # Checks sheet
-        self.ensure_sheet(spreadsheet, self.sheet_names['CHECKS'], [
-            'checkId', 'practiceId', 'timestamp', 'status', 'previousStatus', 
-            'details', 'notificationSent'
-        ])
-        
-        # Logs sheet
-        self.ensure_sheet(spreadsheet, self.sheet_names['LOGS'], [
-            'timestamp', 'level', 'message', 'data'
-        ])
+        for sheet_key, sheet_name in self.sheet_names.items():
+            if sheet_key in PARTITIONED_SHEETS:
+                # Monthly partitions are created when the first record is stored
+                continue
+            self.ensure_sheet(spreadsheet, sheet_name, self.headers[sheet_key])
     
     def ensure_sheet(self, spreadsheet, sheet_name, headers):
         """Ensure a sheet exists with the correct headers"""
+        import gspread
         try:
             # Try to get the sheet
             sheet = spreadsheet.worksheet(sheet_name)
             # Check if headers are correct
             existing_headers = sheet.row_values(1)
-            if existing_headers != headers:
+            if existing_headers == headers[:len(existing_headers)] and existing_headers:
+                if len(existing_headers) < len(headers):
+                    # New columns were added, extend the headers and keep the data
+                    if sheet.col_count < len(headers):
+                        sheet.add_cols(len(headers) - sheet.col_count)
+                    sheet.update('A1', [headers])
+            elif existing_headers != headers:
                 # Clear and set new headers
                 sheet.clear()
                 sheet.append_row(headers)
@@ -97,42 +143,349 @@ class DataLayer:
             sheet = spreadsheet.add_worksheet(title=sheet_name, rows=1, cols=len(headers))
             sheet.append_row(headers)
     
+    def _get_worksheet(self, sheet_key):
+        """Get the worksheet for a sheet key, or None when not connected"""
+        if not self.spreadsheet:
+            return None
+        return self.spreadsheet.worksheet(self.sheet_names[sheet_key])
+    
+    def _to_row(self, sheet_key, record):
+        """Convert a record dict to a row in the column order of the sheet"""
+        row = []
+        for header in self.headers[sheet_key]:
+            value = record.get(header)
+            if value is None:
+                value = ''
+            elif isinstance(value, Record):
+                value = json.dumps(value.to_dict())
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            elif isinstance(value, Status):
+                value = value.value
+            row.append(value)
+        return row
+    
+    def _from_row(self, sheet_key, row):
+        """Convert a row of cell values to a record dict"""
+        headers = self.headers[sheet_key]
+        row = list(row) + [''] * (len(headers) - len(row))
+        return dict(zip(headers, row))
+    
+    def iter_records(self, sheet_key, batch_size=1000, start_row=2, start=None, end=None):
+        """
+        Iterate over all records of a sheet in batches.
+        
+        Reads one row range per batch instead of the whole sheet, so memory
+        use stays constant however large the sheet grows. The checks and
+        logs are stored in monthly partitions (see modules/partitions.py);
+        only the partitions between start and end are read.
+        
+        The records are plain dicts of cell values, as stored; callers that
+        keep them around convert them with Practice.from_dict and friends.
+        
+        Args:
+            sheet_key (str): Key of the sheet, e.g. 'PRACTICES' or 'CHECKS'
+            batch_size (int): Number of rows to read per request
+            start_row (int): First sheet row to read; row 1 holds the headers.
+                Not used for partitioned sheets.
+            start: Only read partitions that can hold records from this time on
+            end: Only read partitions that can hold records up to this time
+            
+        Yields:
+            list: Records (dicts) of the next batch
+        """
+        if self.spreadsheet is None:
+            # Mock implementation, yields the records as the sheet would return them
+            if sheet_key == 'PRACTICES':
+                records = self.get_practices_by_user('12345')
+            elif sheet_key == 'CHECKS':
+                records = self.mock_checks[start_row - 2:]
+            else:
+                return
+            for start_index in range(0, len(records), batch_size):
+                yield [
+                    self._from_row(sheet_key, self._to_row(sheet_key, record))
+                    for record in records[start_index:start_index + batch_size]
+                ]
+            return
+        
+        if sheet_key in PARTITIONED_SHEETS:
+            # The unpartitioned sheet is read until archive_partitions has moved its rows
+            legacy = self.partitions.get_legacy_worksheet(sheet_key)
+            if legacy is not None:
+                yield from self._iter_sheet_rows(legacy, sheet_key, batch_size)
+            for key in self.partitions.keys_for_range(sheet_key, start, end):
+                yield from self.partitions.iter_partition(sheet_key, key, batch_size)
+            return
+        
+        yield from self._iter_sheet_rows(self._get_worksheet(sheet_key), sheet_key, batch_size, start_row)
+    
+    def _iter_sheet_rows(self, sheet, sheet_key, batch_size=1000, start_row=2):
+        """Read the rows of a worksheet as records, one row range per batch"""
+        from gspread.utils import rowcol_to_a1
+        last_column = rowcol_to_a1(1, len(self.headers[sheet_key]))[:-1]
+        while True:
+            end_row = start_row + batch_size - 1
+            values = sheet.get_values(f'A{start_row}:{last_column}{end_row}')
+            if not values:
+                return
+            yield [self._from_row(sheet_key, row) for row in values]
+            if len(values) < batch_size:
+                return
+            start_row = end_row + 1
+    
+    def add_practice_listener(self, listener):
+        """
+        Register a listener that is notified of practice changes.
+        
+        Listeners may implement on_practice_created(practice),
+        on_practice_updated(practice_id, updates) and
+        on_practice_deleted(practice_id).
+        """
+        self.practice_listeners.append(listener)
+    
+    def _notify_practice_listeners(self, event, *args):
+        """Call an event handler on every practice listener that implements it"""
+        for listener in self.practice_listeners:
+            handler = getattr(listener, event, None)
+            if handler:
+                try:
+                    handler(*args)
+                except Exception as e:
+                    print(f"Error in practice listener {event}: {e}")
+    
+    def _load_practice_listener(self, listener, start_row=2):
+        """
+        Fill a cache from the practices sheet and register it as practice listener.
+        
+        The listener events of changes made while the sheet is being read
+        are kept and applied after the last batch, as the rows that were
+        read may be older than the change, and passed on directly after
+        that. The cache must implement add_many(practices).
+        
+        Returns:
+            int: Number of rows read
+        """
+        events = _PracticeEvents()
+        self.add_practice_listener(events)
+        rows = 0
+        try:
+            for batch in self.iter_records('PRACTICES', start_row=start_row):
+                listener.add_many(batch)
+                rows += len(batch)
+        except Exception:
+            self.practice_listeners = [other for other in self.practice_listeners if other is not events]
+            raise
+        events.hand_over(listener)
+        # Replace the list instead of changing it, notifications may be iterating over it
+        self.practice_listeners = [listener if other is events else other for other in self.practice_listeners]
+        return rows
+    
+    def get_search_index(self):
+        """
+        Get the search index over all practices, building it on first use.
+        
+        After a restart the index is loaded from the local cache snapshot
+        and only the practices added since are read from the sheet; other
+        changes are reconciled in the background.
+        """
+        with self._lock:
+            self._restore_cache()
+            if self.search_index is None:
+                search_index = PracticeSearchIndex()
+                self.practices_cursor += self._load_practice_listener(search_index)
+                self.search_index = search_index
+                self._cache_ready('sheets', len(search_index))
+        return self.search_index
+    
+    def get_postcode_index(self):
+        """Get the index from postcode to accepting practices, building it on first use"""
+        with self._lock:
+            if self.postcode_index is None:
+                postcode_index = PostcodeIndex()
+                self._load_practice_listener(postcode_index)
+                self.postcode_index = postcode_index
+        return self.postcode_index
+    
+    def get_practice_counters(self):
+        """
+        Get the counters of practices per status, building them on first use.
+        
+        With a spreadsheet the counters are reconciled with the sheet
+        periodically, to correct changes that were made outside this DataLayer.
+        """
+        with self._lock:
+            if self.practice_counters is None:
+                practice_counters = PracticeCounters()
+                self._load_practice_listener(practice_counters)
+                if self.spreadsheet is not None:
+                    practice_counters.start(lambda: self.iter_records('PRACTICES'))
+                self.practice_counters = practice_counters
+        return self.practice_counters
+    
+    def reconcile_practice_counters(self):
+        """Recount the practice counters from the sheet, returning the drift that was corrected"""
+        return self.get_practice_counters().reconcile(self.iter_records('PRACTICES'))
+    
+    def get_change_feed(self):
+        """Get the feed of recent status changes, creating it on first use"""
+        with self._lock:
+            self._restore_cache()
+            if self.change_feed is None:
+                self.change_feed = ChangeFeed(self)
+        return self.change_feed
+    
+    def get_cache_state(self):
+        """Get the caches to store in a snapshot, or None when nothing is loaded"""
+        with self._lock:
+            if self.search_index is None:
+                return None
+            return {
+                'searchIndex': self.search_index,
+                'practicesCursor': self.practices_cursor,
+                'changeFeed': self.change_feed,
+                # Tells the snapshot whether anything changed since the last save
+                'generation': (
+                    self.search_index.generation,
+                    self.practices_cursor,
+                    self.change_feed.cursor if self.change_feed else None
+                )
+            }
+    
+    def _restore_cache(self):
+        """Load the caches from the snapshot once; the caller holds the lock"""
+        if self._cache_restored:
+            return
+        self._cache_restored = True
+        if self.spreadsheet is None:
+            # Mock data is not worth a snapshot
+            return
+        
+        state = self.cache_snapshot.load()
+        if state is not None:
+            self.search_index = state['searchIndex']
+            self.practices_cursor = state['practicesCursor']
+            # Catch up on the practices that were added after the snapshot
+            added = self._load_practice_listener(self.search_index, start_row=self.practices_cursor)
+            self.practices_cursor += added
+            # Renames, status changes and deletes since the snapshot are not in the added rows
+            self.cache_reconciliation = threading.Thread(
+                target=self._reconcile_search_index, name='cache-reconciliation', daemon=True
+            )
+            self.cache_reconciliation.start()
+            
+            if state['changeFeed'] is not None:
+                # The feed reads the checks added since from its own cursor
+                self.change_feed = state['changeFeed']
+                self.change_feed.data_layer = self
+            self._cache_ready('snapshot', added, state['savedAt'])
+    
+    def _reconcile_search_index(self):
+        """
+        Compare every practice in the sheet with the restored search index.
+        
+        Practices whose indexed fields differ are indexed again, practices
+        that are no longer in the sheet are removed, and the row cursor is
+        set to the end of the sheet, as deletes shift the rows after them.
+        Practices changed through this DataLayer during the scan are left
+        to their listener events.
+        """
+        changed = _ChangedPractices()
+        self.add_practice_listener(changed)
+        try:
+            rows = 0
+            seen = set()
+            updated = 0
+            for batch in self.iter_records('PRACTICES'):
+                rows += len(batch)
+                for practice in batch:
+                    practice_id = practice['practiceId']
+                    seen.add(practice_id)
+                    if practice_id in changed.practice_ids:
+                        continue
+                    indexed = self.search_index.get_practice(practice_id)
+                    if indexed is None or any(
+                        str(indexed.get(field) or '') != str(practice.get(field) or '')
+                        for field in ('userId', 'name', 'websiteUrl', 'status')
+                    ):
+                        self.search_index.add(practice)
+                        updated += 1
+            removed = self.search_index.practice_ids() - seen - changed.practice_ids
+            for practice_id in removed:
+                self.search_index.remove(practice_id)
+            with self._lock:
+                self.practices_cursor = rows + 2
+                self.cache_stats['reconciled'] = {'updated': updated, 'removed': len(removed)}
+            print(f"Data cache reconciled with the sheet ({updated} practices updated, {len(removed)} removed)")
+        except Exception as e:
+            print(f"Error reconciling the data cache: {e}")
+        finally:
+            # Replace the list instead of changing it, notifications may be iterating over it
+            self.practice_listeners = [listener for listener in self.practice_listeners if listener is not changed]
+    
+    def _cache_ready(self, source, rows, snapshot_saved_at=None):
+        """Record how long it took after startup until the caches could serve pages"""
+        self.cache_stats = {
+            'source': source,
+            'readySeconds': time.perf_counter() - self._started,
+            'rowsRead': rows,
+            'snapshotSavedAt': snapshot_saved_at
+        }
+        print(f"Data cache ready from {source} in {self.cache_stats['readySeconds']:.2f} s ({rows} practice rows read)")
+        if self.spreadsheet is not None:
+            # Keep the snapshot current for the next restart
+            self.cache_snapshot.start()
+    
     # User methods
     def get_user_by_email(self, email):
         """Get a user by email"""
         # For demonstration, returning mock data
-        return {
-            'userId': '12345',
-            'email': email,
-            'isActive': True,
-            'isAdmin': False,
-            'settings': {
+        return User(
+            userId='12345',
+            email=email,
+            isActive=True,
+            isAdmin=False,
+            settings={
                 'emailNotifications': True,
                 'notificationFrequency': 'immediately'
             }
-        }
+        )
+    
+    def get_user_by_id(self, user_id):
+        """Get a user by ID"""
+        # For demonstration, returning mock data
+        return User(
+            userId=user_id,
+            email='user@example.com',
+            isActive=True,
+            isAdmin=False,
+            settings={
+                'emailNotifications': True,
+                'notificationFrequency': 'immediately'
+            }
+        )
     
     def create_user(self, user):
         """Create a new user"""
         # Mock implementation
-        return user
+        return User.from_dict(user)
     
     def update_user(self, user_id, updates):
         """Update user fields"""
         # Mock implementation
-        return {
-            'userId': user_id,
-            'email': 'user@example.com',
-            'isActive': True,
-            'isAdmin': False,
-            'settings': updates.get('settings', {})
-        }
+        return User(
+            userId=user_id,
+            email='user@example.com',
+            isActive=True,
+            isAdmin=False,
+            settings=updates.get('settings', {})
+        )
     
     # Practice methods
     def get_practices_by_user(self, user_id):
         """Get all practices for a user"""
         # Mock implementation
-        return [
+        practices = [
             {
                 'practiceId': '1',
                 'userId': user_id,
@@ -164,11 +517,12 @@ class DataLayer:
                 })
             }
         ]
+        return [Practice.from_dict(practice) for practice in practices]
     
     def get_practice_by_id(self, practice_id):
         """Get a practice by ID"""
         # Mock implementation
-        return {
+        return Practice.from_dict({
             'practiceId': practice_id,
             'userId': '12345',
             'name': 'Huisartsenpraktijk Centrum',
@@ -182,17 +536,35 @@ class DataLayer:
                 'waitingTime': 'Ongeveer 6 maanden',
                 'contactInfo': 'info@huisartscentrum.nl'
             })
-        }
+        })
     
     def create_practice(self, practice):
         """Create a new practice"""
         # Mock implementation
+        practice = Practice.from_dict(practice)
+        self._notify_practice_listeners('on_practice_created', practice)
         return practice
     
+    def create_practices(self, practices):
+        """Create multiple practices with a single batched append"""
+        if not practices:
+            return []
+        practices = [Practice.from_dict(practice) for practice in practices]
+        
+        sheet = self._get_worksheet('PRACTICES')
+        if sheet is not None:
+            rows = [self._to_row('PRACTICES', practice) for practice in practices]
+            sheet.append_rows(rows, value_input_option='RAW')
+        
+        for practice in practices:
+            self._notify_practice_listeners('on_practice_created', practice)
+        return practices
+    
     def update_practice(self, practice_id, updates):
         """Update practice fields"""
         # Mock implementation
-        return {
+        self._notify_practice_listeners('on_practice_updated', practice_id, updates)
+        return Practice.from_dict({
             'practiceId': practice_id,
             'userId': '12345',
             'name': updates.get('name', 'Huisartsenpraktijk'),
@@ -200,10 +572,340 @@ class DataLayer:
             'status': updates.get('status', 'UNKNOWN'),
             'lastChecked': updates.get('lastChecked', '2025-03-15T12:00:00Z'),
             'lastStatusChange': updates.get('lastStatusChange', '2025-03-10T09:30:00Z'),
-            'details': updates.get('details', '{}')
-        }
+            'details': updates.get('details', '{}'),
+            'targetPath': updates.get('targetPath')
+        })
     
     def delete_practice(self, practice_id):
         """Delete a practice"""
         # Mock implementation
-        return True
\ No newline at end of file
+        self._notify_practice_listeners('on_practice_deleted', practice_id)
+        return True
+    
+    # Check methods
+    def create_check(self, check):
+        """
+        Store the result of a website check in the partition of its month.
+        
+        Checks that did not change the status are merged into the last run
+        of the practice (see modules/check_compactor.py): its lastSeen and
+        count are updated instead of appending a new row. Runs do not cross
+        partitions, so every month starts with a full row per practice.
+        """
+        check = start_run(Check.from_dict(dict(check)))
+        practice_id = check.get('practiceId')
+        key = partition_key(check.get('timestamp'))
+        sheet = self.partitions.get_worksheet('CHECKS', key, create=True)
+        
+        if sheet is None:
+            # Mock implementation, keep the checks in memory
+            with self._lock:
+                if self.check_runs is None:
+                    self.check_runs = self._load_check_runs()
+                run_key, _, run = self.check_runs.get(practice_id, (None, None, None))
+                if run is not None and run_key == key and can_extend(run, check):
+                    check = extend_run(run, check)
+                else:
+                    self.mock_checks.append(check)
+                    self.check_runs[practice_id] = (key, len(self.mock_checks) + 1, check)
+                if self.status_history is not None:
+                    self.status_history.add(check)
+                return check
+        
+        # The sheet is read and written outside the lock, so a slow Sheets
+        # request does not block the other users of the DataLayer
+        for reload in (False, True):
+            with self._lock:
+                check_runs = self.check_runs
+            if check_runs is None or reload:
+                check_runs = self._load_check_runs()
+                with self._lock:
+                    self.check_runs = check_runs
+            run_key, row_number, run = check_runs.get(practice_id, (None, None, None))
+            if run is None or run_key != key or not can_extend(run, check):
+                break
+            # Another DataLayer may have extended, moved or compacted the run
+            # since it was remembered, so extend the row as it is stored now
+            stored = self._read_check_run(sheet, row_number, run)
+            if stored is None:
+                continue
+            if not can_extend(stored, check):
+                break
+            extend_run(stored, check)
+            from gspread.utils import rowcol_to_a1
+            first_cell = rowcol_to_a1(row_number, self.headers['CHECKS'].index('lastSeen') + 1)
+            sheet.update(first_cell, [[stored['lastSeen'], stored['count']]], raw=True)
+            with self._lock:
+                if self.check_runs is check_runs:
+                    self.check_runs[practice_id] = (key, row_number, stored)
+                status_history = self.status_history
+            if status_history is not None:
+                status_history.add(stored)
+            return stored
+        
+        response = sheet.append_row(self._to_row('CHECKS', check), value_input_option='RAW')
+        # The response tells where the row was written, e.g. 'Controles_2025_03!A12:J12'
+        match = re.search(r'![A-Z]+(\d+)', (response or {}).get('updates', {}).get('updatedRange', ''))
+        with self._lock:
+            if match and self.check_runs is not None:
+                self.check_runs[practice_id] = (key, int(match.group(1)), check)
+            status_history = self.status_history
+        if status_history is not None:
+            status_history.add(check)
+        return check
+    
+    def _read_check_run(self, sheet, row_number, run):
+        """Read a stored run back from its row, or None when the row now holds another check"""
+        from gspread.utils import rowcol_to_a1
+        last_column = rowcol_to_a1(1, len(self.headers['CHECKS']))[:-1]
+        values = sheet.get_values(f'A{row_number}:{last_column}{row_number}')
+        if not values:
+            return None
+        stored = self._from_row('CHECKS', values[0])
+        if stored.get('checkId') != run.get('checkId') or stored.get('practiceId') != run.get('practiceId'):
+            metrics.inc('check_run_conflicts_total')
+            return None
+        return start_run(Check.from_dict(stored))
+    
+    def get_latest_checks(self, batch_size=1000):
+        """
+        Get the latest stored check of every practice checked this month.
+        
+        Only the current partition is read, however long the history is.
+        
+        Returns:
+            dict: practiceId -> latest check (the run it belongs to)
+        """
+        return {
+            practice_id: run
+            for practice_id, (_, _, run) in self._load_check_runs(batch_size).items()
+        }
+    
+    def _load_check_runs(self, batch_size=1000):
+        """Find the last run of every practice in the current partition"""
+        key = partition_key()
+        runs = {}
+        if self.spreadsheet is None:
+            # Mock implementation, the in-memory checks are not partitioned
+            for row_number, check in enumerate(self.mock_checks, start=2):
+                runs[check.get('practiceId')] = (key, row_number, check)
+            return runs
+        
+        row_number = 2
+        for batch in self.partitions.iter_partition('CHECKS', key, batch_size):
+            for check in batch:
+                runs[check.get('practiceId')] = (key, row_number, start_run(Check.from_dict(check)))
+                row_number += 1
+        return runs
+    
+    def create_log(self, entry):
+        """Append a log entry to the logs partition of its month"""
+        sheet = self.partitions.get_worksheet('LOGS', partition_key(entry.get('timestamp')), create=True)
+        if sheet is None:
+            # Mock implementation, logs are only printed
+            return entry
+        sheet.append_row(self._to_row('LOGS', entry), value_input_option='RAW')
+        return entry
+    
+    def compact_check_history(self, batch_size=1000, key=None):
+        """
+        Run-length encode the stored check history of a partition.
+        
+        Rewrites the checks partition (default: the current month) with
+        consecutive unchanged checks of a practice merged into one row.
+        Status changes keep their own row. Closed partitions are compacted
+        when they are archived.
+        
+        Returns:
+            dict: Rows and cells before and after compaction
+        """
+        columns = len(self.headers['CHECKS'])
+        key = key or partition_key()
+        sheet = self.partitions.get_worksheet('CHECKS', key)
+        checks = []
+        if sheet is None:
+            for batch in self.iter_records('CHECKS', batch_size):
+                checks.extend(batch)
+        else:
+            for batch in self._iter_sheet_rows(sheet, 'CHECKS', batch_size):
+                checks.extend(batch)
+        compacted = compact_checks(checks)
+        
+        if sheet is None:
+            # Mock implementation, rewrite the in-memory checks
+            with self._lock:
+                self.mock_checks[:len(checks)] = [Check.from_dict(check) for check in compacted]
+        else:
+            # Keep checks that were stored while compacting
+            new_checks = []
+            for batch in self._iter_sheet_rows(sheet, 'CHECKS', batch_size, start_row=len(checks) + 2):
+                new_checks.extend(batch)
+            from gspread.utils import rowcol_to_a1
+            rows = [self._to_row('CHECKS', check) for check in compacted + new_checks]
+            sheet.batch_clear([f'A2:{rowcol_to_a1(1, columns)[:-1]}'])
+            if rows:
+                sheet.update('A2', rows, raw=True)
+        
+        with self._lock:
+            # Row numbers changed, so forget the open runs and re-read the change log
+            self.check_runs = None
+            self.change_feed = None
+        
+        result = {
+            'partition': key,
+            'rowsBefore': len(checks),
+            'rowsAfter': len(compacted),
+            'cellsBefore': len(checks) * columns,
+            'cellsAfter': len(compacted) * columns
+        }
+        result['reduction'] = 1 - result['rowsAfter'] / result['rowsBefore'] if checks else 0
+        return result
+    
+    def archive_partitions(self):
+        """
+        Archive the checks and logs of past months.
+        
+        Rows of the old unpartitioned sheets are first moved into monthly
+        partitions. Every partition of a past month is then exported to a
+        compressed CSV file in the archive directory and removed from the
+        spreadsheet.
+        
+        Returns:
+            dict: Moved rows and archived partitions per sheet
+        """
+        if self.spreadsheet is None:
+            return {}
+        
+        result = {}
+        for sheet_key in PARTITIONED_SHEETS:
+            moved = self.partitions.migrate_legacy_sheet(sheet_key)
+            if moved and sheet_key == 'CHECKS':
+                with self._lock:
+                    # Rows were inserted above the open runs
+                    self.check_runs = None
+                    self.change_feed = None
+            result[sheet_key] = {
+                'migrated': moved,
+                'archived': self.partitions.archive_closed_partitions(sheet_key)
+            }
+        return result
+    
+    def get_status_changes(self, cursor=None, batch_size=1000):
+        """
+        Get the checks that changed the status of a practice.
+        
+        Only the rows after the cursor are read, so callers can pass the
+        returned cursor back in to fetch just the new rows. The first call
+        starts at the beginning of the current partition; later calls move
+        on to the next partition when a month has passed.
+        
+        Args:
+            cursor (tuple): (partition key, first row to read), or None
+            batch_size (int): Number of rows to read per request
+            
+        Returns:
+            tuple: (list of checks where status != previousStatus, next cursor)
+        """
+        current = partition_key()
+        key, start_row = cursor or (current, 2)
+        changes = []
+        while True:
+            if self.spreadsheet is None:
+                # Mock implementation, the in-memory checks are not partitioned
+                batches = self.iter_records('CHECKS', batch_size, start_row)
+                key = current
+            else:
+                batches = self.partitions.iter_partition('CHECKS', key, batch_size, start_row)
+            for batch in batches:
+                start_row += len(batch)
+                changes.extend(check for check in batch if is_status_change(check))
+            if key >= current:
+                return changes, (key, start_row)
+            key, start_row = next_partition_key(key), 2
+    
+    def get_status_history_index(self):
+        """
+        Get the check runs of all practices, reading every checks partition on first use.
+        
+        The index is set before the partitions are read, so the checks that
+        create_check stores meanwhile are added after them. The partitions
+        are read outside the lock; other callers get the index right away
+        and its get_runs waits until it is loaded. It is rebuilt after
+        STATUS_HISTORY_MAX_AGE seconds, to pick up checks stored elsewhere.
+        """
+        with self._lock:
+            status_history = self.status_history
+            if status_history is not None and not status_history.expired:
+                return status_history
+            status_history = StatusHistoryIndex(int(os.getenv('STATUS_HISTORY_MAX_AGE', '3600')))
+            self.status_history = status_history
+        try:
+            status_history.load(self.iter_records('CHECKS'))
+        except Exception:
+            # Build it again on the next call instead of keeping a partial index
+            with self._lock:
+                if self.status_history is status_history:
+                    self.status_history = None
+            raise
+        return status_history
+    
+    def get_status_history(self, practice_id, start=None, end=None, resolution=None, max_intervals=None):
+        """
+        Get the status history of a practice as run-length encoded intervals.
+        
+        See modules/status_history.py; the intervals are downsampled to the
+        requested resolution (or max_intervals) before they are returned.
+        """
+        return get_status_history(self, practice_id, start, end, resolution, max_intervals)
+
+
+class _ChangedPractices:
+    """Practice listener that collects the ids of the practices that changed"""
+    
+    def __init__(self):
+        self.practice_ids = set()
+    
+    def on_practice_created(self, practice):
+        self.practice_ids.add(practice['practiceId'])
+    
+    def on_practice_updated(self, practice_id, updates):
+        self.practice_ids.add(practice_id)
+    
+    def on_practice_deleted(self, practice_id):
+        self.practice_ids.add(practice_id)
+
+
+class _PracticeEvents:
+    """Practice listener that keeps the events until a cache is loaded, then passes them on to it"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._listener = None
+    
+    def on_practice_created(self, practice):
+        self._pass('on_practice_created', practice)
+    
+    def on_practice_updated(self, practice_id, updates):
+        self._pass('on_practice_updated', practice_id, updates)
+    
+    def on_practice_deleted(self, practice_id):
+        self._pass('on_practice_deleted', practice_id)
+    
+    def hand_over(self, listener):
+        """Apply the kept events to the listener and pass on the events that still arrive"""
+        with self._lock:
+            for event, args in self._events:
+                try:
+                    getattr(listener, event)(*args)
+                except Exception as e:
+                    print(f"Error in practice listener {event}: {e}")
+            self._events = None
+            self._listener = listener
+    
+    def _pass(self, event, *args):
+        with self._lock:
+            if self._listener is None:
+                self._events.append((event, args))
+                return
+        getattr(self._listener, event)(*args)
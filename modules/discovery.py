@@ -0,0 +1,354 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+
+from modules.practice_import import normalize_url, url_key
+from modules.metrics import metrics
+
+USER_AGENT = 'HuisartsCheckBot/1.0 (+https://github.com/Fbeunder/Huisarts_check_streamlit)'
+
+# Links to other sites are candidates when their URL or link text contains one of these words
+PRACTICE_WORDS = re.compile(r'huisarts|praktijk|gezondheidscentrum|medisch centrum|dokter', re.IGNORECASE)
+# Link texts that say nothing about the practice, the host name is used instead
+GENERIC_LINK_TEXTS = {'website', 'bezoek website', 'naar website', 'klik hier', 'meer informatie', 'lees meer'}
+# Links to files that are never directory pages
+SKIPPED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.zip', '.doc', '.docx', '.xls', '.xlsx', '.mp4')
+
+class LinkParser(HTMLParser):
+    """Collect the href and text of every link in an HTML page"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []  # (href, text)
+        self._href = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._href = dict(attrs).get('href')
+            self._text = []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._href is not None:
+            self.links.append((self._href, ' '.join(''.join(self._text).split())))
+            self._href = None
+
+class DiscoveryCrawler:
+    """
+    Find practice websites on directory pages, like a list of the general
+    practices of a municipality or region.
+
+    Starting from the seed pages, the crawler follows the links within the
+    seed sites up to max_depth and collects the links to other sites that
+    look like practice websites. Pages are fetched by a bounded pool of
+    threads, at most one request per host at a time with a politeness
+    delay between requests (or the Crawl-delay of robots.txt, if longer).
+    robots.txt is read once per host and every URL is fetched only once.
+    Redirects are not followed by requests but queued like links, so their
+    target is checked against robots.txt and the seed sites as well; the
+    site a seed page redirects to (e.g. from http to https or to www.) is
+    crawled as a seed site. The candidates are deduplicated against the
+    practices of the user and stored with one batched append per chunk,
+    like a bulk import.
+
+    Args:
+        data_layer: DataLayer to store the practices in
+        max_workers (int): Pages fetched at the same time
+        delay (float): Seconds between two requests to the same host
+        max_pages (int): Maximum number of pages to fetch per crawl
+        max_depth (int): Maximum number of links followed from a seed page
+    """
+
+    def __init__(self, data_layer, max_workers=None, delay=None, max_pages=None, max_depth=2,
+                 timeout=10, chunk_size=500, user_agent=USER_AGENT):
+        self.data_layer = data_layer
+        self.max_workers = max_workers or int(os.getenv('DISCOVERY_MAX_WORKERS', '8'))
+        self.delay = delay if delay is not None else float(os.getenv('DISCOVERY_DELAY', '1.0'))
+        self.max_pages = max_pages or int(os.getenv('DISCOVERY_MAX_PAGES', '200'))
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.user_agent = user_agent
+        self._robots = {}  # scheme://host -> RobotFileParser
+        self._robots_lock = threading.Lock()
+        self._local = threading.local()
+
+    def discover(self, seeds, user_id, existing_practices=None, progress_callback=None):
+        """
+        Crawl the seed pages and add the practice websites found as practices.
+
+        Args:
+            seeds (list): URLs of directory pages
+            user_id (str): The user the practices are added for
+            existing_practices (list): Practices of the user, read from the
+                data layer if not provided
+            progress_callback (callable): Called after every page with the
+                number of fetched pages and candidates found
+
+        Returns:
+            dict: Crawl result with counts, the skipped candidates and errors
+        """
+        if existing_practices is None:
+            existing_practices = self.data_layer.get_practices_by_user(user_id) or []
+        known_keys = {url_key(practice.get('websiteUrl')) for practice in existing_practices}
+
+        result = self.crawl(seeds, progress_callback)
+        practices = []
+        skipped = []
+        for candidate in result['candidates']:
+            if url_key(candidate['websiteUrl']) in known_keys:
+                skipped.append(dict(candidate, reason='Duplicate URL'))
+                continue
+            practices.append({
+                'practiceId': str(uuid.uuid4()),
+                'userId': user_id,
+                'name': candidate['name'],
+                'websiteUrl': candidate['websiteUrl'],
+                'status': 'UNKNOWN',
+                'lastChecked': None,
+                'lastStatusChange': None,
+                'details': json.dumps({})
+            })
+        for start in range(0, len(practices), self.chunk_size):
+            self.data_layer.create_practices(practices[start:start + self.chunk_size])
+
+        result.update({
+            'success': bool(result['pagesFetched']) or not result['errors'],
+            'message': (
+                f"Fetched {result['pagesFetched']} pages, found {len(result['candidates'])} practices, "
+                f"added {len(practices)}"
+            ),
+            'imported': len(practices),
+            'skipped': skipped
+        })
+        return result
+
+    def crawl(self, seeds, progress_callback=None):
+        """
+        Crawl the seed sites and collect the links to practice websites.
+
+        Returns:
+            dict: pagesFetched, pagesPerSecond, seconds, the candidates
+                (name, websiteUrl, foundOn), disallowed URLs and errors
+        """
+        frontiers = {}  # scheme://host -> deque of (url, depth)
+        seen = set()
+        seed_hosts = set()
+        errors = []
+        for seed in seeds:
+            url = normalize_url(seed)
+            url = url and absolute_url(url, '')
+            if not url:
+                errors.append({'url': seed, 'error': 'Invalid URL'})
+            elif url not in seen:
+                seen.add(url)
+                seed_hosts.add(_origin(url))
+                frontiers.setdefault(_origin(url), deque()).append((url, 0))
+
+        candidates = {}  # url_key -> candidate
+        disallowed = 0
+        fetched = 0
+        submitted = 0
+        next_fetch = {}  # host -> time.monotonic() of its next allowed request
+        running = {}  # future -> (host, url, depth)
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='discovery') as pool:
+            while True:
+                now = time.monotonic()
+                busy = {host for host, _, _ in running.values()}
+                for host, frontier in frontiers.items():
+                    if len(running) >= self.max_workers or submitted >= self.max_pages:
+                        break
+                    if frontier and host not in busy and next_fetch.get(host, 0) <= now:
+                        url, depth = frontier.popleft()
+                        running[pool.submit(self._fetch_page, url)] = (host, url, depth)
+                        submitted += 1
+
+                # Hosts that wait for their politeness delay
+                busy = {host for host, _, _ in running.values()}
+                waiting = [next_fetch.get(host, 0) for host, frontier in frontiers.items() if frontier and host not in busy]
+                if not running:
+                    if not waiting or submitted >= self.max_pages:
+                        break
+                    time.sleep(max(0.0, min(waiting) - now))
+                    continue
+
+                timeout = max(0.0, min(waiting) - now) if waiting and submitted < self.max_pages else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, url, depth = running.pop(future)
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        page = {'error': f'{type(e).__name__}: {e}'}
+                    if page.get('disallowed'):
+                        disallowed += 1
+                        metrics.inc('discovery_pages_total', result='disallowed')
+                        continue
+                    next_fetch[host] = time.monotonic() + self._host_delay(host)
+                    if page.get('error'):
+                        errors.append({'url': url, 'error': page['error']})
+                        metrics.inc('discovery_pages_total', result='error')
+                        continue
+                    if 'redirect' in page:
+                        metrics.inc('discovery_pages_total', result='redirect')
+                        target = page['redirect']
+                        if depth == 0:
+                            seed_hosts.add(_origin(target))
+                        if _origin(target) in seed_hosts and target not in seen and _is_page(target):
+                            seen.add(target)
+                            frontiers.setdefault(_origin(target), deque()).append((target, depth))
+                        continue
+                    fetched += 1
+                    metrics.inc('discovery_pages_total', result='fetched')
+
+                    for link, text in page['links']:
+                        try:
+                            origin = _origin(link)
+                            if origin in seed_hosts:
+                                # Another directory page of a seed site
+                                if depth < self.max_depth and link not in seen and _is_page(link):
+                                    seen.add(link)
+                                    frontiers[origin].append((link, depth + 1))
+                            elif PRACTICE_WORDS.search(link) or PRACTICE_WORDS.search(text):
+                                self._add_candidate(candidates, link, text, url)
+                        except ValueError as e:
+                            # E.g. a port out of range; skip the link, not the crawl
+                            errors.append({'url': link, 'error': str(e)})
+                    if progress_callback:
+                        progress_callback(fetched, len(candidates))
+
+        seconds = time.perf_counter() - started
+        return {
+            'pagesFetched': fetched,
+            'pagesPerSecond': fetched / seconds if seconds else 0.0,
+            'seconds': seconds,
+            'candidates': list(candidates.values()),
+            'disallowed': disallowed,
+            'errors': errors
+        }
+
+    def _add_candidate(self, candidates, link, text, found_on):
+        """Add the home page of a linked site as a candidate practice, ValueError if it is not valid"""
+        website_url = normalize_url(_origin(link))
+        key = url_key(website_url)
+        if not key:
+            raise ValueError('Invalid URL')
+        name = text if text and text.lower() not in GENERIC_LINK_TEXTS else None
+        candidate = candidates.get(key)
+        if candidate is None:
+            candidates[key] = {
+                'name': (name or urlsplit(website_url).hostname)[:100],
+                'websiteUrl': website_url,
+                'foundOn': found_on
+            }
+        elif name and candidate['name'] == urlsplit(website_url).hostname:
+            candidate['name'] = name[:100]
+
+    def _fetch_page(self, url):
+        """Fetch a page in a worker thread and extract its links"""
+        if not self._allowed(url):
+            return {'disallowed': True}
+        import requests
+        try:
+            response = self._session().get(url, timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException as e:
+            return {'error': str(e)}
+        if response.is_redirect:
+            target = absolute_url(url, response.headers['Location'])
+            return {'redirect': target} if target else {'error': f'HTTP {response.status_code}'}
+        if response.status_code != 200:
+            return {'error': f'HTTP {response.status_code}'}
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return {'links': []}
+
+        parser = LinkParser()
+        parser.feed(response.text)
+        links = []
+        for href, text in parser.links:
+            link = absolute_url(response.url, href)
+            if link:
+                links.append((link, text))
+        return {'links': links}
+
+    def _allowed(self, url):
+        """Check robots.txt, reading it once per host"""
+        return self._robots_for(_origin(url)).can_fetch(self.user_agent, url)
+
+    def _host_delay(self, host):
+        """Seconds between two requests to a host, at least its Crawl-delay"""
+        crawl_delay = self._robots_for(host).crawl_delay(self.user_agent)
+        return max(self.delay, float(crawl_delay or 0))
+
+    def _robots_for(self, origin):
+        with self._robots_lock:
+            robots = self._robots.get(origin)
+        if robots is not None:
+            return robots
+
+        # Loads urllib.request, so only imported when a crawl runs
+        from urllib.robotparser import RobotFileParser
+        import requests
+        robots = RobotFileParser(origin + '/robots.txt')
+        try:
+            response = self._session().get(origin + '/robots.txt', timeout=self.timeout)
+            if response.status_code in (401, 403) or response.status_code >= 500:
+                # Forbidden or unavailable: keep out, as the big search engines do
+                robots.disallow_all = True
+            elif response.status_code >= 400:
+                robots.allow_all = True
+            else:
+                robots.parse(response.text.splitlines())
+        except requests.RequestException:
+            robots.disallow_all = True
+        with self._robots_lock:
+            return self._robots.setdefault(origin, robots)
+
+    def _session(self):
+        """A requests session per worker thread, which reuses its connections"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+            session.headers['User-Agent'] = self.user_agent
+        return session
+
+def _origin(url):
+    """scheme://host[:port] of a URL"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), '', '', ''))
+
+def absolute_url(base, href):
+    """
+    Resolve a link against its page, as the one spelling used to fetch it
+    only once: lowercase host, no fragment and / for an empty path.
+
+    Returns:
+        str: The URL, or None for links to other schemes like mailto: and
+            links that are not valid URLs
+    """
+    if href is None:
+        return None
+    try:
+        parts = urlsplit(urldefrag(urljoin(base, href.strip()))[0])
+    except ValueError:
+        # E.g. an unclosed IPv6 bracket
+        return None
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or '/', parts.query, ''))
+
+def _is_page(url):
+    return not urlsplit(url).path.lower().endswith(SKIPPED_EXTENSIONS)
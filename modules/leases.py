@@ -0,0 +1,166 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+class Lease:
+    """A held lease on a key, valid until expires_at unless renewed"""
+
+    __slots__ = ('key', 'token', 'expires_at')
+
+    def __init__(self, key, token, expires_at):
+        self.key = key
+        self.token = token
+        self.expires_at = expires_at
+
+class LeaseManager:
+    """
+    Leases with expiry and heartbeat, so a piece of work runs in one place.
+
+    The leases live in a SQLite database that every app replica on the host
+    (and every session within a replica) opens, as a stand-in for a shared
+    store. A lease expires after `ttl` seconds unless its holder renews it;
+    a background heartbeat renews all leases this process holds, so a
+    crashed replica only blocks a key until its leases expire. When a lease
+    is released the holder can store the result of the work, so that those
+    who waited for it can use that result instead of doing the work again.
+
+    Args:
+        path (str): Path of the SQLite database
+        ttl (float): Seconds a lease is valid without a heartbeat
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.getenv('LEASE_DB_PATH', os.path.join('cache', 'leases.sqlite3'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('LEASE_TTL', '60'))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.held = {}  # token -> Lease
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS leases '
+                '(key TEXT PRIMARY KEY, token TEXT NOT NULL, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS lease_results '
+                '(key TEXT PRIMARY KEY, result TEXT NOT NULL, finished_at REAL NOT NULL)'
+            )
+
+    def acquire(self, key):
+        """
+        Try to take the lease on a key.
+
+        Returns:
+            Lease: The lease, or None when someone else holds it
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                'INSERT INTO leases (key, token, owner, expires_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET token = excluded.token, owner = excluded.owner, '
+                'expires_at = excluded.expires_at WHERE leases.expires_at <= ?',
+                (key, token, self.owner, now + self.ttl, now)
+            )
+            if cursor.rowcount != 1:
+                return None
+            lease = self.held[token] = Lease(key, token, now + self.ttl)
+        self._start_heartbeat()
+        return lease
+
+    def renew(self, lease):
+        """
+        Extend a lease by the ttl.
+
+        Returns:
+            bool: False when the lease expired and was taken over
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            cursor = self._connection.execute(
+                'UPDATE leases SET expires_at = ? WHERE key = ? AND token = ?',
+                (expires_at, lease.key, lease.token)
+            )
+            if cursor.rowcount != 1:
+                self.held.pop(lease.token, None)
+                return False
+            lease.expires_at = expires_at
+        return True
+
+    def release(self, lease, result=None):
+        """
+        Give up a lease, storing the result of the work for waiters if given.
+
+        Args:
+            lease (Lease): The lease to release
+            result (dict): JSON-serializable result of the work
+        """
+        with self._lock:
+            self.held.pop(lease.token, None)
+            if result is not None:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO lease_results (key, result, finished_at) VALUES (?, ?, ?)',
+                    (lease.key, json.dumps(result), time.time())
+                )
+            self._connection.execute('DELETE FROM leases WHERE key = ? AND token = ?', (lease.key, lease.token))
+
+    def wait(self, key, timeout, since=None, interval=0.5):
+        """
+        Wait until the lease on a key is released or expires.
+
+        Args:
+            key (str): The key of the lease
+            timeout (float): Maximum number of seconds to wait
+            since (float): Only accept results stored after this time,
+                by default the start of the wait
+
+        Returns:
+            dict: The result stored when the lease was released, or None
+                when the holder stored none or the wait timed out
+        """
+        started = time.time()
+        since = started if since is None else since
+        while True:
+            with self._lock:
+                lease = self._connection.execute(
+                    'SELECT expires_at FROM leases WHERE key = ?', (key,)
+                ).fetchone()
+                finished = self._connection.execute(
+                    'SELECT result, finished_at FROM lease_results WHERE key = ?', (key,)
+                ).fetchone()
+            if lease is None or lease[0] <= time.time():
+                if finished is not None and finished[1] >= since:
+                    return json.loads(finished[0])
+                return None
+            if time.time() - started >= timeout:
+                return None
+            time.sleep(interval)
+
+    def stop(self):
+        """Stop the heartbeat; held leases then expire after the ttl"""
+        self._stop.set()
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._run_heartbeat, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _run_heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            for lease in list(self.held.values()):
+                try:
+                    if not self.renew(lease):
+                        print(f"Lease on {lease.key} was lost")
+                except sqlite3.Error as e:
+                    print(f"Error renewing lease on {lease.key}: {e}")
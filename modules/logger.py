@@ -1,4 +1,3 @@
-import streamlit as st
 import os
 from datetime import datetime
 
@@ -31,11 +30,18 @@ class Logger:
     def _log(self, level, message, data=None):
         """Internal logging method"""
         # Always print to console
-        log_entry = f"{datetime.now().isoformat()} [{level}] {message}"
+        timestamp = datetime.now().isoformat()
+        log_entry = f"{timestamp} [{level}] {message}"
         print(log_entry)
         
-        # In the real implementation, this would log to the database
-        # For now, just demonstrating the structure
         if self.data_layer and level != self.DEBUG:  # Don't store DEBUG logs
-            # Would store log in database here
-            pass
\ No newline at end of file
+            try:
+                # Stored in the logs partition of the current month
+                self.data_layer.create_log({
+                    'timestamp': timestamp,
+                    'level': level,
+                    'message': message,
+                    'data': data
+                })
+            except Exception as e:
+                print(f"Error storing log entry: {e}")
\ No newline at end of file
@@ -0,0 +1,269 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached read to a slow OpenAI analysis
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds for the number of API calls in one run
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Histogram:
+    """Observations counted in cumulative buckets, like a Prometheus histogram"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the last bucket, the best estimate is its bound
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """
+    Process-wide counters and histograms for the hot paths.
+
+    Disabled by default: the instrumented functions then only check a flag
+    before calling through. Enable with METRICS_ENABLED=true; with
+    METRICS_PORT set, the metrics are also served in the Prometheus text
+    format on http://<host>:<port>/metrics.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+        self._runs = contextvars.ContextVar('metrics_runs', default=())  # Runs that count in this context
+        self._server = None
+
+    def configure(self):
+        """Apply the settings from the environment, e.g. after loading .env"""
+        self.enabled = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+        port = os.getenv('METRICS_PORT')
+        if self.enabled and port and self._server is None:
+            self.start_http_server(int(port))
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            for run in self._runs.get():
+                if name in run:
+                    run[name] += amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Add a value to a histogram"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timed(self, name, **labels):
+        """Decorator that records the duration of every call in a histogram"""
+        def decorator(func):
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def generator_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return func(*args, **kwargs)
+                    return self._time_iterator(func(*args, **kwargs), name, labels)
+                return generator_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def instrument(self, name, label='method'):
+        """
+        Class decorator that times every public method.
+
+        All methods share one histogram, with the method name as label.
+        Generators are timed over the batches they produce, without the
+        time the caller spends between batches.
+        """
+        def decorator(cls):
+            for attribute, value in list(vars(cls).items()):
+                if attribute.startswith('_') or not inspect.isfunction(value):
+                    continue
+                setattr(cls, attribute, self.timed(name, **{label: attribute})(value))
+            return cls
+        return decorator
+
+    @contextmanager
+    def run(self, name, counters):
+        """
+        Count how often the given counters increase during a run, and add
+        the totals to a histogram per counter when it ends.
+
+        The run is kept in a context variable, so increases in asyncio tasks
+        and in asyncio.to_thread calls started from the run count as well,
+        and so do those in worker threads that run in a copy of its context
+        (contextvars.copy_context); other threads are not counted.
+
+        Args:
+            name (str): Prefix of the histograms, e.g. 'website_check_run'
+            counters (list): Names of the counters to follow
+        """
+        if not self.enabled:
+            yield
+            return
+        run = dict.fromkeys(counters, 0)
+        token = self._runs.set(self._runs.get() + (run,))
+        try:
+            yield
+        finally:
+            self._runs.reset(token)
+            for counter, count in run.items():
+                self.observe(f"{name}_{counter.removesuffix('_total')}", count, buckets=COUNT_BUCKETS)
+
+    def _time_iterator(self, iterator, name, labels):
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            self.observe(name, elapsed, **labels)
+
+    def reset(self):
+        """Drop all recorded values"""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def summary(self):
+        """
+        Get the recorded values as rows for a table.
+
+        Returns:
+            tuple: (counter rows, histogram rows with count, mean and percentiles)
+        """
+        with self._lock:
+            counters = [
+                {'metric': name, 'labels': _format_labels(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    'metric': name,
+                    'labels': _format_labels(labels),
+                    'count': histogram.count,
+                    'mean': histogram.sum / histogram.count,
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'p99': histogram.quantile(0.99)
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+                if histogram.count
+            ]
+        return counters, histograms
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_prometheus_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_prometheus_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_prometheus_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_prometheus_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port, host='0.0.0.0'):
+        """Serve the metrics for Prometheus on /metrics, in a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+def _format_labels(labels):
+    return ', '.join(f"{key}={value}" for key, value in labels)
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+# Shared by all modules of the application
+metrics = Metrics()
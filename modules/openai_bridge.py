@@ -1,19 +1,29 @@
-import streamlit as st
 import os
-import requests
 import json
 import time
-from datetime import datetime
 from modules.logger import Logger
+from modules.metrics import metrics
+
+# Time of the mock analyses, so repeated runs give byte-identical results
+MOCK_TIME = '2025-03-15T12:00:00'
 
 class OpenAIBridge:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, cassette=None):
         # Initialize with Apps Script endpoint URL from environment variable
         self.apps_script_url = os.getenv('APPS_SCRIPT_URL', '')
         
         # Set up logger
         self.logger = logger if logger else Logger()
         
+        # Optional cassette to record or replay Apps Script responses (see modules/cassette.py)
+        if cassette is None and os.getenv('OPENAI_BRIDGE_CASSETTE_MODE'):
+            try:
+                from modules.cassette import Cassette
+                cassette = Cassette.from_env()
+            except Exception as e:
+                self.logger.error(f"Could not open cassette: {str(e)}")
+        self.cassette = cassette
+        
         # Request timeout in seconds
         self.timeout = 30
         
@@ -21,11 +31,14 @@ class OpenAIBridge:
         self.max_retries = 3
         
         # Initialize and log status
-        if self.apps_script_url:
+        if self.is_replaying():
+            self.logger.info(f"OpenAI bridge initialized in replay mode with cassette {self.cassette.path}")
+        elif self.apps_script_url:
             self.logger.info(f"OpenAI bridge initialized with Apps Script URL")
         else:
             self.logger.warning("OpenAI bridge initialized without Apps Script URL - will use mock data")
     
+    @metrics.timed('openai_bridge_analyze_seconds')
     def analyze_website(self, url):
         """
         Analyze a website by making a request to the Google Apps Script endpoint
@@ -47,10 +60,13 @@ class OpenAIBridge:
         self.logger.info(f"Analyzing website: {url}")
         
         # If no Apps Script URL is configured, use mock data
-        if not self.apps_script_url:
+        if not self.apps_script_url and not self.is_replaying():
             self.logger.warning(f"No Apps Script URL configured, using mock data for {url}")
             return self._mock_website_analysis(url)
         
+        # Loaded on first use, the mock analysis and the pages do not need it
+        import requests
+        
         # Try to call the Apps Script endpoint
         retry_count = 0
         while retry_count < self.max_retries:
@@ -64,11 +80,7 @@ class OpenAIBridge:
                 }
                 
                 # Make the request to the Apps Script endpoint
-                response = requests.post(
-                    self.apps_script_url,
-                    json=payload,
-                    timeout=self.timeout
-                )
+                response = self._post(payload, self.timeout)
                 
                 # Check for HTTP error status codes
                 if response.status_code != 200:
@@ -76,6 +88,7 @@ class OpenAIBridge:
                     
                     # If we got a 5xx error, retry
                     if 500 <= response.status_code < 600 and retry_count < self.max_retries - 1:
+                        metrics.inc('openai_bridge_retries_total', reason='server_error')
                         retry_count += 1
                         time.sleep(1)  # Wait before retrying
                         continue
@@ -110,6 +123,7 @@ class OpenAIBridge:
                     }
                 
                 # Exponential backoff
+                metrics.inc('openai_bridge_retries_total', reason='timeout')
                 time.sleep(2 ** retry_count)
                 
             except requests.exceptions.RequestException as e:
@@ -126,6 +140,51 @@ class OpenAIBridge:
             'message': 'Failed to analyze website after multiple attempts'
         }
     
+    def submit_analysis(self, url, callback_url=None):
+        """
+        Submit a website analysis to the Apps Script as a job, without waiting
+        for OpenAI. The result is read later with get_analyses, or posted by
+        the script to callback_url when given.
+        
+        Args:
+            url (str): The URL of the website to analyze
+            callback_url (str): URL the script posts the result to
+            
+        Returns:
+            dict: success and the jobId, or success False with a message
+        """
+        payload = {'action': 'submitAnalysis', 'url': url}
+        if callback_url:
+            payload['callbackUrl'] = callback_url
+        result = self._post_json(payload)
+        if result.get('success') and not result.get('jobId'):
+            return {
+                'success': False,
+                'message': 'Apps Script did not return a job id, is the script up to date?'
+            }
+        return result
+    
+    def get_analyses(self, job_ids):
+        """
+        Get the results of submitted analyses in one request.
+        
+        Args:
+            job_ids (list): Job ids returned by submit_analysis
+            
+        Returns:
+            dict: Per job id the analysis result, or None while it is running;
+                None when the request failed
+        """
+        result = self._post_json({'action': 'getAnalyses', 'jobIds': list(job_ids)})
+        if not result.get('success'):
+            self.logger.warning(f"Could not get analysis results: {result.get('message')}")
+            return None
+        jobs = result.get('jobs') or {}
+        return {
+            job_id: jobs[job_id].get('result') if jobs.get(job_id, {}).get('done') else None
+            for job_id in job_ids
+        }
+    
     def test_connection(self):
         """
         Test the connection to the Apps Script endpoint.
@@ -133,7 +192,7 @@ class OpenAIBridge:
         Returns:
             dict: Test result with success flag and message
         """
-        if not self.apps_script_url:
+        if not self.apps_script_url and not self.is_replaying():
             return {
                 'success': False,
                 'message': 'No Apps Script URL configured'
@@ -141,11 +200,7 @@ class OpenAIBridge:
         
         try:
             self.logger.info("Testing connection to Apps Script endpoint")
-            response = requests.post(
-                self.apps_script_url,
-                json={'action': 'testConnection'},
-                timeout=10
-            )
+            response = self._post({'action': 'testConnection'}, 10)
             
             if response.status_code == 200:
                 return {
@@ -164,6 +219,54 @@ class OpenAIBridge:
                 'message': f'Connection error: {str(e)}'
             }
     
+    def is_replaying(self):
+        """Check if responses are served from a cassette instead of the endpoint"""
+        return self.cassette is not None and self.cassette.mode == 'replay'
+    
+    def _post_json(self, payload):
+        """Send a short request to the Apps Script endpoint, retrying server errors and timeouts"""
+        import requests
+        for attempt in range(self.max_retries):
+            try:
+                response = self._post(payload, self.timeout)
+                if 500 <= response.status_code < 600 and attempt < self.max_retries - 1:
+                    metrics.inc('openai_bridge_retries_total', reason='server_error')
+                    time.sleep(1)
+                    continue
+                if response.status_code != 200:
+                    return {
+                        'success': False,
+                        'message': f'Error from Apps Script API: {response.status_code} - {response.text}'
+                    }
+                return response.json()
+            except requests.exceptions.Timeout:
+                if attempt == self.max_retries - 1:
+                    return {
+                        'success': False,
+                        'message': 'Timeout while connecting to Apps Script endpoint'
+                    }
+                metrics.inc('openai_bridge_retries_total', reason='timeout')
+                time.sleep(2 ** (attempt + 1))
+            except requests.exceptions.RequestException as e:
+                return {
+                    'success': False,
+                    'message': f'Error connecting to Apps Script endpoint: {str(e)}'
+                }
+            except ValueError as e:
+                return {
+                    'success': False,
+                    'message': f'Invalid response format from Apps Script: {str(e)}'
+                }
+    
+    @metrics.timed('apps_script_request_seconds')
+    def _post(self, payload, timeout):
+        """Send a request to the Apps Script endpoint, through the cassette if one is set"""
+        metrics.inc('apps_script_requests_total', action=payload.get('action'))
+        if self.cassette is not None:
+            return self.cassette.post(self.apps_script_url, payload, timeout)
+        import requests
+        return requests.post(self.apps_script_url, json=payload, timeout=timeout)
+    
     def _mock_website_analysis(self, url):
         """
         Generate mock website analysis for demonstration or when API is unavailable.
@@ -178,8 +281,9 @@ class OpenAIBridge:
         
         # In a real implementation, this would call the OpenAI API via Apps Script
         import random
-        statuses = ['ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN']
-        status = random.choice(statuses)
+        # Seed with the URL so repeated runs give the same mock results
+        rng = random.Random(url)
+        mock_time = os.getenv('OPENAI_BRIDGE_MOCK_TIME') or MOCK_TIME
         
         # Generate consistent mock data based on the URL to make testing more realistic
         # This ensures the same URL always returns the same status
@@ -196,15 +300,15 @@ class OpenAIBridge:
         return {
             'success': True,
             'status': status,
-            'confidence': random.randint(50, 95),
+            'confidence': rng.randint(50, 95),
             'details': {
                 'waitingList': True if status == 'NOT_ACCEPTING' else False,
-                'conditions': ['Alleen inwoners van postcodegebied'] if random.random() > 0.5 else [],
+                'conditions': ['Alleen inwoners van postcodegebied'] if rng.random() > 0.5 else [],
                 'waitingTime': 'Ongeveer 3-6 maanden' if status == 'NOT_ACCEPTING' else None,
-                'contactInfo': 'info@example.com' if random.random() > 0.3 else None,
-                'lastUpdated': datetime.now().isoformat()
+                'contactInfo': 'info@example.com' if rng.random() > 0.3 else None,
+                'lastUpdated': mock_time
             },
             'reasoning': f"Website analysis indicates practice is {status.lower().replace('_', ' ')} new patients",
             'url': url,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': mock_time
         }
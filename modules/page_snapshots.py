@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+# A version is stored as a new base when its delta is larger than this part of the page compressed on its own
+REBASE_RATIO = 0.5
+# zlib only looks back 32 KB, so only the end of a longer base is used as zdict
+ZDICT_SIZE = 32 * 1024
+
+class PageSnapshotStore:
+    """
+    Local store of the page text that every website check analyzed.
+
+    Per practice, a base version is compressed with zlib and every later
+    version is compressed with zlib using its base as preset dictionary
+    (zdict), so what it shares with the base costs a few bytes. A version
+    that is the same as the one before it only stores a reference. Every
+    version refers directly to its base, never to a chain of deltas, so
+    reading any historical version is one index lookup in SQLite and one
+    decompression; recently used bases are kept decompressed in memory.
+    When a page has changed so much that its delta is no longer small, it
+    becomes the new base.
+
+    zlib uses at most the last 32 KB of a zdict (ZDICT_SIZE), so only that
+    part of a base can be shared. The Apps Script cuts the page text to
+    8000 characters, which fits; of a longer page only the end is covered
+    and its versions mostly become new bases through REBASE_RATIO.
+
+    The SQLite database is indexed on (practice_id, timestamp) and stores
+    a SHA-1 fingerprint of every version, to find when a page changed.
+
+    Args:
+        path (str): Path of the SQLite database
+        cached_bases (int): Decompressed base versions kept in memory
+    """
+
+    def __init__(self, path=None, cached_bases=256):
+        self.path = path or os.getenv('PAGE_SNAPSHOT_DB_PATH', os.path.join('cache', 'page_snapshots.sqlite3'))
+        self.cached_bases = cached_bases
+        self._bases = OrderedDict()  # base id -> encoded text, least recently used first
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # kind: 'base' (zlib), 'delta' (zlib with the text of base_id as zdict) or 'same' (text of same_as)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots ('
+                'id INTEGER PRIMARY KEY, practice_id TEXT NOT NULL, timestamp TEXT NOT NULL, '
+                'kind TEXT NOT NULL, base_id INTEGER, same_as INTEGER, fingerprint BLOB NOT NULL, '
+                'size INTEGER NOT NULL, data BLOB)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS snapshots_practice_timestamp ON snapshots (practice_id, timestamp)'
+            )
+
+    def add(self, practice_id, timestamp, text):
+        """
+        Store the page text of a check.
+
+        Args:
+            practice_id (str): The practice that was checked
+            timestamp (str): ISO timestamp of the check
+            text (str): The analyzed page text
+
+        Returns:
+            dict: id, kind ('base', 'delta' or 'same') and the stored bytes
+        """
+        raw = text.encode('utf-8')
+        fingerprint = hashlib.sha1(raw).digest()
+        with self._lock:
+            latest = self._connection.execute(
+                'SELECT id, kind, base_id, same_as, fingerprint FROM snapshots '
+                'WHERE practice_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1',
+                (practice_id,)
+            ).fetchone()
+
+            kind, base_id, same_as, data = 'base', None, None, None
+            if latest is not None and latest[4] == fingerprint:
+                # Unchanged page, refer to the version that holds the data
+                kind, same_as = 'same', latest[3] or latest[0]
+            else:
+                data = zlib.compress(raw, 9)
+                if latest is not None:
+                    latest_base = latest[0] if latest[1] == 'base' else latest[2]
+                    if latest[1] == 'same':
+                        latest_base = self._connection.execute(
+                            "SELECT CASE kind WHEN 'base' THEN id ELSE base_id END FROM snapshots WHERE id = ?",
+                            (latest[3],)
+                        ).fetchone()[0]
+                    compressor = zlib.compressobj(9, zdict=self._base_text(latest_base)[-ZDICT_SIZE:])
+                    delta = compressor.compress(raw) + compressor.flush()
+                    if len(delta) <= len(data) * REBASE_RATIO:
+                        kind, base_id, data = 'delta', latest_base, delta
+
+            cursor = self._connection.execute(
+                'INSERT INTO snapshots (practice_id, timestamp, kind, base_id, same_as, fingerprint, size, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (practice_id, timestamp, kind, base_id, same_as, fingerprint, len(raw), data)
+            )
+            return {'id': cursor.lastrowid, 'kind': kind, 'bytes': len(data) if data else 0}
+
+    def get(self, practice_id, timestamp=None):
+        """
+        Get the page text of a practice as it was at a point in time.
+
+        Args:
+            practice_id (str): The practice
+            timestamp (str): ISO timestamp; the version stored at or before
+                it is returned, the latest version when not given
+
+        Returns:
+            str: The page text, or None when no version was stored by then
+        """
+        with self._lock:
+            if timestamp is None:
+                row = self._connection.execute(
+                    'SELECT id FROM snapshots WHERE practice_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1',
+                    (practice_id,)
+                ).fetchone()
+            else:
+                row = self._connection.execute(
+                    'SELECT id FROM snapshots WHERE practice_id = ? AND timestamp <= ? '
+                    'ORDER BY timestamp DESC, id DESC LIMIT 1',
+                    (practice_id, timestamp)
+                ).fetchone()
+            return self._text(row[0]) if row else None
+
+    def versions(self, practice_id, limit=50):
+        """
+        List the stored versions of a practice, newest first.
+
+        Returns:
+            list: Dicts with timestamp, kind, fingerprint, page size and stored bytes
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT timestamp, kind, fingerprint, size, LENGTH(data) FROM snapshots '
+                'WHERE practice_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?',
+                (practice_id, limit)
+            ).fetchall()
+        return [
+            {'timestamp': timestamp, 'kind': kind, 'fingerprint': fingerprint.hex(), 'size': size, 'bytes': stored or 0}
+            for timestamp, kind, fingerprint, size, stored in rows
+        ]
+
+    def stats(self):
+        """
+        Get the size of the store.
+
+        Returns:
+            dict: versions, practices, page bytes, stored bytes and the count per kind
+        """
+        with self._lock:
+            versions, practices, size, stored = self._connection.execute(
+                'SELECT COUNT(*), COUNT(DISTINCT practice_id), COALESCE(SUM(size), 0), '
+                'COALESCE(SUM(LENGTH(data)), 0) FROM snapshots'
+            ).fetchone()
+            kinds = dict(self._connection.execute('SELECT kind, COUNT(*) FROM snapshots GROUP BY kind').fetchall())
+        return {'versions': versions, 'practices': practices, 'pageBytes': size, 'storedBytes': stored, 'kinds': kinds}
+
+    def _text(self, snapshot_id):
+        """Decompress a version; the caller holds the lock"""
+        kind, base_id, same_as, data = self._connection.execute(
+            'SELECT kind, base_id, same_as, data FROM snapshots WHERE id = ?', (snapshot_id,)
+        ).fetchone()
+        if kind == 'same':
+            return self._text(same_as)
+        if kind == 'base':
+            return self._base_text(snapshot_id).decode('utf-8')
+        decompressor = zlib.decompressobj(zdict=self._base_text(base_id)[-ZDICT_SIZE:])
+        return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+
+    def _base_text(self, base_id):
+        """Get the encoded text of a base version, from memory if it was used recently; the caller holds the lock"""
+        raw = self._bases.get(base_id)
+        if raw is not None:
+            self._bases.move_to_end(base_id)
+        else:
+            raw = zlib.decompress(self._connection.execute(
+                'SELECT data FROM snapshots WHERE id = ?', (base_id,)
+            ).fetchone()[0])
+            self._bases[base_id] = raw
+            if len(self._bases) > self.cached_bases:
+                self._bases.popitem(last=False)
+        return raw
@@ -0,0 +1,252 @@
+import csv
+import gzip
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from modules.status_history import parse_timestamp
+from modules.check_compactor import compact_checks
+
+# Sheets that are split into one worksheet per month
+PARTITIONED_SHEETS = ('CHECKS', 'LOGS')
+
+# A partition that is not found is looked up again at most this often (seconds)
+MISS_REFRESH_SECONDS = 5
+
+# Archive column with the worksheet row of every record, kept through compaction
+ROW_COLUMN = 'sheetRow'
+
+def partition_key(timestamp=None):
+    """Get the monthly partition key ('YYYY_MM') for a timestamp, default now"""
+    timestamp = parse_timestamp(timestamp) or datetime.now()
+    return f'{timestamp.year:04d}_{timestamp.month:02d}'
+
+def next_partition_key(key):
+    """Get the partition key of the month after the given one"""
+    year, month = (int(part) for part in key.split('_'))
+    return f'{year + month // 12:04d}_{month % 12 + 1:02d}'
+
+def partition_keys_between(start, end):
+    """Get all partition keys from start up to and including end"""
+    keys = []
+    key = partition_key(start)
+    last_key = partition_key(end)
+    while key <= last_key:
+        keys.append(key)
+        key = next_partition_key(key)
+    return keys
+
+class PartitionManager:
+    """
+    Monthly partitions of the checks and logs sheets.
+
+    Every month gets its own worksheet, e.g. 'Controles_2025_03'. Partitions
+    of past months are closed: they can be exported to a compressed CSV file
+    in the archive directory and removed from the spreadsheet. Queries read
+    only the partitions their time range needs, from the spreadsheet or the
+    archive, and writes only ever touch the current month.
+
+    The worksheet titles are read again every titles_ttl seconds, and
+    sooner when a partition is not found, so partitions created or archived
+    by another DataLayer are seen without a restart.
+    """
+
+    def __init__(self, data_layer, archive_dir=None, titles_ttl=None):
+        self.data_layer = data_layer
+        self.archive_dir = archive_dir or os.getenv('ARCHIVE_DIR', 'archive')
+        self.titles_ttl = titles_ttl if titles_ttl is not None else float(os.getenv('PARTITION_TITLES_TTL', '60'))
+        self._worksheets = {}  # title -> worksheet
+        self._titles = None
+        self._titles_read = 0
+        self._lock = threading.Lock()
+
+    def sheet_title(self, sheet_key, key):
+        """Get the worksheet title of a partition"""
+        return f"{self.data_layer.sheet_names[sheet_key]}_{key}"
+
+    def archive_path(self, sheet_key, key):
+        """Get the path of the archive file of a partition"""
+        return os.path.join(self.archive_dir, f'{self.sheet_title(sheet_key, key)}.csv.gz')
+
+    def get_worksheet(self, sheet_key, key, create=False):
+        """Get the worksheet of a partition, optionally creating it"""
+        return self._get_worksheet_by_title(sheet_key, self.sheet_title(sheet_key, key), create)
+
+    def get_legacy_worksheet(self, sheet_key):
+        """Get the unpartitioned sheet from before partitioning, if it still exists"""
+        return self._get_worksheet_by_title(sheet_key, self.data_layer.sheet_names[sheet_key])
+
+    def known_keys(self, sheet_key):
+        """Get the keys of all partitions in the spreadsheet or the archive"""
+        pattern = re.compile(re.escape(self.data_layer.sheet_names[sheet_key]) + r'_(\d{4}_\d{2})(\.csv\.gz)?$')
+        names = []
+        if self.data_layer.spreadsheet is not None:
+            with self._lock:
+                names = list(self._get_titles())
+        if os.path.isdir(self.archive_dir):
+            names.extend(os.listdir(self.archive_dir))
+        return sorted({match.group(1) for match in map(pattern.match, names) if match})
+
+    def keys_for_range(self, sheet_key, start=None, end=None):
+        """Get the keys of the partitions that can hold records between start and end"""
+        if start is None:
+            keys = [key for key in self.known_keys(sheet_key) if not end or key <= partition_key(end)]
+            current = partition_key()
+            if (not end or current <= partition_key(end)) and current not in keys:
+                keys.append(current)
+            return keys
+        return partition_keys_between(start, end or datetime.now())
+
+    def iter_partition(self, sheet_key, key, batch_size=1000, start_row=2):
+        """Iterate over the records of one partition, from the archive or the spreadsheet"""
+        path = self.archive_path(sheet_key, key)
+        if os.path.exists(path):
+            yield from self._iter_archive(path, batch_size, start_row)
+            return
+        worksheet = self.get_worksheet(sheet_key, key)
+        if worksheet is not None:
+            yield from self.data_layer._iter_sheet_rows(worksheet, sheet_key, batch_size, start_row)
+
+    def migrate_legacy_sheet(self, sheet_key, batch_size=1000):
+        """
+        Move the rows of the unpartitioned sheet into the monthly partitions.
+
+        The old rows precede everything in the partitions, so they are
+        inserted at the top of a partition that already exists. The
+        unpartitioned sheet is removed afterwards.
+
+        Returns:
+            int: Number of rows that were moved
+        """
+        legacy = self.get_legacy_worksheet(sheet_key)
+        if legacy is None:
+            return 0
+
+        rows_by_key = {}
+        moved = 0
+        for batch in self.data_layer._iter_sheet_rows(legacy, sheet_key, batch_size):
+            for record in batch:
+                rows_by_key.setdefault(partition_key(record.get('timestamp')), []).append(
+                    self.data_layer._to_row(sheet_key, record)
+                )
+            moved += len(batch)
+
+        for key, rows in sorted(rows_by_key.items()):
+            worksheet = self.get_worksheet(sheet_key, key, create=True)
+            if worksheet.get_values('A2:A2'):
+                worksheet.insert_rows(rows, row=2, value_input_option='RAW')
+            else:
+                worksheet.append_rows(rows, value_input_option='RAW')
+
+        self._delete_worksheet(legacy)
+        return moved
+
+    def archive_closed_partitions(self, sheet_key):
+        """
+        Export the partitions of past months to compressed files.
+
+        Checks are run-length compacted before they are written; every row
+        keeps the worksheet row it started at, so cursors into the partition
+        stay valid. After the export the worksheet is removed from the
+        spreadsheet.
+
+        Returns:
+            list: Results per archived partition with the number of rows
+        """
+        results = []
+        current = partition_key()
+        for key in self.known_keys(sheet_key):
+            if key >= current or os.path.exists(self.archive_path(sheet_key, key)):
+                continue
+            worksheet = self.get_worksheet(sheet_key, key)
+            if worksheet is None:
+                continue
+
+            records = []
+            for batch in self.data_layer._iter_sheet_rows(worksheet, sheet_key):
+                records.extend(batch)
+            for row_number, record in enumerate(records, start=2):
+                record[ROW_COLUMN] = row_number
+            if sheet_key == 'CHECKS':
+                records = compact_checks(records)
+            self._write_archive(self.archive_path(sheet_key, key), sheet_key, records)
+            self._delete_worksheet(worksheet)
+            results.append({'partition': key, 'rows': len(records)})
+        return results
+
+    def _get_worksheet_by_title(self, sheet_key, title, create=False):
+        """Get a worksheet from the cache or the spreadsheet"""
+        spreadsheet = self.data_layer.spreadsheet
+        if spreadsheet is None:
+            return None
+
+        with self._lock:
+            titles = self._get_titles()
+            if title in self._worksheets:
+                return self._worksheets[title]
+            if title not in titles:
+                # Another DataLayer may have created it since the titles were read
+                titles = self._get_titles(max_age=MISS_REFRESH_SECONDS)
+            if title in titles:
+                worksheet = spreadsheet.worksheet(title)
+            elif not create:
+                return None
+            else:
+                import gspread
+                headers = self.data_layer.headers[sheet_key]
+                try:
+                    worksheet = spreadsheet.add_worksheet(title=title, rows=1, cols=len(headers))
+                    worksheet.append_row(headers)
+                except gspread.exceptions.APIError:
+                    # Another process created the partition first
+                    worksheet = spreadsheet.worksheet(title)
+                self._titles.add(title)
+            self._worksheets[title] = worksheet
+            return worksheet
+
+    def _delete_worksheet(self, worksheet):
+        """Remove a worksheet from the spreadsheet and the cache"""
+        with self._lock:
+            self.data_layer.spreadsheet.del_worksheet(worksheet)
+            self._worksheets.pop(worksheet.title, None)
+            self._get_titles().discard(worksheet.title)
+
+    def _get_titles(self, max_age=None):
+        """Get the titles of all worksheets, read again when older than max_age (default titles_ttl)"""
+        max_age = self.titles_ttl if max_age is None else max_age
+        if self._titles is None or time.monotonic() - self._titles_read > max_age:
+            self._titles = {worksheet.title for worksheet in self.data_layer.spreadsheet.worksheets()}
+            self._titles_read = time.monotonic()
+            # Forget worksheets that were removed elsewhere, e.g. archived by another DataLayer
+            for title in list(self._worksheets):
+                if title not in self._titles:
+                    del self._worksheets[title]
+        return self._titles
+
+    def _write_archive(self, path, sheet_key, records):
+        """Write records to a gzip compressed CSV file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary_path = path + '.tmp'
+        with gzip.open(temporary_path, 'wt', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=self.data_layer.headers[sheet_key] + [ROW_COLUMN], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+        os.replace(temporary_path, path)
+
+    def _iter_archive(self, path, batch_size, start_row):
+        """Iterate over the records of an archive file in batches"""
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as file:
+            batch = []
+            for position, record in enumerate(csv.DictReader(file), start=2):
+                # The worksheet row the record (or its compacted run) started at;
+                # archives without the column were not compacted
+                row_number = int(record.pop(ROW_COLUMN, None) or position)
+                if row_number < start_row:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
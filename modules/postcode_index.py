@@ -0,0 +1,278 @@
+import bisect
+import re
+import threading
+
+from modules.records import Details
+
+# Dutch postcodes have four digits (1000-9999) followed by two letters
+MIN_POSTCODE = 1000
+MAX_POSTCODE = 9999
+
+# Postcodes are only read right after one of these words, so other numbers
+# in a condition, e.g. "maximaal 2500 patiënten", are not taken for postcodes
+POSTCODE_WORDS = re.compile(
+    r'\b(?:postcodegebied(?:en)?|postcodes?|pc)\b(?:\s+(?:gebied(?:en)?|in|uit|van))*\s*:?\s*',
+    re.IGNORECASE
+)
+# Four digits with optional letters; "of" and "en" after the digits join a list
+POSTCODE = r'\d{4}(?!\d)(?:\s*(?!(?:of|en)\b)[a-z]{2}(?![a-z]))?'
+POSTCODE_ITEM = re.compile(
+    rf'(?P<low>{POSTCODE})\s*(?:-|–|t/m|tot en met|tot)\s*(?P<high>{POSTCODE})'
+    r'|(?P<digits>\d{2,3})(?P<wildcard>[x*]{1,2})(?!\w)'
+    rf'|(?P<single>{POSTCODE})',
+    re.IGNORECASE
+)
+POSTCODE_LIST = re.compile(r'\s*(?:,|;|/|&|\bof\b|\ben\b)\s*', re.IGNORECASE)
+
+def parse_postcode(value):
+    """
+    Get the four digits of a postcode, e.g. 1012 for '1012 AB'.
+
+    Returns:
+        int: The numeric part, or None when the value is not a postcode
+    """
+    match = re.match(r'\s*(\d{4})\s*(?:[a-z]{2})?\s*$', str(value or ''), re.IGNORECASE)
+    if not match:
+        return None
+    postcode = int(match.group(1))
+    return postcode if MIN_POSTCODE <= postcode <= MAX_POSTCODE else None
+
+def parse_postcode_ranges(conditions):
+    """
+    Turn the free text conditions of a practice into postcode ranges.
+
+    Understands ranges ("postcode gebied 1011-1018", "postcode 1011AB t/m
+    1018ZZ"), wildcards ("postcodes 10xx") and single postcodes ("postcode
+    1012 of 1015"). Only numbers right after a postcode word, or joined to
+    one by a list word, are read; conditions without postcode words are
+    ignored.
+
+    Args:
+        conditions (list): Condition texts from the details of a practice
+
+    Returns:
+        list: Sorted, non-overlapping (low, high) tuples, both inclusive;
+            empty when no condition restricts the postcode
+    """
+    ranges = []
+    for condition in conditions or ():
+        if not isinstance(condition, str):
+            continue
+        for keyword in POSTCODE_WORDS.finditer(condition):
+            ranges.extend(_parse_postcode_list(condition, keyword.end()))
+    return merge_ranges(ranges)
+
+def _parse_postcode_list(text, position):
+    """Read the postcodes, ranges and wildcards joined by list words from a position on"""
+    ranges = []
+    while True:
+        match = POSTCODE_ITEM.match(text, position)
+        if not match:
+            return ranges
+        if match.group('low'):
+            ranges.append((int(match.group('low')[:4]), int(match.group('high')[:4])))
+        elif match.group('digits'):
+            digits, wildcard = match.group('digits', 'wildcard')
+            if len(digits) + len(wildcard) != 4:
+                return ranges
+            scale = 10 ** len(wildcard)
+            ranges.append((int(digits) * scale, int(digits) * scale + scale - 1))
+        else:
+            postcode = int(match.group('single')[:4])
+            ranges.append((postcode, postcode))
+        connector = POSTCODE_LIST.match(text, match.end())
+        if not connector:
+            return ranges
+        position = connector.end()
+
+def merge_ranges(ranges):
+    """Sort ranges, drop the ones outside the postcode area and merge overlaps"""
+    merged = []
+    for low, high in sorted((min(r), max(r)) for r in ranges):
+        low, high = max(low, MIN_POSTCODE), min(high, MAX_POSTCODE)
+        if low > high:
+            continue
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+class IntervalIndex:
+    """
+    Stabbing queries over inclusive integer intervals.
+
+    The number line is cut into segments at every interval boundary; each
+    segment holds the set of keys whose intervals cover it. Finding the
+    keys that cover a point is a binary search for its segment. Adding or
+    removing an interval only touches the segments it spans.
+    """
+
+    def __init__(self):
+        self._bounds = [MIN_POSTCODE]  # Start of every segment, sorted
+        self._members = [set()]  # Keys covering the segment that starts at the same position
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def add(self, key, low, high):
+        """Add an interval; the intervals of one key must not overlap"""
+        start = self._split(low)
+        end = self._split(high + 1)
+        for position in range(start, end):
+            self._members[position].add(key)
+
+    def remove(self, key, low, high):
+        """Remove an interval that was added before"""
+        start = bisect.bisect_left(self._bounds, low)
+        end = bisect.bisect_left(self._bounds, high + 1)
+        for position in range(start, end):
+            self._members[position].discard(key)
+        # Join segments that hold the same keys again, from the right so positions stay valid
+        for position in (end, start):
+            if 0 < position < len(self._bounds) and self._members[position] == self._members[position - 1]:
+                del self._bounds[position]
+                del self._members[position]
+
+    def stab(self, point):
+        """Get the keys whose intervals contain the point"""
+        position = bisect.bisect_right(self._bounds, point) - 1
+        return self._members[position] if position >= 0 else set()
+
+    def _split(self, point):
+        """Make a segment start at the point and return its position"""
+        position = bisect.bisect_right(self._bounds, point) - 1
+        if self._bounds[position] == point:
+            return position
+        self._bounds.insert(position + 1, point)
+        self._members.insert(position + 1, set(self._members[position]))
+        return position + 1
+
+class PostcodeIndex:
+    """
+    Index from postcode to the practices that accept patients there.
+
+    The postcode conditions of every practice are parsed once, and only
+    the practices with status ACCEPTING are in the interval index. The
+    index is built once from the practices sheet and kept up to date
+    through the practice listener events of the DataLayer, so the status
+    and details that a website check stores are applied as they happen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._practices = {}  # practiceId -> {'practice': fields, 'ranges': postcode ranges}
+        self._intervals = IntervalIndex()
+        self._unrestricted = set()  # Accepting practices without postcode conditions
+
+    def __len__(self):
+        return len(self._practices)
+
+    def add(self, practice):
+        """Add a practice to the index, replacing an existing entry"""
+        with self._lock:
+            self._remove(practice['practiceId'])
+            self._add(practice)
+
+    def add_many(self, practices):
+        """Add multiple practices to the index"""
+        with self._lock:
+            for practice in practices:
+                self._remove(practice['practiceId'])
+                self._add(practice)
+
+    def remove(self, practice_id):
+        """Remove a practice from the index"""
+        with self._lock:
+            self._remove(practice_id)
+
+    def get_ranges(self, practice_id):
+        """Get the parsed postcode ranges of a practice, or None when unknown"""
+        with self._lock:
+            entry = self._practices.get(practice_id)
+            return list(entry['ranges']) if entry else None
+
+    def eligible(self, postcode, include_unrestricted=False, user_id=None):
+        """
+        Find the accepting practices whose conditions include a postcode.
+
+        Args:
+            postcode: A postcode, e.g. '1012 AB' or 1012
+            include_unrestricted (bool): Also return accepting practices
+                without postcode conditions
+            user_id (str): Only return practices of this user
+
+        Returns:
+            list: Practices (dicts) ordered by name, each with its 'ranges'
+                and whether it is 'restricted' to those ranges
+        """
+        number = parse_postcode(postcode)
+        if number is None:
+            return []
+        with self._lock:
+            practice_ids = set(self._intervals.stab(number))
+            if include_unrestricted:
+                practice_ids |= self._unrestricted
+            results = []
+            for practice_id in practice_ids:
+                entry = self._practices[practice_id]
+                if user_id and entry['practice']['userId'] != user_id:
+                    continue
+                results.append(dict(entry['practice'], ranges=list(entry['ranges']), restricted=bool(entry['ranges'])))
+        return sorted(results, key=lambda practice: (practice.get('name') or '', practice['practiceId']))
+
+    # Practice listener events of the DataLayer
+    def on_practice_created(self, practice):
+        self.add(practice)
+
+    def on_practice_updated(self, practice_id, updates):
+        if not {'name', 'websiteUrl', 'status', 'details'} & set(updates):
+            return
+        with self._lock:
+            entry = self._practices.get(practice_id)
+            if entry is None:
+                return
+            practice = dict(entry['practice'], ranges=entry['ranges'])
+            practice.update({key: updates[key] for key in ('name', 'websiteUrl', 'status', 'details') if key in updates})
+            self._remove(practice_id)
+            self._add(practice)
+
+    def on_practice_deleted(self, practice_id):
+        self.remove(practice_id)
+
+    def _add(self, practice):
+        """Index a practice; the caller holds the lock"""
+        practice_id = practice['practiceId']
+        if 'details' in practice:
+            details = Details.parse(practice.get('details'))
+            ranges = parse_postcode_ranges(details.get('conditions') if details else None)
+        else:
+            # Details unchanged, keep the ranges parsed before
+            ranges = practice.get('ranges', [])
+        status = practice.get('status')
+        entry = self._practices[practice_id] = {
+            'practice': {
+                'practiceId': practice_id,
+                'userId': practice.get('userId'),
+                'name': practice.get('name'),
+                'websiteUrl': practice.get('websiteUrl'),
+                'status': str(status) if status else status
+            },
+            'ranges': ranges
+        }
+        if entry['practice']['status'] != 'ACCEPTING':
+            return
+        if not ranges:
+            self._unrestricted.add(practice_id)
+        for low, high in ranges:
+            self._intervals.add(practice_id, low, high)
+
+    def _remove(self, practice_id):
+        """Remove a practice from the index; the caller holds the lock"""
+        entry = self._practices.pop(practice_id, None)
+        if entry is None:
+            return
+        self._unrestricted.discard(practice_id)
+        if entry['practice']['status'] == 'ACCEPTING':
+            for low, high in entry['ranges']:
+                self._intervals.remove(practice_id, low, high)
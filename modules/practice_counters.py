@@ -0,0 +1,201 @@
+import os
+import threading
+
+from modules.logger import Logger
+from modules.metrics import metrics
+
+STATUSES = ('ACCEPTING', 'NOT_ACCEPTING', 'UNKNOWN')
+
+def count_practices(practices):
+    """Count a list of practices by status, as PracticeCounters.get returns them"""
+    counts = _empty_counts()
+    for practice in practices:
+        _add_to(counts, _status(practice.get('status')), 1)
+    return counts
+
+class PracticeCounters:
+    """
+    Number of practices per status, per user and over all users.
+
+    The counters are built once from the practices sheet and then kept up
+    to date through the practice listener events of the DataLayer, so the
+    metric tiles and the admin overview read them without going through
+    the practices. For every practice only its user and status are kept,
+    to know which counters an update or delete changes.
+
+    Events that are missed, e.g. changes made in the sheet by hand or by
+    another replica, make the counters drift. reconcile() recounts from a
+    full scan and reports the drift; start() does that periodically in a
+    background thread.
+
+    Args:
+        interval (int): Seconds between two reconciliations, 0 for none
+    """
+
+    def __init__(self, interval=None, logger=None):
+        self.interval = interval if interval is not None else int(os.getenv('PRACTICE_COUNTERS_RECONCILE_INTERVAL', '3600'))
+        self.last_reconciliation = None
+        self._lock = threading.Lock()
+        self._practices = {}  # practiceId -> (userId, status)
+        self._users = {}  # userId -> counts
+        self._total = _empty_counts()
+        self._events = None  # Events received during a reconciliation, to replay on its result
+        self._thread = None
+        self._stop = threading.Event()
+        self.logger = logger if logger else Logger()
+
+    def __len__(self):
+        return len(self._practices)
+
+    def add_many(self, practices):
+        """Add multiple practices to the counters"""
+        with self._lock:
+            for practice in practices:
+                self._set(practice['practiceId'], practice.get('userId'), _status(practice.get('status')))
+
+    def get(self, user_id=None):
+        """
+        Get the counts of a user, or over all users when no user is given.
+
+        Returns:
+            dict: total and the count per status, or None for a user
+                without practices
+        """
+        with self._lock:
+            counts = self._total if user_id is None else self._users.get(user_id)
+            return dict(counts) if counts else None
+
+    def users(self):
+        """Get the counts of every user, by user id"""
+        with self._lock:
+            return {user_id: dict(counts) for user_id, counts in self._users.items()}
+
+    def reconcile(self, practices):
+        """
+        Recount from all practices and replace the counters with the result.
+
+        Events that arrive while the practices are being read are applied
+        to the recount as well, so none are lost.
+
+        Args:
+            practices: Iterable over batches (lists) of practices
+
+        Returns:
+            dict: practices counted, drift (the sum of the differences over
+                all counters) and the total counts before and after
+        """
+        with self._lock:
+            self._events = []
+        try:
+            recount = PracticeCounters(interval=0)
+            for batch in practices:
+                recount.add_many(batch)
+        except Exception:
+            with self._lock:
+                self._events = None
+            raise
+
+        with self._lock:
+            for event, args in self._events:
+                getattr(recount, event)(*args)
+            self._events = None
+            before = self._total
+            drift = sum(
+                abs(recount._users.get(user_id, {}).get(key, 0) - self._users.get(user_id, {}).get(key, 0))
+                for user_id in set(self._users) | set(recount._users)
+                for key in ('total',) + STATUSES
+            )
+            self._practices, self._users, self._total = recount._practices, recount._users, recount._total
+            metrics.inc('practice_counter_reconciliations_total')
+            if drift:
+                metrics.inc('practice_counter_drift_total', drift)
+            self.last_reconciliation = {
+                'practices': len(self._practices),
+                'drift': drift,
+                'before': dict(before),
+                'after': dict(self._total)
+            }
+            return dict(self.last_reconciliation)
+
+    def start(self, load):
+        """
+        Reconcile every interval, in a background thread.
+
+        Args:
+            load (callable): Returns an iterable over batches of all practices
+        """
+        if self._thread is not None or not self.interval:
+            return
+        self._thread = threading.Thread(target=self._run, args=(load,), name='practice-counters', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop reconciling"""
+        self._stop.set()
+
+    # Practice listener events of the DataLayer
+    def on_practice_created(self, practice):
+        with self._lock:
+            self._record('on_practice_created', practice)
+            self._set(practice['practiceId'], practice.get('userId'), _status(practice.get('status')))
+
+    def on_practice_updated(self, practice_id, updates):
+        if 'status' not in updates and 'userId' not in updates:
+            return
+        with self._lock:
+            self._record('on_practice_updated', practice_id, updates)
+            current = self._practices.get(practice_id)
+            if current is None:
+                return
+            user_id, status = current
+            self._set(practice_id, updates.get('userId', user_id), _status(updates.get('status', status)))
+
+    def on_practice_deleted(self, practice_id):
+        with self._lock:
+            self._record('on_practice_deleted', practice_id)
+            self._unset(practice_id)
+
+    def _record(self, event, *args):
+        """Keep an event for the reconciliation that is running; the caller holds the lock"""
+        if self._events is not None:
+            self._events.append((event, args))
+
+    def _set(self, practice_id, user_id, status):
+        """Count a practice under its user and status; the caller holds the lock"""
+        self._unset(practice_id)
+        self._practices[practice_id] = (user_id, status)
+        _add_to(self._total, status, 1)
+        _add_to(self._users.setdefault(user_id, _empty_counts()), status, 1)
+
+    def _unset(self, practice_id):
+        """Stop counting a practice; the caller holds the lock"""
+        current = self._practices.pop(practice_id, None)
+        if current is None:
+            return
+        user_id, status = current
+        _add_to(self._total, status, -1)
+        counts = self._users[user_id]
+        _add_to(counts, status, -1)
+        if not counts['total']:
+            del self._users[user_id]
+
+    def _run(self, load):
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.reconcile(load())
+                if result['drift']:
+                    self.logger.warning(f"Practice counters drifted by {result['drift']}, corrected from {result['practices']} practices")
+            except Exception as e:
+                self.logger.error(f"Error reconciling practice counters: {e}")
+
+def _empty_counts():
+    return dict.fromkeys(('total',) + STATUSES, 0)
+
+def _add_to(counts, status, amount):
+    counts['total'] += amount
+    counts[status] += amount
+
+def _status(status):
+    """The status of a practice as one of STATUSES"""
+    status = str(status) if status else 'UNKNOWN'
+    return status if status in STATUSES else 'UNKNOWN'
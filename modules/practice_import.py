@@ -0,0 +1,216 @@
+import csv
+import json
+import os
+import re
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+# Accepted column names (lowercase) for the practice name and website URL
+NAME_COLUMNS = ('name', 'naam', 'praktijk', 'praktijknaam')
+URL_COLUMNS = ('websiteurl', 'website', 'url', 'websiteadres')
+
+HOSTNAME_PATTERN = re.compile(r'^[a-z0-9]([a-z0-9-]*[a-z0-9])?(\.[a-z0-9]([a-z0-9-]*[a-z0-9])?)+$')
+
+def normalize_url(url):
+    """
+    Normalize a website URL entered by a user.
+
+    Adds a missing scheme, lowercases the host and drops fragments and
+    trailing slashes.
+
+    Returns:
+        str: The normalized URL, or None if the URL is not valid
+    """
+    if not isinstance(url, str):
+        return None
+    url = url.strip()
+    if not url or ' ' in url:
+        return None
+    if '://' not in url:
+        url = f'https://{url}'
+
+    try:
+        parts = urlsplit(url)
+        hostname = parts.hostname
+        # A port that is not a number or out of range raises a ValueError
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or not hostname:
+        return None
+    if not HOSTNAME_PATTERN.match(hostname):
+        return None
+
+    netloc = hostname if not port else f'{hostname}:{port}'
+    path = parts.path.rstrip('/')
+    return urlunsplit((parts.scheme, netloc, path, parts.query, ''))
+
+def url_key(url):
+    """
+    Get the key used to detect duplicate practices.
+
+    The key ignores the scheme, a leading 'www.' and trailing slashes, so
+    http://www.praktijk.nl/ and https://praktijk.nl are the same practice.
+    """
+    normalized = normalize_url(url)
+    if not normalized:
+        return None
+    parts = urlsplit(normalized)
+    host = parts.netloc[4:] if parts.netloc.startswith('www.') else parts.netloc
+    key = host + parts.path
+    if parts.query:
+        key += '?' + parts.query
+    return key
+
+class PracticeImporter:
+    """Import practices in bulk from a CSV or Excel file"""
+
+    def __init__(self, data_layer, chunk_size=500):
+        self.data_layer = data_layer
+        self.chunk_size = chunk_size
+
+    def import_file(self, file, user_id, filename=None, existing_practices=None, progress_callback=None):
+        """
+        Import practices from a CSV or Excel file.
+
+        The file is read in chunks; every chunk is validated, deduplicated
+        against the existing practices and written with one batched append.
+
+        Args:
+            file: Path or file-like object with the CSV or Excel data
+            user_id (str): The user the practices are imported for
+            filename (str): Name of the file, used to detect the format
+            existing_practices (list): Practices of the user, read from the
+                data layer if not provided
+            progress_callback (callable): Called after every chunk with the
+                number of processed, imported and rejected rows
+
+        Returns:
+            dict: Import result with counts and the rejected rows
+        """
+        if existing_practices is None:
+            existing_practices = self.data_layer.get_practices_by_user(user_id) or []
+
+        # Index of URL keys that already exist for this user
+        known_keys = set()
+        for practice in existing_practices:
+            key = url_key(practice.get('websiteUrl'))
+            if key:
+                known_keys.add(key)
+
+        processed = 0
+        imported = 0
+        rejected = []
+
+        try:
+            for chunk in self._read_chunks(file, filename):
+                practices = self._process_chunk(chunk, user_id, known_keys, processed, rejected)
+                if practices:
+                    self.data_layer.create_practices(practices)
+                    imported += len(practices)
+                processed += len(chunk)
+
+                if progress_callback:
+                    progress_callback(processed, imported, len(rejected))
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': f'Error reading import file: {str(e)}',
+                'totalRows': processed,
+                'imported': imported,
+                'rejected': rejected
+            }
+
+        return {
+            'success': True,
+            'message': f'Imported {imported} of {processed} practices, {len(rejected)} rejected',
+            'totalRows': processed,
+            'imported': imported,
+            'rejected': rejected
+        }
+
+    def _read_chunks(self, file, filename=None):
+        """Yield the rows of the file as DataFrames of at most chunk_size rows"""
+        if filename is None:
+            filename = file if isinstance(file, str) else getattr(file, 'name', '')
+        extension = os.path.splitext(filename)[1].lower()
+        # pandas is only needed for imports, so it is not loaded with the pages
+        import pandas as pd
+
+        if extension == '.xls':
+            # Reading the old Excel format needs xlrd, which is not installed
+            raise ValueError('Old Excel files (.xls) are not supported, save the file as .xlsx or .csv')
+        if extension == '.xlsx':
+            # Excel files cannot be streamed by pandas, so slice the sheet instead
+            frame = pd.read_excel(file, dtype=str)
+            for start in range(0, len(frame), self.chunk_size):
+                yield frame.iloc[start:start + self.chunk_size]
+        else:
+            yield from pd.read_csv(
+                file, dtype=str, sep=self._detect_separator(file),
+                chunksize=self.chunk_size, skipinitialspace=True
+            )
+
+    def _detect_separator(self, file):
+        """
+        Detect the separator of a CSV file from its first lines.
+
+        Only ',', ';' and tabs are considered, so a file with a single
+        column (no separator at all) is read with ','.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as handle:
+                sample = handle.read(8192)
+        else:
+            position = file.tell()
+            sample = file.read(8192)
+            file.seek(position)
+        if isinstance(sample, bytes):
+            sample = sample.decode('utf-8', errors='ignore')
+        # Leave out the last line, which may be cut off
+        lines = sample.splitlines()
+        sample = '\n'.join(lines[:-1] if len(lines) > 1 else lines)
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+        except csv.Error:
+            return ','
+
+    def _process_chunk(self, chunk, user_id, known_keys, offset, rejected):
+        """Validate and deduplicate a chunk, returning the practices to create"""
+        columns = {str(column).strip().lower(): column for column in chunk.columns}
+        name_column = next((columns[c] for c in NAME_COLUMNS if c in columns), None)
+        url_column = next((columns[c] for c in URL_COLUMNS if c in columns), None)
+        if url_column is None:
+            raise ValueError('No website URL column found (expected one of: ' + ', '.join(URL_COLUMNS) + ')')
+
+        names = chunk[name_column].tolist() if name_column is not None else [None] * len(chunk)
+        urls = chunk[url_column].tolist()
+
+        practices = []
+        for index, (name, raw_url) in enumerate(zip(names, urls)):
+            # Row numbers as shown in a spreadsheet, after the header row
+            row_number = offset + index + 2
+            url = normalize_url(raw_url)
+            if not url:
+                rejected.append({'row': row_number, 'url': raw_url, 'reason': 'Invalid URL'})
+                continue
+
+            key = url_key(url)
+            if key in known_keys:
+                rejected.append({'row': row_number, 'url': raw_url, 'reason': 'Duplicate URL'})
+                continue
+            known_keys.add(key)
+
+            name = name.strip() if isinstance(name, str) and name.strip() else urlsplit(url).hostname
+            practices.append({
+                'practiceId': str(uuid.uuid4()),
+                'userId': user_id,
+                'name': name,
+                'websiteUrl': url,
+                'status': 'UNKNOWN',
+                'lastChecked': None,
+                'lastStatusChange': None,
+                'details': json.dumps({})
+            })
+
+        return practices
@@ -0,0 +1,168 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+class Profiler:
+    """
+    Opt-in cProfile hooks for page reruns and bulk website checks.
+
+    An admin switches profiling on in the settings page. While it is on,
+    every rerun of a page and every check_all_user_websites call is
+    profiled separately and saved as a .prof file in PROFILE_DIR, with a
+    JSON file next to it holding the duration, the number of active
+    sessions and the number of practices involved. The .prof files can
+    be opened with pstats, snakeviz or a flamegraph tool like flameprof.
+    Only the most recent PROFILE_KEEP profiles are kept.
+    """
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = directory or os.getenv('PROFILE_DIR', 'profiles')
+        self.keep = keep if keep is not None else int(os.getenv('PROFILE_KEEP', '50'))
+        self.enabled = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, kind, target):
+        """
+        Profile the code in the with block when profiling is on.
+
+        Yields the metadata dict of the profile, which the caller can add
+        counts to, or None when nothing is profiled. Code that already runs
+        in a profiled rerun is part of that profile.
+
+        Args:
+            kind (str): What is profiled, e.g. 'check_run'
+            target (str): Which page or user it is profiled for
+        """
+        if not self.enabled or getattr(self._local, 'active', None) is not None:
+            yield None
+            return
+        metadata = self._start(kind, target)
+        try:
+            yield metadata
+        finally:
+            if metadata is not None:
+                self._stop()
+
+    def start_rerun(self, page):
+        """Start profiling a rerun of a page, at the top of the page script"""
+        active = getattr(self._local, 'active', None)
+        if active is not None:
+            # The previous rerun in this thread ended in st.rerun, which
+            # starts the next rerun right away, so save it as it is
+            if active[1]['kind'] == 'rerun':
+                active[1]['interrupted'] = True
+                self._save_rerun()
+            else:
+                active[0].disable()
+                self._local.active = None
+        if self.enabled:
+            self._start('rerun', page)
+
+    def stop_rerun(self):
+        """Save the profile of the rerun, at the bottom of the page script and before st.stop"""
+        active = getattr(self._local, 'active', None)
+        if active is not None and active[1]['kind'] == 'rerun':
+            self._save_rerun()
+
+    def _save_rerun(self):
+        import streamlit as st
+        snapshot = st.session_state.get('data_snapshot')
+        self._local.active[1]['practices'] = snapshot.practice_count() if snapshot else None
+        self._stop()
+
+    def list_profiles(self, limit=20):
+        """
+        Get the metadata of the most recent profiles.
+
+        Returns:
+            list: Metadata dicts, newest first
+        """
+        profiles = []
+        for name in self._profile_names()[:limit]:
+            try:
+                with open(os.path.join(self.directory, name + '.json'), encoding='utf-8') as file:
+                    profiles.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def profile_path(self, name):
+        """Get the path of the .prof file of a profile"""
+        return os.path.join(self.directory, name + '.prof')
+
+    def format_stats(self, name, limit=25):
+        """Get the functions with the highest cumulative time of a profile as text"""
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile_path(name), stream=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def _start(self, kind, target):
+        started = datetime.now()
+        metadata = {
+            'name': f"{started.strftime('%Y%m%d_%H%M%S_%f')}_{kind}_{re.sub(r'[^A-Za-z0-9]+', '-', str(target))}",
+            'kind': kind,
+            'target': str(target),
+            'startedAt': started.isoformat(),
+            'sessions': _active_sessions(),
+            'practices': None
+        }
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active, e.g. in another thread on Python 3.12+
+            return None
+        self._local.active = (profile, metadata, time.perf_counter())
+        return metadata
+
+    def _stop(self):
+        profile, metadata, started = self._local.active
+        profile.disable()
+        self._local.active = None
+        metadata['seconds'] = time.perf_counter() - started
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(self.profile_path(metadata['name']))
+            with open(os.path.join(self.directory, metadata['name'] + '.json'), 'w', encoding='utf-8') as file:
+                json.dump(metadata, file)
+            self._prune()
+        except OSError as e:
+            print(f"Error saving profile {metadata['name']}: {e}")
+
+    def _profile_names(self):
+        """Names of the saved profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith('.prof')), reverse=True)
+
+    def _prune(self):
+        with self._lock:
+            for name in self._profile_names()[self.keep:]:
+                for extension in ('.prof', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name + extension))
+                    except OSError:
+                        pass
+
+def _active_sessions():
+    """Number of connected browser sessions, or None outside a Streamlit server"""
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return None
+        return runtime.get_instance()._session_mgr.num_active_sessions()
+    except Exception:
+        return None
+
+# Shared by all pages of the application
+profiler = Profiler()
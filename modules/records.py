@@ -0,0 +1,214 @@
+import json
+import sys
+from enum import Enum
+
+class Status(str, Enum):
+    """Registration status of a practice"""
+    ACCEPTING = 'ACCEPTING'
+    NOT_ACCEPTING = 'NOT_ACCEPTING'
+    UNKNOWN = 'UNKNOWN'
+
+    def __str__(self):
+        return self.value
+
+    def __format__(self, format_spec):
+        return format(self.value, format_spec)
+
+    @classmethod
+    def parse(cls, value):
+        """Convert a stored status to a Status; empty values stay None"""
+        if not value:
+            return None
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+def parse_bool(value):
+    """Convert a stored boolean ('TRUE', 'false', '', True) to a bool"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes')
+    return bool(value)
+
+def parse_int(value, default=1):
+    """Convert a stored number to an int, with a default for empty cells"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def parse_json_dict(value):
+    """Parse a JSON object stored as text; anything else becomes an empty dict"""
+    if isinstance(value, dict):
+        return value
+    if not value:
+        return {}
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+def intern_text(value):
+    """Share one string object for values repeated across records, like IDs"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Record:
+    """
+    Base class for compact records with __slots__.
+
+    Records keep dict-style access (record['name'], record.get('name'))
+    so code written against the sheet rows keeps working. Values are
+    converted once, when the record is created or a field is set.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    CONVERTERS = {}
+
+    def __init__(self, **fields):
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown fields for {type(self).__name__}: {', '.join(sorted(unknown))}")
+        for name in self.FIELDS:
+            self[name] = fields.get(name)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a record from a dict, e.g. a sheet row; records are returned as is"""
+        if data is None or isinstance(data, cls):
+            return data
+        return cls(**{name: data.get(name) for name in cls.FIELDS})
+
+    def to_dict(self):
+        """Convert the record to a plain dict with JSON compatible values"""
+        result = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, Enum):
+                value = value.value
+            result[name] = value
+        return result
+
+    def __getitem__(self, name):
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        converter = self.CONVERTERS.get(name)
+        setattr(self, name, converter(value) if converter else value)
+
+    def __contains__(self, name):
+        return name in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)
+        return f'{type(self).__name__}({fields})'
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.FIELDS else None
+        return default if value is None else value
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.FIELDS]
+
+class JsonRecord(Record):
+    """
+    Base class for records stored as a JSON object in a single cell.
+
+    Keys that are not fields of the record are kept in 'extra', so nothing
+    is lost when the record is written back.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, value):
+        """Convert stored JSON (text or dict) to a record, or None when empty"""
+        if isinstance(value, cls):
+            return value
+        data = parse_json_dict(value)
+        if not data:
+            return None
+        known = {name: data[name] for name in cls.FIELDS if name in data and name != 'extra'}
+        extra = {name: value for name, value in data.items() if name not in cls.FIELDS}
+        return cls(**known, extra=extra or None)
+
+    def to_dict(self):
+        result = {
+            name: getattr(self, name) for name in self.FIELDS
+            if name != 'extra' and getattr(self, name) is not None
+        }
+        result.update(self.extra or {})
+        return result
+
+class Details(JsonRecord):
+    """Analysis details of a practice or check"""
+    __slots__ = ('waitingList', 'conditions', 'waitingTime', 'contactInfo', 'lastUpdated', 'extra')
+    FIELDS = __slots__
+
+class Settings(JsonRecord):
+    """Notification settings of a user"""
+    __slots__ = ('emailNotifications', 'notificationFrequency', 'extra')
+    FIELDS = __slots__
+
+class Practice(Record):
+    """A general practice whose website is checked"""
+    __slots__ = (
+        'practiceId', 'userId', 'name', 'websiteUrl', 'status',
+        'lastChecked', 'lastStatusChange', 'details', 'targetPath'
+    )
+    FIELDS = __slots__
+    CONVERTERS = {
+        'userId': intern_text,
+        'status': Status.parse,
+        'details': Details.parse
+    }
+
+class User(Record):
+    """A user of the application"""
+    __slots__ = ('userId', 'email', 'isActive', 'isAdmin', 'settings')
+    FIELDS = __slots__
+    CONVERTERS = {
+        'isActive': parse_bool,
+        'isAdmin': parse_bool,
+        # Users always have settings, fall back to the defaults of each setting
+        'settings': lambda value: Settings.parse(value) or Settings()
+    }
+
+class Check(Record):
+    """The stored result of a website check, or a run of unchanged checks"""
+    __slots__ = (
+        'checkId', 'practiceId', 'timestamp', 'status', 'previousStatus',
+        'details', 'notificationSent', 'firstSeen', 'lastSeen', 'count'
+    )
+    FIELDS = __slots__
+    CONVERTERS = {
+        'practiceId': intern_text,
+        'status': Status.parse,
+        'previousStatus': Status.parse,
+        'details': Details.parse,
+        'notificationSent': parse_bool,
+        'count': parse_int
+    }
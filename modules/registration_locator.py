@@ -0,0 +1,171 @@
+import heapq
+import os
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from modules.discovery import USER_AGENT, LinkParser, absolute_url
+from modules.search_index import normalize_text
+from modules.metrics import metrics
+
+# Phrases (normalized, without accents) that point to the registration information, with their weight
+REGISTRATION_PHRASES = {
+    'nieuwe patienten': 5,
+    'patientenstop': 5,
+    'inschrijfstop': 5,
+    'inschrijven': 4,
+    'inschrijving': 4,
+    'inschrijfformulier': 4,
+    'aanmelden': 3,
+    'aanmelding': 3,
+    'wachtlijst': 3,
+    'praktijk is vol': 3,
+    'nemen geen': 2,
+    'nemen wij': 2,
+    'postcodegebied': 1,
+    'praktijkinformatie': 1
+}
+# A page with at least this score holds the registration information, stop looking further
+CONFIDENT_SCORE = 10
+
+class PageParser(LinkParser):
+    """Collect the links and the visible text of an HTML page"""
+
+    def __init__(self):
+        super().__init__()
+        self.text = []
+        self._hidden = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'noscript'):
+            self._hidden += 1
+        super().handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'noscript') and self._hidden:
+            self._hidden -= 1
+        super().handle_endtag(tag)
+
+    def handle_data(self, data):
+        if not self._hidden:
+            self.text.append(data)
+        super().handle_data(data)
+
+def score_text(text):
+    """Score a text by the registration phrases it contains, each counted at most three times"""
+    text = normalize_text(text)
+    return sum(weight * min(text.count(phrase), 3) for phrase, weight in REGISTRATION_PHRASES.items())
+
+def target_url(website_url, target_path):
+    """The URL of the registration page of a practice, from its cached path"""
+    return urljoin(website_url, target_path) if target_path else website_url
+
+class RegistrationPageLocator:
+    """
+    Find the page of a practice website that tells whether it accepts new
+    patients, like /praktijkinformatie/inschrijven.
+
+    A shallow best-first crawl: the links of the home page are ranked by
+    the registration phrases in their text and path, and the most
+    promising pages of the same site are fetched until one clearly holds
+    the registration information or max_pages pages have been read. The
+    path of the best page is cached on the practice as targetPath, so a
+    recheck analyzes that page directly.
+
+    Args:
+        max_pages (int): Pages read per search, including the home page;
+            0 switches the locator off
+        max_depth (int): Links followed from the home page
+    """
+
+    def __init__(self, max_pages=None, max_depth=2, timeout=10, user_agent=USER_AGENT):
+        self.max_pages = max_pages if max_pages is not None else int(os.getenv('LOCATOR_MAX_PAGES', '5'))
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.user_agent = user_agent
+
+    @property
+    def enabled(self):
+        return self.max_pages > 0
+
+    @metrics.timed('registration_locate_seconds')
+    def locate(self, website_url):
+        """
+        Find the registration page of a practice website.
+
+        Returns:
+            str: Path (with query) of the best page relative to the site,
+                '/' when the home page is the best page, or None when no
+                page mentions registration or the site could not be read
+        """
+        if not self.enabled:
+            return None
+        import requests
+        home = absolute_url(website_url, '')
+        if not home:
+            return None
+        host = _site_host(home)
+
+        session = requests.Session()
+        session.headers['User-Agent'] = self.user_agent
+        # Best-first: a min-heap on the negative score of the link, then the order found
+        queue = [(0, 0, home, 0)]
+        queued = {home}
+        best_score, best_url = 0, None
+        fetched = 0
+        try:
+            while queue and fetched < self.max_pages:
+                _, _, url, depth = heapq.heappop(queue)
+                page = self._fetch(session, url)
+                fetched += 1
+                if page is None:
+                    if url == home:
+                        # The site itself cannot be read
+                        return None
+                    continue
+                if url == home:
+                    # The home page may redirect, e.g. to https or www
+                    host = _site_host(page['url'])
+                score = score_text(page['text'])
+                if score > best_score:
+                    best_score, best_url = score, page['url']
+                if best_score >= CONFIDENT_SCORE:
+                    break
+                if depth >= self.max_depth:
+                    continue
+                for link, text in page['links']:
+                    if link in queued or _site_host(link) != host:
+                        continue
+                    link_score = score_text(text + ' ' + urlsplit(link).path.replace('-', ' ').replace('_', ' ').replace('/', ' '))
+                    if link_score:
+                        queued.add(link)
+                        heapq.heappush(queue, (-link_score, len(queued), link, depth + 1))
+        finally:
+            session.close()
+            metrics.inc('registration_locator_pages_total', fetched)
+
+        if best_url is None:
+            return None
+        parts = urlsplit(best_url)
+        return urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+    def _fetch(self, session, url):
+        """Fetch a page and parse its text and links, or None when it cannot be read"""
+        import requests
+        try:
+            response = session.get(url, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return None
+        parser = PageParser()
+        parser.feed(response.text)
+        links = []
+        for href, text in parser.links:
+            link = absolute_url(response.url, href)
+            if link:
+                links.append((link, text))
+        return {'url': response.url, 'text': ' '.join(parser.text), 'links': links}
+
+def _site_host(url):
+    """Host of a URL without 'www.', so both spellings count as the same site"""
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
@@ -0,0 +1,256 @@
+import bisect
+import heapq
+import itertools
+import pickle
+import re
+import threading
+import unicodedata
+
+# Maximum number of practices that are scored for a single query
+CANDIDATE_LIMIT = 1000
+
+NON_ALPHANUMERIC = re.compile(r'[^a-z0-9]+')
+
+def normalize_text(text):
+    """Lowercase text, strip accents and collapse everything else to spaces"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return NON_ALPHANUMERIC.sub(' ', text.lower()).strip()
+
+def normalize_url_text(url):
+    """Strip the scheme and 'www.' from a URL before indexing it"""
+    if not url:
+        return ''
+    url = re.sub(r'^[a-z]+://', '', str(url).strip().lower())
+    if url.startswith('www.'):
+        url = url[4:]
+    return normalize_text(url)
+
+def trigrams(text):
+    """Get the set of trigrams of a normalized text, padded at word boundaries"""
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PracticeSearchIndex:
+    """
+    In-memory trigram index over practice names and website URLs.
+
+    The index is built once from the practices sheet and kept up to date
+    through the practice listener events of the DataLayer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = {}  # practiceId -> indexed fields
+        self._user_documents = {}  # userId -> set of practiceIds
+        self._postings = {}  # trigram -> set of practiceIds
+        self._names = []  # sorted (normalized name, practiceId) for autocomplete
+        self._user_names = {}  # userId -> sorted (normalized name, practiceId) of the user
+        self.generation = 0  # Incremented on every change, tells snapshots if the index changed
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __getstate__(self):
+        # Serialize under the lock, so a snapshot never sees a half-applied update
+        with self._lock:
+            return pickle.dumps(
+                (self._documents, self._user_documents, self._postings, self._names, self.generation),
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._documents, self._user_documents, self._postings, self._names, self.generation = pickle.loads(state)
+        # Not in the snapshot; taken from the sorted names, so every list stays sorted
+        for name_key, practice_id in self._names:
+            user_id = self._documents[practice_id]['userId']
+            self._user_names.setdefault(user_id, []).append((name_key, practice_id))
+
+    def get_practice(self, practice_id):
+        """Get the indexed fields (name, websiteUrl, status, userId) of a practice"""
+        with self._lock:
+            document = self._documents.get(practice_id)
+            return dict(document['practice']) if document else None
+
+    def practice_ids(self):
+        """Get the ids of all indexed practices"""
+        with self._lock:
+            return set(self._documents)
+
+    def add(self, practice):
+        """Add a practice to the index, replacing an existing entry"""
+        with self._lock:
+            self._remove(practice['practiceId'])
+            self._add(practice)
+            self.generation += 1
+
+    def add_many(self, practices):
+        """Add multiple practices to the index"""
+        with self._lock:
+            for practice in practices:
+                self._remove(practice['practiceId'])
+                self._add(practice, sort_names=False)
+            self._names.sort()
+            for user_id in {practice.get('userId') for practice in practices}:
+                self._user_names[user_id].sort()
+            self.generation += 1
+
+    def remove(self, practice_id):
+        """Remove a practice from the index"""
+        with self._lock:
+            self._remove(practice_id)
+            self.generation += 1
+
+    def search(self, query, limit=10, user_id=None):
+        """
+        Find practices whose name or URL resembles the query.
+
+        Args:
+            query (str): Free text, e.g. part of a name or domain
+            limit (int): Maximum number of results
+            user_id (str): Only return practices of this user
+
+        Returns:
+            list: Matching practices (dicts) ordered by relevance, each with a 'score'
+        """
+        text = normalize_text(query)
+        if not text:
+            return []
+        query_grams = trigrams(text)
+
+        with self._lock:
+            user_documents = self._user_documents.get(user_id, ()) if user_id else None
+            if user_documents is not None and len(user_documents) <= CANDIDATE_LIMIT:
+                # Few practices to search, score all of them
+                candidates = user_documents
+            else:
+                candidates = self._candidates(query_grams)
+
+            scored = []
+            for practice_id in candidates:
+                document = self._documents[practice_id]
+                if user_id and document['userId'] != user_id:
+                    continue
+                matches = len(query_grams & document['grams'])
+                if not matches:
+                    continue
+                # Jaccard similarity of the trigram sets, with a bonus for prefix matches
+                score = matches / (len(query_grams) + document['gramCount'] - matches)
+                if document['nameKey'].startswith(text) or document['urlKey'].startswith(text):
+                    score += 0.5
+                scored.append((score, practice_id))
+
+            best = heapq.nlargest(limit, scored)
+            return [dict(self._documents[practice_id]['practice'], score=score) for score, practice_id in best]
+
+    def autocomplete(self, prefix, limit=10, user_id=None):
+        """Get practices whose name starts with the prefix, in alphabetical order"""
+        text = normalize_text(prefix)
+        if not text:
+            return []
+
+        results = []
+        with self._lock:
+            # A user only walks their own names
+            names = self._user_names.get(user_id, []) if user_id else self._names
+            start = bisect.bisect_left(names, (text, ''))
+            for position in range(start, min(start + limit, len(names))):
+                name_key, practice_id = names[position]
+                if not name_key.startswith(text):
+                    break
+                results.append(dict(self._documents[practice_id]['practice']))
+        return results
+
+    def _candidates(self, query_grams):
+        """Collect a bounded set of candidates; the caller holds the lock"""
+        # The rarest trigrams are the most selective, so collect those first
+        postings = sorted(
+            (self._postings[gram] for gram in query_grams if gram in self._postings),
+            key=len
+        )
+        candidates = set()
+        for posting in postings:
+            room = CANDIDATE_LIMIT - len(candidates)
+            if room <= 0:
+                break
+            if len(posting) <= room:
+                candidates.update(posting)
+            elif not candidates:
+                # Every trigram is very common, take a bounded part of the rarest
+                candidates.update(itertools.islice(posting, CANDIDATE_LIMIT))
+            else:
+                break
+        return candidates
+
+    # Practice listener events of the DataLayer
+    def on_practice_created(self, practice):
+        self.add(practice)
+
+    def on_practice_updated(self, practice_id, updates):
+        if not {'name', 'websiteUrl', 'status'} & set(updates):
+            return
+        with self._lock:
+            document = self._documents.get(practice_id)
+            if document is None:
+                return
+            practice = dict(document['practice'])
+            practice.update({key: updates[key] for key in ('name', 'websiteUrl', 'status') if key in updates})
+            self._remove(practice_id)
+            self._add(practice)
+            self.generation += 1
+
+    def on_practice_deleted(self, practice_id):
+        self.remove(practice_id)
+
+    def _add(self, practice, sort_names=True):
+        """Index a practice; the caller holds the lock"""
+        practice_id = practice['practiceId']
+        name_key = normalize_text(practice.get('name'))
+        url_key = normalize_url_text(practice.get('websiteUrl'))
+        grams = trigrams(name_key) | trigrams(url_key)
+
+        self._documents[practice_id] = {
+            'practice': {
+                'practiceId': practice_id,
+                'userId': practice.get('userId'),
+                'name': practice.get('name'),
+                'websiteUrl': practice.get('websiteUrl'),
+                'status': practice.get('status')
+            },
+            'userId': practice.get('userId'),
+            'nameKey': name_key,
+            'urlKey': url_key,
+            'grams': grams,
+            'gramCount': len(grams)
+        }
+        self._user_documents.setdefault(practice.get('userId'), set()).add(practice_id)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(practice_id)
+        user_names = self._user_names.setdefault(practice.get('userId'), [])
+        if sort_names:
+            bisect.insort(self._names, (name_key, practice_id))
+            bisect.insort(user_names, (name_key, practice_id))
+        else:
+            self._names.append((name_key, practice_id))
+            user_names.append((name_key, practice_id))
+
+    def _remove(self, practice_id):
+        """Remove a practice from the index; the caller holds the lock"""
+        document = self._documents.pop(practice_id, None)
+        if document is None:
+            return
+        user_documents = self._user_documents.get(document['userId'])
+        if user_documents is not None:
+            user_documents.discard(practice_id)
+        for gram in document['grams']:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(practice_id)
+                if not posting:
+                    del self._postings[gram]
+        for names in (self._names, self._user_names.get(document['userId'], [])):
+            position = bisect.bisect_left(names, (document['nameKey'], practice_id))
+            if position < len(names) and names[position] == (document['nameKey'], practice_id):
+                del names[position]
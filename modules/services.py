@@ -0,0 +1,26 @@
+_cached_services = None
+
+def get_services():
+    """
+    Get the DataLayer, AuthService and WebsiteChecker shared by all pages.
+
+    Every page gets the same instances from one st.cache_resource entry, so
+    the caches, listeners and open check runs of the DataLayer are not kept
+    twice and a change made on one page is seen on all others.
+
+    Returns:
+        tuple: (data_layer, auth_service, website_checker)
+    """
+    global _cached_services
+    if _cached_services is None:
+        import streamlit as st
+        _cached_services = st.cache_resource(_create_services)
+    return _cached_services()
+
+
+def _create_services():
+    from modules.auth_service import AuthService
+    from modules.data_layer import DataLayer
+    from modules.website_checker import WebsiteChecker
+    data_layer = DataLayer()
+    return data_layer, AuthService(data_layer), WebsiteChecker(data_layer)
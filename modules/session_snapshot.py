@@ -0,0 +1,75 @@
+from modules.metrics import metrics
+
+class SessionSnapshot:
+    """
+    Per-session copy of the practices of the logged in user.
+
+    The snapshot is loaded on first use and then served to every page, so
+    switching pages does not hit the data layer. Only the mutating paths
+    (add, update, delete) invalidate it; check results are applied to the
+    cached practice in place.
+    """
+
+    def __init__(self, data_layer, user_id):
+        self.data_layer = data_layer
+        self.user_id = user_id
+        self._practices = None
+        self._practices_by_id = {}
+
+    def get_practices(self):
+        """Get all practices of the user, loading them once if needed"""
+        if self._practices is None:
+            metrics.inc('session_snapshot_requests_total', result='miss')
+            self._load()
+        else:
+            metrics.inc('session_snapshot_requests_total', result='hit')
+        return self._practices
+
+    def get_practice(self, practice_id):
+        """Get a single practice from the snapshot"""
+        self.get_practices()
+        return self._practices_by_id.get(practice_id)
+
+    def practice_count(self):
+        """Number of loaded practices, or None when they are not loaded yet"""
+        return None if self._practices is None else len(self._practices)
+
+    def apply_check_result(self, practice_id, result):
+        """Apply a successful check result to the cached practice in place"""
+        practice = self.get_practice(practice_id)
+        if not practice:
+            return
+        practice['status'] = result['status']
+        practice['lastChecked'] = result['timestamp']
+        if result.get('statusChanged'):
+            practice['lastStatusChange'] = result['timestamp']
+        if result.get('details') is not None:
+            practice['details'] = result['details']
+        if 'targetPath' in result:
+            practice['targetPath'] = result['targetPath']
+    
+    def invalidate(self):
+        """Drop the loaded data so the next read goes to the data layer"""
+        self._practices = None
+        self._practices_by_id = {}
+
+    def _load(self):
+        """Load the practices of the user from the data layer"""
+        self._practices = self.data_layer.get_practices_by_user(self.user_id) or []
+        self._practices_by_id = {p['practiceId']: p for p in self._practices}
+
+
+def get_session_snapshot(data_layer, user_id):
+    """Get the snapshot of the current session, creating it for a new user"""
+    import streamlit as st
+    snapshot = st.session_state.get('data_snapshot')
+    if snapshot is None or snapshot.user_id != user_id:
+        snapshot = SessionSnapshot(data_layer, user_id)
+        st.session_state.data_snapshot = snapshot
+    return snapshot
+
+
+def clear_session_snapshot():
+    """Remove the snapshot of the current session, e.g. on logout"""
+    import streamlit as st
+    st.session_state.pop('data_snapshot', None)
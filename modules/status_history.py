@@ -0,0 +1,235 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp to a naive datetime in local time, or None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        try:
+            timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+class IntervalBuilder:
+    """
+    Build run-length encoded status intervals from checks.
+
+    Checks are fed one at a time in the order they were stored, so the
+    memory used depends on the number of status changes, not on the
+    number of checks.
+    """
+
+    def __init__(self):
+        self.intervals = []
+
+    def add(self, status, timestamp, count=1, last_seen=None):
+        """Add a check, or a compacted run of checks, with its status and time"""
+        if timestamp is None:
+            return
+        last_seen = max(last_seen, timestamp) if last_seen else timestamp
+        current = self.intervals[-1] if self.intervals else None
+        if current and current['status'] == status:
+            current['end'] = max(current['end'], last_seen)
+            current['checks'] += count
+        else:
+            if current:
+                # The previous status lasted until this check
+                current['end'] = max(current['end'], timestamp)
+            self.intervals.append({
+                'status': status,
+                'start': timestamp,
+                'end': last_seen,
+                'checks': count
+            })
+
+class StatusHistoryIndex:
+    """
+    The stored check runs of every practice, for its status history.
+
+    Built once from all checks partitions and kept up to date from
+    DataLayer.create_check, so the history of a practice is read from
+    memory instead of scanning every partition for each practice. Per
+    practice only the status, time, count and lastSeen of its runs
+    (compacted rows) are kept, so the memory used depends on the number
+    of status changes and months, not on the number of checks.
+
+    Checks stored by other replicas or by hand are not seen; the index is
+    rebuilt when it is older than max_age seconds.
+
+    Args:
+        max_age (int): Seconds after which the index is rebuilt, 0 for never
+    """
+
+    def __init__(self, max_age=0):
+        self.max_age = max_age
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._runs = {}  # practiceId -> [checkId, status, timestamp, count, lastSeen]
+        self._pending = []  # Checks stored while the index is being built, None when built
+        self._loaded = threading.Event()
+
+    @property
+    def expired(self):
+        return bool(self.max_age) and time.monotonic() - self.built_at > self.max_age
+
+    def load(self, batches):
+        """
+        Add the stored checks, oldest first, and then the checks that were
+        stored through add() while they were being read. get_runs waits
+        until this is done, also when reading the checks fails.
+
+        Args:
+            batches: Iterable over batches (lists) of checks
+        """
+        try:
+            for batch in batches:
+                with self._lock:
+                    for check in batch:
+                        self._add(check)
+        finally:
+            with self._lock:
+                for check in self._pending:
+                    self._add(check)
+                self._pending = None
+            self._loaded.set()
+
+    def add(self, check):
+        """Add a stored check, or the run it was merged into"""
+        with self._lock:
+            if self._pending is not None:
+                # Added after the stored checks, so the runs stay in order
+                self._pending.append(dict(check))
+            else:
+                self._add(check)
+
+    def get_runs(self, practice_id):
+        """Get the runs of a practice as (status, timestamp, count, lastSeen), oldest first"""
+        self._loaded.wait()
+        with self._lock:
+            return [tuple(run[1:]) for run in self._runs.get(practice_id, ())]
+
+    def _add(self, check):
+        """Add a check or replace the run with the same checkId; the caller holds the lock"""
+        timestamp = parse_timestamp(check.get('timestamp'))
+        if timestamp is None:
+            return
+        run = [
+            check.get('checkId'),
+            check.get('status') or 'UNKNOWN',
+            timestamp,
+            int(check.get('count') or 1),
+            parse_timestamp(check.get('lastSeen'))
+        ]
+        runs = self._runs.setdefault(check.get('practiceId'), [])
+        # An extended run is usually the last one of the practice
+        for position in range(len(runs) - 1, max(len(runs) - 3, -1), -1):
+            if run[0] and runs[position][0] == run[0]:
+                if run[3] >= runs[position][3]:
+                    runs[position] = run
+                return
+        runs.append(run)
+
+def downsample_intervals(intervals, resolution):
+    """
+    Reduce intervals to at most one per time bucket of the given resolution.
+
+    Every bucket gets the status that covered most of it; adjacent buckets
+    with the same status are merged again. Intervals that fit within a
+    bucket are therefore dropped in favour of the dominant status.
+
+    Args:
+        intervals (list): Intervals from IntervalBuilder, ordered by time
+        resolution (timedelta): Size of the time buckets
+
+    Returns:
+        list: Downsampled intervals
+    """
+    if not intervals or not resolution or resolution <= timedelta(0):
+        return intervals
+
+    origin = intervals[0]['start']
+    last_end = intervals[-1]['end']
+    result = []
+    pending = None  # [bucket index, status -> covered time, number of checks]
+
+    def emit(status, start, end, checks):
+        if result and result[-1]['status'] == status and result[-1]['end'] >= start:
+            result[-1]['end'] = end
+            result[-1]['checks'] += checks
+        else:
+            result.append({'status': status, 'start': start, 'end': end, 'checks': checks})
+
+    def flush():
+        index, coverage, checks = pending
+        bucket_start = origin + resolution * index
+        emit(max(coverage, key=coverage.get), bucket_start, min(bucket_start + resolution, last_end), checks)
+
+    for interval in intervals:
+        status = interval['status']
+        start, end = interval['start'], max(interval['end'], interval['start'])
+        first_bucket = int((start - origin) / resolution)
+        last_bucket = int((end - origin) / resolution)
+
+        for index in (first_bucket, last_bucket) if last_bucket > first_bucket else (first_bucket,):
+            if pending and pending[0] != index:
+                flush()
+                pending = None
+            if pending is None:
+                pending = [index, {}, 0]
+
+            bucket_start = origin + resolution * index
+            covered = min(end, bucket_start + resolution) - max(start, bucket_start)
+            # Single checks cover no time but should still count
+            pending[1][status] = pending[1].get(status, timedelta(0)) + max(covered, timedelta(microseconds=1))
+            if index == first_bucket:
+                pending[2] += interval['checks']
+
+            if index == first_bucket and last_bucket - first_bucket > 1:
+                # Intervals are ordered, so nothing later falls in the first bucket
+                flush()
+                pending = None
+                # The buckets in between are completely covered by this status
+                emit(status, origin + resolution * (first_bucket + 1), origin + resolution * last_bucket, 0)
+
+    if pending:
+        flush()
+    return result
+
+def get_status_history(data_layer, practice_id, start=None, end=None, resolution=None, max_intervals=None):
+    """
+    Get the status history of a practice as run-length encoded intervals.
+
+    Args:
+        data_layer: DataLayer whose StatusHistoryIndex holds the checks
+        practice_id (str): The practice to get the history for
+        start (datetime): Ignore checks before this time
+        end (datetime): Ignore checks after this time
+        resolution (timedelta): Downsample to at most one interval per resolution
+        max_intervals (int): Choose the resolution so that the history spans
+            at most this many buckets
+
+    Returns:
+        list: Intervals with status, start, end and number of checks
+    """
+    start, end = parse_timestamp(start), parse_timestamp(end)
+    builder = IntervalBuilder()
+    for status, timestamp, count, last_seen in data_layer.get_status_history_index().get_runs(practice_id):
+        if (start and timestamp < start) or (end and timestamp > end):
+            continue
+        builder.add(status, timestamp, count, last_seen)
+
+    intervals = builder.intervals
+    if max_intervals and intervals and not resolution:
+        span = intervals[-1]['end'] - intervals[0]['start']
+        if len(intervals) > max_intervals and span > timedelta(0):
+            resolution = span / max_intervals
+    if resolution:
+        intervals = downsample_intervals(intervals, resolution)
+    return intervals
@@ -1,82 +1,97 @@
-import streamlit as st
 import os
-import requests
 import json
+import time
 from datetime import datetime
 import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from modules.openai_bridge import OpenAIBridge
+from modules.metrics import metrics
+from modules.profiler import profiler
+from modules.leases import LeaseManager
+from modules.page_snapshots import PageSnapshotStore
+from modules.registration_locator import RegistrationPageLocator, target_url
 
 class WebsiteChecker:
     def __init__(self, data_layer):
         self.data_layer = data_layer
         self.openai_bridge = OpenAIBridge()
+        self.leases = LeaseManager()
+        self.locator = RegistrationPageLocator()
+        self.snapshots = PageSnapshotStore()
+        # Seconds to wait for a check of the same URL elsewhere, 0 to skip it right away
+        self.lease_wait = float(os.getenv('LEASE_WAIT_SECONDS', '60'))
+        # 'async' submits the analyses of a check run as Apps Script jobs instead of waiting for each one,
+        # 'asyncio' runs them concurrently on an event loop (modules/async_pipeline.py)
+        self.analysis_mode = os.getenv('ANALYSIS_MODE', 'sync').lower()
+        # Registration pages looked for at the same time while the analyses of a run are submitted
+        self.locate_workers = int(os.getenv('LOCATOR_WORKERS', '8'))
+        self._analysis_jobs = None
     
+    @property
+    def analysis_jobs(self):
+        """The AnalysisJobs of the asynchronous mode, created on first use"""
+        if self._analysis_jobs is None:
+            from modules.analysis_jobs import AnalysisJobs
+            self._analysis_jobs = AnalysisJobs(self.openai_bridge)
+        return self._analysis_jobs
+    
+    @metrics.timed('website_check_seconds')
     def check_single_website(self, url, user_id, practice_id=None):
-        """Check a single website for its status regarding accepting new patients"""
+        """
+        Check a single website for its status regarding accepting new patients.
+        
+        A URL is checked by one replica or session at a time. A check of a URL
+        that is already being checked waits for that check and stores its
+        analysis, or is skipped when it does not finish within lease_wait seconds.
+        """
         try:
-            # If practice_id is provided, get the practice first
-            practice = None
-            if practice_id:
-                practice = self.data_layer.get_practice_by_id(practice_id)
-                if not practice:
+            key = lease_key(url)
+            requested = time.time()
+            lease = self.leases.acquire(key)
+            if lease is None:
+                # Someone else is checking this URL, use their analysis
+                analysis_result = self.leases.wait(key, self.lease_wait, since=requested) if self.lease_wait else None
+                metrics.inc('website_check_leases_total', result='joined' if analysis_result else 'skipped')
+                if analysis_result is None:
+                    return {
+                        'success': False,
+                        'skipped': True,
+                        'message': 'Website is already being checked'
+                    }
+                # Read the practice after the other check has updated it
+                practice = self.data_layer.get_practice_by_id(practice_id) if practice_id else None
+                if practice_id and not practice:
                     return {
                         'success': False,
                         'message': 'Practice not found'
                     }
+                return self._store_check_result(practice, practice_id, user_id, analysis_result)
             
-            # Call the OpenAI bridge to analyze the website
-            analysis_result = self.openai_bridge.analyze_website(url)
-            
-            if 'success' in analysis_result and analysis_result['success'] == False:
-                return analysis_result
-            
-            # Store check result
-            check_id = str(uuid.uuid4())
-            timestamp = datetime.now().isoformat()
-            
-            check_data = {
-                'checkId': check_id,
-                'practiceId': practice_id if practice_id else None,
-                'timestamp': timestamp,
-                'status': analysis_result['status'],
-                'previousStatus': practice['status'] if practice else None,
-                'details': json.dumps(analysis_result['details']),
-                'notificationSent': False
-            }
-            
-            # Update practice status if needed
-            if practice and practice['status'] != analysis_result['status']:
-                # Status has changed
-                practice_updates = {
-                    'status': analysis_result['status'],
-                    'lastChecked': timestamp,
-                    'lastStatusChange': timestamp,
-                    'details': json.dumps(analysis_result['details'])
-                }
-                self.data_layer.update_practice(practice_id, practice_updates)
+            metrics.inc('website_check_leases_total', result='acquired')
+            analysis_result = None
+            try:
+                # If practice_id is provided, get the practice first
+                practice = None
+                if practice_id:
+                    practice = self.data_layer.get_practice_by_id(practice_id)
+                    if not practice:
+                        return {
+                            'success': False,
+                            'message': 'Practice not found'
+                        }
                 
-                # Send notification if status changed to ACCEPTING
-                if analysis_result['status'] == 'ACCEPTING' and practice['status'] != 'ACCEPTING':
-                    user = self.data_layer.get_user_by_id(user_id)
-                    if user and user['settings'].get('emailNotifications', True):
-                        # This would call the email service in a real implementation
-                        # For now, just mark the notification as sent
-                        check_data['notificationSent'] = True
-            elif practice:
-                # No status change, just update lastChecked
-                self.data_layer.update_practice(practice_id, {
-                    'lastChecked': timestamp
-                })
-            
-            # Return result
-            return {
-                'success': True,
-                'status': analysis_result['status'],
-                'previousStatus': practice['status'] if practice else None,
-                'statusChanged': practice and practice['status'] != analysis_result['status'],
-                'details': analysis_result['details'],
-                'timestamp': timestamp
-            }
+                # Call the OpenAI bridge to analyze the registration page of the website
+                analysis_result = self._analyze(url, practice)
+                
+                if 'success' in analysis_result and analysis_result['success'] == False:
+                    return analysis_result
+                
+                return self._store_check_result(practice, practice_id, user_id, analysis_result)
+            finally:
+                # Share a successful analysis with the checks that waited for it
+                succeeded = analysis_result is not None and analysis_result.get('success') is not False
+                self.leases.release(lease, analysis_result if succeeded else None)
             
         except Exception as e:
             print(f"Error checking website {url}: {str(e)}")
@@ -85,8 +100,127 @@ class WebsiteChecker:
                 'message': f'Error checking website: {str(e)}'
             }
     
+    def _analyze(self, url, practice):
+        """
+        Analyze the page of the website that holds the registration status.
+        
+        A practice with a cached targetPath costs one analysis of that page.
+        Without one, or when that page no longer gives a status, the
+        registration page is looked up first and its path is added to the
+        result as targetPath, to be stored with the practice.
+        """
+        cached_path = practice.get('targetPath') if practice else None
+        if cached_path:
+            analysis_result = self.openai_bridge.analyze_website(target_url(url, cached_path))
+            if _has_status(analysis_result):
+                analysis_result['targetPath'] = cached_path
+                return analysis_result
+            metrics.inc('registration_target_paths_total', result='stale')
+        
+        if not self.can_locate():
+            return analysis_result if cached_path else self.openai_bridge.analyze_website(url)
+        
+        path = self.locator.locate(url)
+        if cached_path and (path or '/') == cached_path:
+            # Still the best page, its analysis was done above
+            analysis_result['targetPath'] = cached_path
+            return analysis_result
+        return _with_located_path(self.openai_bridge.analyze_website(target_url(url, path)), path)
+    
+    def can_locate(self):
+        """The mock analysis does not read pages, so only look for them with a real bridge"""
+        return self.locator.enabled and bool(self.openai_bridge.apps_script_url) and not self.openai_bridge.is_replaying()
+    
+    def _store_check_result(self, practice, practice_id, user_id, analysis_result):
+        """Store the analysis of a website as a check and update the practice"""
+        # Store check result
+        check_id = str(uuid.uuid4())
+        timestamp = datetime.now().isoformat()
+        
+        # Keep the analyzed page text locally, not in the sheet or in analyses shared with waiting checks
+        page_text = analysis_result.pop('pageText', None)
+        if practice and page_text:
+            snapshot = self.snapshots.add(practice_id, timestamp, page_text)
+            metrics.inc('page_snapshots_total', kind=snapshot['kind'])
+            metrics.inc('page_snapshot_bytes_total', snapshot['bytes'])
+        
+        check_data = {
+            'checkId': check_id,
+            'practiceId': practice_id if practice_id else None,
+            'timestamp': timestamp,
+            'status': analysis_result['status'],
+            'previousStatus': practice['status'] if practice else None,
+            'details': json.dumps(analysis_result['details']),
+            'notificationSent': False
+        }
+        
+        # Update practice status if needed
+        if practice and practice['status'] != analysis_result['status']:
+            # Status has changed
+            practice_updates = {
+                'status': analysis_result['status'],
+                'lastChecked': timestamp,
+                'lastStatusChange': timestamp,
+                'details': json.dumps(analysis_result['details'])
+            }
+            if 'targetPath' in analysis_result:
+                practice_updates['targetPath'] = analysis_result['targetPath']
+            self.data_layer.update_practice(practice_id, practice_updates)
+            
+            # Send notification if status changed to ACCEPTING
+            if analysis_result['status'] == 'ACCEPTING' and practice['status'] != 'ACCEPTING':
+                user = self.data_layer.get_user_by_id(user_id)
+                if user and user['settings'].get('emailNotifications', True):
+                    # This would call the email service in a real implementation
+                    # For now, just mark the notification as sent
+                    check_data['notificationSent'] = True
+                    metrics.inc('notifications_total')
+        elif practice:
+            # No status change, just update lastChecked (and the registration page when it moved)
+            practice_updates = {'lastChecked': timestamp}
+            if analysis_result.get('targetPath', practice.get('targetPath') or '') != (practice.get('targetPath') or ''):
+                practice_updates['targetPath'] = analysis_result['targetPath']
+            self.data_layer.update_practice(practice_id, practice_updates)
+        
+        # Store the check, status changes feed the change log
+        if practice:
+            self.data_layer.create_check(check_data)
+        
+        # Return result
+        return {
+            'success': True,
+            'status': analysis_result['status'],
+            'previousStatus': practice['status'] if practice else None,
+            'statusChanged': practice and practice['status'] != analysis_result['status'],
+            'details': analysis_result['details'],
+            'targetPath': analysis_result.get('targetPath', practice.get('targetPath') if practice else None),
+            'timestamp': timestamp
+        }
+    
+    @metrics.timed('website_check_run_seconds')
     def check_all_user_websites(self, user_id):
         """Check all websites for a user"""
+        # Records the number of API calls per run, and profiles the run when profiling is on
+        with profiler.profile('check_run', user_id) as profile, \
+                metrics.run('website_check_run', ['apps_script_requests_total', 'sheets_api_requests_total']):
+            result = self._check_all_user_websites(user_id)
+            if profile is not None:
+                profile['practices'] = result.get('totalChecked')
+            return result
+    
+    def _check_all_user_websites(self, user_id):
+        if self.analysis_mode == 'async':
+            return self._check_all_user_websites_async(user_id)
+        if self.analysis_mode == 'asyncio':
+            from modules.async_pipeline import AsyncCheckPipeline
+            try:
+                return AsyncCheckPipeline(self).run(user_id)
+            except Exception as e:
+                print(f"Error checking all websites for user {user_id}: {str(e)}")
+                return {
+                    'success': False,
+                    'message': f'Error checking websites: {str(e)}'
+                }
         try:
             # Get all practices for the user
             practices = self.data_layer.get_practices_by_user(user_id)
@@ -134,4 +268,140 @@ class WebsiteChecker:
             return {
                 'success': False,
                 'message': f'Error checking websites: {str(e)}'
-            }
\ No newline at end of file
+            }
+    
+    def _check_all_user_websites_async(self, user_id):
+        """
+        Check all websites of a user with the analyses running as Apps Script jobs.
+        
+        All analyses are submitted first and stored as their results come in,
+        without a thread per analysis. The script analyzes the queued jobs
+        ANALYSIS_BATCH_SIZE (20) at a time, so the run takes about one
+        analysis per batch instead of the sum of all of them. The registration
+        pages are looked for and the analyses submitted by a small pool of
+        locate_workers threads. Websites that are being checked elsewhere are
+        checked one by one afterwards, like a single check.
+        """
+        try:
+            practices = self.data_layer.get_practices_by_user(user_id)
+            if not practices:
+                return {
+                    'success': True,
+                    'message': 'No practices found for user',
+                    'totalChecked': 0,
+                    'statusChanges': 0
+                }
+            
+            submitting = {}  # future of _submit_analysis -> (practice, lease)
+            pending = {}  # future -> (practice, lease, located path)
+            results = []
+            deferred = []
+            try:
+                with ThreadPoolExecutor(max_workers=self.locate_workers, thread_name_prefix='locate') as pool:
+                    for practice in practices:
+                        lease = self.leases.acquire(lease_key(practice['websiteUrl']))
+                        if lease is None:
+                            deferred.append(practice)
+                            continue
+                        metrics.inc('website_check_leases_total', result='acquired')
+                        # In a copy of the context, so the requests count in the metrics of the run
+                        submitting[pool.submit(contextvars.copy_context().run, self._submit_analysis, practice)] = (practice, lease)
+                    
+                    for submitted in as_completed(list(submitting)):
+                        path, future = submitted.result()
+                        practice, lease = submitting.pop(submitted)
+                        pending[future] = (practice, lease, path)
+                
+                for future in as_completed(pending):
+                    practice, lease, path = pending.pop(future)
+                    results.append((practice, self.finish_async_check(practice, lease, path, future.result(), user_id)))
+            finally:
+                # Release the leases of analyses that were not stored after an error
+                for practice, lease in list(submitting.values()) + [(practice, lease) for practice, lease, _ in pending.values()]:
+                    self.leases.release(lease)
+            
+            for practice in deferred:
+                results.append((practice, self.check_single_website(practice['websiteUrl'], user_id, practice['practiceId'])))
+            
+            return run_summary(results)
+            
+        except Exception as e:
+            print(f"Error checking all websites for user {user_id}: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Error checking websites: {str(e)}'
+            }
+    
+    def _submit_analysis(self, practice):
+        """Look for the registration page of a practice if needed and submit its analysis, in a worker thread"""
+        url = practice['websiteUrl']
+        cached_path = practice.get('targetPath')
+        path = self.locator.locate(url) if not cached_path and self.can_locate() else None
+        return path, self.analysis_jobs.submit(target_url(url, cached_path or path))
+    
+    def finish_async_check(self, practice, lease, path, analysis_result, user_id):
+        """Store the result of a submitted analysis, like check_single_website does, and release its lease"""
+        url = practice['websiteUrl']
+        succeeded = False
+        try:
+            cached_path = practice.get('targetPath')
+            if cached_path:
+                if _has_status(analysis_result):
+                    analysis_result['targetPath'] = cached_path
+                else:
+                    metrics.inc('registration_target_paths_total', result='stale')
+                    # The registration page moved, look for it again right away, like _analyze
+                    path = self.locator.locate(url) if self.can_locate() else cached_path
+                    if (path or '/') == cached_path:
+                        analysis_result['targetPath'] = cached_path
+                    else:
+                        analysis_result = _with_located_path(self.openai_bridge.analyze_website(target_url(url, path)), path)
+            elif self.can_locate():
+                analysis_result = _with_located_path(analysis_result, path)
+            
+            if analysis_result.get('success') is False:
+                return analysis_result
+            succeeded = True
+            return self._store_check_result(practice, practice['practiceId'], user_id, analysis_result)
+        except Exception as e:
+            print(f"Error checking website {url}: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Error checking website: {str(e)}'
+            }
+        finally:
+            self.leases.release(lease, analysis_result if succeeded else None)
+
+def run_summary(results):
+    """Summary of a check run from (practice, check result) pairs, like check_all_user_websites returns"""
+    status_changes = sum(1 for practice, result in results if result.get('success') and result.get('statusChanged'))
+    errors = [
+        {
+            'practiceId': practice['practiceId'],
+            'name': practice['name'],
+            'error': result.get('message', 'Unknown error')
+        }
+        for practice, result in results if not result.get('success')
+    ]
+    return {
+        'success': True,
+        'message': f'Checked {len(results)} practices, {status_changes} status changes',
+        'totalChecked': len(results),
+        'statusChanges': status_changes,
+        'errors': errors
+    }
+
+def _with_located_path(analysis_result, path):
+    """Keep the located path only when its page gave a status, otherwise look again next time"""
+    found = _has_status(analysis_result)
+    analysis_result['targetPath'] = (path or '/') if found else ''
+    metrics.inc('registration_target_paths_total', result='found' if found else 'missing')
+    return analysis_result
+
+def _has_status(analysis_result):
+    """Whether an analysis succeeded with a known status"""
+    return analysis_result.get('success') is not False and analysis_result.get('status') not in (None, 'UNKNOWN')
+
+def lease_key(url):
+    """Lease key of a URL, the same for trivially different spellings"""
+    return 'url:' + url.strip().lower().rstrip('/')
@@ -1,22 +1,27 @@
 import streamlit as st
+import time
 import pandas as pd
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 
 # Import modules
-from modules.auth_service import AuthService
-from modules.data_layer import DataLayer
-from modules.website_checker import WebsiteChecker
+from modules.services import get_services
+from modules.session_snapshot import get_session_snapshot
+from modules.metrics import metrics
+from modules.profiler import profiler
+from modules.postcode_index import parse_postcode
+from modules.practice_counters import count_practices
 
-# Initialize services
-@st.cache_resource
-def initialize_services():
-    data_layer = DataLayer()
-    auth_service = AuthService(data_layer)
-    website_checker = WebsiteChecker(data_layer)
-    return data_layer, auth_service, website_checker
+render_started = time.perf_counter()
+profiler.start_rerun('dashboard')
 
-data_layer, auth_service, website_checker = initialize_services()
+# Initialize services, shared by all pages
+data_layer, auth_service, website_checker = get_services()
+
+# Status history is read from the full check history, so cache it for a while
+@st.cache_data(ttl=300, show_spinner=False)
+def load_status_history(_data_layer, practice_id, days):
+    start = datetime.now() - timedelta(days=days) if days else None
+    return _data_layer.get_status_history(practice_id, start=start, max_intervals=120)
 
 # Page config
 st.set_page_config(
@@ -29,6 +34,7 @@ st.set_page_config(
 if 'user' not in st.session_state or not st.session_state.user:
     st.warning("Je bent niet ingelogd. Ga terug naar de hoofdpagina om in te loggen.")
     st.page_link("/", label="Terug naar inloggen", icon="🏠")
+    profiler.stop_rerun()
     st.stop()
 
 # Page title
@@ -36,18 +42,18 @@ st.title("Dashboard")
 
 # Get user data
 user = st.session_state.user
-practices = data_layer.get_practices_by_user(user['userId'])
+snapshot = get_session_snapshot(data_layer, user['userId'])
+practices = snapshot.get_practices()
 
 # Top metrics
 col1, col2, col3 = st.columns(3)
+counts = data_layer.get_practice_counters().get(user['userId']) or count_practices(practices)
 with col1:
-    st.metric("Totaal huisartsen", len(practices))
+    st.metric("Totaal huisartsen", counts['total'])
 with col2:
-    accepting_count = sum(1 for p in practices if p.get('status') == 'ACCEPTING')
-    st.metric("Open voor inschrijving", accepting_count)
+    st.metric("Open voor inschrijving", counts['ACCEPTING'])
 with col3:
-    not_accepting_count = sum(1 for p in practices if p.get('status') == 'NOT_ACCEPTING')
-    st.metric("Gesloten voor inschrijving", not_accepting_count)
+    st.metric("Gesloten voor inschrijving", counts['NOT_ACCEPTING'])
 
 # Actions
 st.subheader("Acties")
@@ -59,7 +65,9 @@ with col1:
             if result['success']:
                 st.success(f"Controle voltooid: {result['totalChecked']} praktijken gecontroleerd, {result['statusChanges']} statuswijzigingen")
                 # Refresh practices data
-                practices = data_layer.get_practices_by_user(user['userId'])
+                snapshot.invalidate()
+                practices = snapshot.get_practices()
+                load_status_history.clear()
             else:
                 st.error(f"Fout bij controleren van praktijken: {result['message']}")
 with col2:
@@ -70,17 +78,18 @@ st.subheader("Huisartsenpraktijken")
 if not practices:
     st.info("Je hebt nog geen huisartsenpraktijken toegevoegd.")
 else:
+    # Narrow the table down with the search index
+    search_query = st.text_input("Zoeken", placeholder="Zoek op naam of website", key="dashboard_search")
+    if search_query:
+        results = data_layer.get_search_index().search(search_query, limit=50, user_id=user['userId'])
+        matching_ids = {r['practiceId'] for r in results}
+        table_practices = [p for p in practices if p.get('practiceId') in matching_ids]
+    else:
+        table_practices = practices
+    
     # Create dataframe for table display
     practice_data = []
-    for p in practices:
-        # Parse JSON string if needed
-        details = p.get('details')
-        if isinstance(details, str):
-            try:
-                details = json.loads(details)
-            except:
-                details = {}
-        
+    for p in table_practices:
         # Format status for display
         status_display = "Open voor inschrijving" if p.get('status') == 'ACCEPTING' else \
                          "Gesloten voor inschrijving" if p.get('status') == 'NOT_ACCEPTING' else \
@@ -120,7 +129,7 @@ else:
         if st.session_state.practice_table.get('edited_rows'):
             selected_row = list(st.session_state.practice_table['edited_rows'].keys())[0]
             practice_id = practice_data[selected_row]['ID']
-            practice = data_layer.get_practice_by_id(practice_id)
+            practice = snapshot.get_practice(practice_id)
             
             with st.spinner(f"Controleren van {practice['name']}..."):
                 result = website_checker.check_single_website(
@@ -128,6 +137,9 @@ else:
                     user['userId'],
                     practice_id
                 )
+                if result['success']:
+                    snapshot.apply_check_result(practice_id, result)
+                    load_status_history.clear()
                 
                 if result['success']:
                     status_text = "open voor inschrijving" if result['status'] == 'ACCEPTING' else \
@@ -147,23 +159,108 @@ else:
         else:
             st.warning("Selecteer eerst een praktijk in de tabel.")
 
+# Status history of a single practice
+if practices:
+    st.subheader("Statusgeschiedenis")
+    col1, col2 = st.columns(2)
+    with col1:
+        practice_names = {p['practiceId']: p.get('name', '') for p in practices}
+        history_practice_id = st.selectbox(
+            "Praktijk",
+            options=list(practice_names),
+            format_func=lambda practice_id: practice_names[practice_id],
+            key="history_practice"
+        )
+    with col2:
+        history_days = st.selectbox(
+            "Periode",
+            options=[30, 90, 365, 0],
+            format_func=lambda days: f"Laatste {days} dagen" if days else "Alles",
+            key="history_days"
+        )
+    
+    intervals = load_status_history(data_layer, history_practice_id, history_days)
+    if not intervals:
+        st.info("Nog geen controles voor deze praktijk.")
+    else:
+        status_labels = {
+            'ACCEPTING': "Open voor inschrijving",
+            'NOT_ACCEPTING': "Gesloten voor inschrijving",
+            'UNKNOWN': "Onbekend"
+        }
+        # Only needed for this chart, so the dashboard does not load it up front
+        import altair as alt
+        history_df = pd.DataFrame([{
+            'Status': status_labels.get(i['status'], "Onbekend"),
+            'Van': i['start'],
+            # Give single checks a minimal width so they stay visible
+            'Tot': max(i['end'], i['start'] + timedelta(hours=1)),
+            'Controles': i['checks']
+        } for i in intervals])
+        
+        chart = alt.Chart(history_df).mark_bar().encode(
+            x=alt.X('Van:T', title=None),
+            x2='Tot:T',
+            color=alt.Color(
+                'Status:N',
+                scale=alt.Scale(
+                    domain=list(status_labels.values()),
+                    range=['#2e7d32', '#c62828', '#9e9e9e']
+                ),
+                legend=alt.Legend(orient='bottom', title=None)
+            ),
+            tooltip=['Status', 'Van', 'Tot', 'Controles']
+        ).properties(height=90)
+        st.altair_chart(chart, use_container_width=True)
+
+# Practices that accept patients in a postcode
+st.subheader("Open praktijken in jouw postcode")
+postcode = st.text_input("Postcode", placeholder="Bijvoorbeeld 1012 AB", key="postcode_search")
+if postcode:
+    if parse_postcode(postcode) is None:
+        st.warning("Vul een geldige postcode in, bijvoorbeeld 1012 AB.")
+    else:
+        include_unrestricted = st.checkbox("Ook praktijken zonder postcodevoorwaarde tonen", key="postcode_unrestricted")
+        eligible = data_layer.get_postcode_index().eligible(
+            postcode, include_unrestricted=include_unrestricted, user_id=user['userId']
+        )
+        if eligible:
+            st.dataframe(
+                [{
+                    'Naam': p['name'],
+                    'Website': p['websiteUrl'],
+                    'Postcodes': ', '.join(f"{low}-{high}" if low != high else str(low) for low, high in p['ranges']) or 'Geen voorwaarde'
+                } for p in eligible],
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info(f"Geen open huisartsenpraktijken gevonden voor postcode {postcode}.")
+
+# Search across all practices (only for admins)
+if user.get('isAdmin', False):
+    st.subheader("Alle praktijken doorzoeken (Admin)")
+    admin_query = st.text_input("Zoeken in alle praktijken", placeholder="Zoek op naam of website", key="admin_search")
+    if admin_query:
+        results = data_layer.get_search_index().search(admin_query, limit=25)
+        if results:
+            st.dataframe(
+                [{
+                    'Naam': r['name'],
+                    'Website': r['websiteUrl'],
+                    'Status': r['status'],
+                    'Gebruiker': r['userId']
+                } for r in results],
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info(f"Geen huisartsenpraktijken gevonden voor '{admin_query}'.")
+
 # Recent status changes
 st.subheader("Recente statuswijzigingen")
-# Mock data for demonstration
-status_changes = [
-    {
-        'practice': 'Huisartsenpraktijk Centrum',
-        'timestamp': '2025-03-15T12:00:00Z',
-        'oldStatus': 'NOT_ACCEPTING',
-        'newStatus': 'ACCEPTING'
-    },
-    {
-        'practice': 'Huisartspraktijk Noord',
-        'timestamp': '2025-03-12T09:30:00Z',
-        'oldStatus': 'UNKNOWN',
-        'newStatus': 'NOT_ACCEPTING'
-    }
-]
+# Only the checks stored since the last rerun are read
+status_changes = data_layer.get_change_feed().get_changes(user['userId'], limit=10)
 
 if not status_changes:
     st.info("Geen recente statuswijzigingen.")
@@ -189,4 +286,7 @@ else:
               "🔴" if change['newStatus'] == 'NOT_ACCEPTING' else \
               "⚪"
         
-        st.write(f"{icon} **{change['practice']}** is veranderd van {old_status} naar {new_status} op {formatted_date}")
\ No newline at end of file
+        st.write(f"{icon} **{change['practice']}** is veranderd van {old_status} naar {new_status} op {formatted_date}")
+
+metrics.observe('page_render_seconds', time.perf_counter() - render_started, page='dashboard')
+profiler.stop_rerun()
@@ -1,23 +1,22 @@
 import streamlit as st
-import pandas as pd
+import time
 from datetime import datetime
 import uuid
 import json
 
 # Import modules
-from modules.auth_service import AuthService
-from modules.data_layer import DataLayer
-from modules.website_checker import WebsiteChecker
+from modules.services import get_services
+from modules.session_snapshot import get_session_snapshot
+from modules.practice_import import PracticeImporter
+from modules.discovery import DiscoveryCrawler
+from modules.metrics import metrics
+from modules.profiler import profiler
 
-# Initialize services
-@st.cache_resource
-def initialize_services():
-    data_layer = DataLayer()
-    auth_service = AuthService(data_layer)
-    website_checker = WebsiteChecker(data_layer)
-    return data_layer, auth_service, website_checker
+render_started = time.perf_counter()
+profiler.start_rerun('practices')
 
-data_layer, auth_service, website_checker = initialize_services()
+# Initialize services, shared by all pages
+data_layer, auth_service, website_checker = get_services()
 
 # Page config
 st.set_page_config(
@@ -30,6 +29,7 @@ st.set_page_config(
 if 'user' not in st.session_state or not st.session_state.user:
     st.warning("Je bent niet ingelogd. Ga terug naar de hoofdpagina om in te loggen.")
     st.page_link("/", label="Terug naar inloggen", icon="🏠")
+    profiler.stop_rerun()
     st.stop()
 
 # Page title
@@ -37,7 +37,8 @@ st.title("Huisartsenpraktijken")
 
 # Get user data
 user = st.session_state.user
-practices = data_layer.get_practices_by_user(user['userId'])
+snapshot = get_session_snapshot(data_layer, user['userId'])
+practices = snapshot.get_practices()
 
 # Function to add a new practice
 def add_practice():
@@ -54,6 +55,7 @@ def add_practice():
     
     result = data_layer.create_practice(practice)
     if result:
+        snapshot.invalidate()
         st.session_state.show_add_form = False
         st.session_state.practice_name = ""
         st.session_state.practice_url = ""
@@ -69,6 +71,7 @@ def update_practice():
     
     result = data_layer.update_practice(st.session_state.edit_practice_id, updates)
     if result:
+        snapshot.invalidate()
         st.session_state.show_edit_form = False
         st.session_state.edit_practice_id = None
         st.session_state.edit_practice_name = ""
@@ -86,6 +89,9 @@ if 'show_edit_form' not in st.session_state:
 if 'edit_practice_id' not in st.session_state:
     st.session_state.edit_practice_id = None
 
+if 'check_results' not in st.session_state:
+    st.session_state.check_results = {}
+
 # Control buttons
 col1, col2 = st.columns([1, 3])
 with col1:
@@ -94,6 +100,75 @@ with col1:
             st.session_state.show_add_form = True
             st.session_state.show_edit_form = False
 
+# Bulk import of practices
+with st.expander("Praktijken importeren uit CSV/Excel"):
+    st.caption("Het bestand moet een kolom 'website' (of 'url') bevatten en optioneel een kolom 'naam'.")
+    import_file = st.file_uploader("Bestand", type=['csv', 'xlsx'], key="import_file")
+    if import_file and st.button("Importeren", key="import_button"):
+        progress = st.empty()
+        
+        def show_import_progress(processed, imported, rejected):
+            progress.write(f"{processed} rijen verwerkt, {imported} geïmporteerd, {rejected} afgewezen...")
+        
+        importer = PracticeImporter(data_layer)
+        st.session_state.import_result = importer.import_file(
+            import_file,
+            user['userId'],
+            filename=import_file.name,
+            existing_practices=practices,
+            progress_callback=show_import_progress
+        )
+        snapshot.invalidate()
+        st.rerun()
+    
+    # Show the result of the last import
+    import_result = st.session_state.get('import_result')
+    if import_result:
+        if import_result['success']:
+            st.success(f"{import_result['imported']} van {import_result['totalRows']} praktijken geïmporteerd.")
+        else:
+            st.error(f"Fout bij importeren: {import_result['message']}")
+        if import_result['rejected']:
+            st.warning(f"{len(import_result['rejected'])} rijen afgewezen (ongeldige of dubbele URL).")
+            st.dataframe(import_result['rejected'], hide_index=True, use_container_width=True)
+
+# Discovery of practices on directory pages
+with st.expander("Praktijken ontdekken via een huisartsengids"):
+    st.caption("Geef een of meer pagina's met een overzicht van huisartsenpraktijken, één URL per regel. De links naar praktijkwebsites op die pagina's (en de pagina's die ze binnen dezelfde site linken) worden als praktijk toegevoegd.")
+    seed_text = st.text_area("Startpagina's", placeholder="https://www.gemeente.nl/huisartsen", key="discovery_seeds")
+    seeds = [line.strip() for line in seed_text.splitlines() if line.strip()]
+    if seeds and st.button("Ontdekken", key="discovery_button"):
+        progress = st.empty()
+
+        def show_discovery_progress(pages, found):
+            progress.write(f"{pages} pagina's bekeken, {found} praktijken gevonden...")
+
+        crawler = DiscoveryCrawler(data_layer)
+        st.session_state.discovery_result = crawler.discover(
+            seeds,
+            user['userId'],
+            existing_practices=practices,
+            progress_callback=show_discovery_progress
+        )
+        snapshot.invalidate()
+        st.rerun()
+
+    # Show the result of the last discovery
+    discovery_result = st.session_state.get('discovery_result')
+    if discovery_result:
+        if discovery_result['success']:
+            st.success(
+                f"{discovery_result['imported']} van {len(discovery_result['candidates'])} gevonden praktijken toegevoegd "
+                f"({discovery_result['pagesFetched']} pagina's, {discovery_result['pagesPerSecond']:.1f} per seconde)."
+            )
+        else:
+            st.error("Geen enkele pagina kon worden opgehaald.")
+        if discovery_result['skipped']:
+            st.info(f"{len(discovery_result['skipped'])} gevonden praktijken stonden al in je lijst.")
+        if discovery_result['errors']:
+            st.warning(f"{len(discovery_result['errors'])} pagina's konden niet worden opgehaald.")
+            st.dataframe(discovery_result['errors'], hide_index=True, use_container_width=True)
+
 # Add practice form
 if st.session_state.show_add_form:
     st.subheader("Nieuwe huisartsenpraktijk toevoegen")
@@ -116,7 +191,7 @@ if st.session_state.show_add_form:
 
 # Edit practice form
 if st.session_state.show_edit_form and st.session_state.edit_practice_id:
-    practice = data_layer.get_practice_by_id(st.session_state.edit_practice_id)
+    practice = snapshot.get_practice(st.session_state.edit_practice_id)
     if practice:
         st.subheader(f"Bewerk {practice['name']}")
         with st.form("edit_practice_form"):
@@ -137,96 +212,116 @@ if st.session_state.show_edit_form and st.session_state.edit_practice_id:
                 else:
                     update_practice()
 
+# Practice row, rendered as a fragment so a check only reruns this row
+@st.fragment
+def practice_row(practice_id):
+    p = snapshot.get_practice(practice_id)
+    if not p:
+        return
+    
+    col1, col2, col3, col4 = st.columns([0.1, 1.7, 2, 0.7])
+    
+    # Handle the actions first, so the rest of the row shows the checked status
+    with col4:
+        check_button_key = f"check_{practice_id}"
+        edit_button_key = f"edit_{practice_id}"
+        delete_button_key = f"delete_{practice_id}"
+        
+        btn_col1, btn_col2, btn_col3 = st.columns(3)
+        with btn_col1:
+            if st.button("✓", key=check_button_key, help="Controleer deze praktijk"):
+                with st.spinner(f"Controleren van {p.get('name', '')}..."):
+                    result = website_checker.check_single_website(
+                        p['websiteUrl'],
+                        user['userId'],
+                        practice_id
+                    )
+                
+                # Update only this practice in the snapshot instead of reloading all
+                if result['success']:
+                    snapshot.apply_check_result(practice_id, result)
+                st.session_state.check_results[practice_id] = result
+        with btn_col2:
+            if st.button("🖊️", key=edit_button_key, help="Bewerk deze praktijk"):
+                st.session_state.show_edit_form = True
+                st.session_state.edit_practice_id = practice_id
+                st.session_state.show_add_form = False
+                st.rerun()
+        with btn_col3:
+            if st.button("🗑️", key=delete_button_key, help="Verwijder deze praktijk"):
+                if data_layer.delete_practice(practice_id):
+                    snapshot.invalidate()
+                    st.session_state.check_results.pop(practice_id, None)
+                    st.success(f"{p.get('name', '')} verwijderd.")
+                    st.rerun()
+                else:
+                    st.error(f"Fout bij verwijderen van {p.get('name', '')}.")
+    
+    # Format status for display
+    status_icon = "🟢" if p.get('status') == 'ACCEPTING' else \
+                  "🔴" if p.get('status') == 'NOT_ACCEPTING' else \
+                  "⚪"
+    status_display = "Open voor inschrijving" if p.get('status') == 'ACCEPTING' else \
+                     "Gesloten voor inschrijving" if p.get('status') == 'NOT_ACCEPTING' else \
+                     "Onbekend"
+    
+    # Format last checked date
+    last_checked = p.get('lastChecked', '')
+    if last_checked:
+        try:
+            dt = datetime.fromisoformat(last_checked.replace('Z', '+00:00'))
+            last_checked = dt.strftime("%d-%m-%Y %H:%M")
+        except:
+            pass
+    
+    with col1:
+        st.write(status_icon)
+    with col2:
+        st.write(f"**{p.get('name', '')}**")
+    with col3:
+        st.write(p.get('websiteUrl', ''))
+    
+    last_checked = last_checked if last_checked else "Nog niet gecontroleerd"
+    st.caption(f"{status_display} | Laatst gecontroleerd: {last_checked}")
+    
+    # Show the result of the last check of this practice
+    result = st.session_state.check_results.get(practice_id)
+    if result:
+        if result['success']:
+            status_text = "open voor inschrijving" if result['status'] == 'ACCEPTING' else \
+                         "gesloten voor inschrijving" if result['status'] == 'NOT_ACCEPTING' else \
+                         "onbekende status"
+            
+            if result.get('statusChanged'):
+                st.success(f"Status is gewijzigd! {p.get('name', '')} is nu {status_text}.")
+            else:
+                st.info(f"Status ongewijzigd. {p.get('name', '')} is {status_text}.")
+        else:
+            st.error(f"Fout bij controleren van praktijk: {result.get('message', 'Onbekende fout')}")
+    st.divider()
+
 # Practice list
 st.subheader("Huisartsenpraktijken")
 if not practices:
     st.info("Je hebt nog geen huisartsenpraktijken toegevoegd.")
 else:
-    # Create dataframe for table display
-    practice_data = []
-    for p in practices:
-        # Format status for display
-        status_icon = "🟢" if p.get('status') == 'ACCEPTING' else \
-                      "🔴" if p.get('status') == 'NOT_ACCEPTING' else \
-                      "⚪"
-        status_display = "Open voor inschrijving" if p.get('status') == 'ACCEPTING' else \
-                         "Gesloten voor inschrijving" if p.get('status') == 'NOT_ACCEPTING' else \
-                         "Onbekend"
+    search_query = st.text_input("Zoeken", placeholder="Zoek op naam of website", key="practice_search")
+    if search_query:
+        search_index = data_layer.get_search_index()
+        suggestions = search_index.autocomplete(search_query, limit=5, user_id=user['userId'])
+        if suggestions:
+            st.caption("Suggesties: " + ", ".join(s['name'] for s in suggestions))
         
-        # Format last checked date
-        last_checked = p.get('lastChecked', '')
-        if last_checked:
-            try:
-                dt = datetime.fromisoformat(last_checked.replace('Z', '+00:00'))
-                last_checked = dt.strftime("%d-%m-%Y %H:%M")
-            except:
-                pass
-        
-        practice_data.append({
-            'Status': status_icon,
-            'Naam': p.get('name', ''),
-            'Website': p.get('websiteUrl', ''),
-            'Status Tekst': status_display,
-            'Laatst gecontroleerd': last_checked,
-            'ID': p.get('practiceId')  # Hidden column for reference
-        })
-    
-    # Create table
-    practice_df = pd.DataFrame(practice_data)
+        # Show the matching practices in order of relevance
+        results = search_index.search(search_query, limit=50, user_id=user['userId'])
+        practice_ids = [r['practiceId'] for r in results if snapshot.get_practice(r['practiceId'])]
+        if not practice_ids:
+            st.info(f"Geen huisartsenpraktijken gevonden voor '{search_query}'.")
+    else:
+        practice_ids = [p.get('practiceId') for p in practices]
     
-    # Display table
-    for i, row in practice_df.iterrows():
-        col1, col2, col3, col4 = st.columns([0.1, 1.7, 2, 0.7])
-        with col1:
-            st.write(row['Status'])
-        with col2:
-            st.write(f"**{row['Naam']}**")
-        with col3:
-            st.write(row['Website'])
-        with col4:
-            check_button_key = f"check_{row['ID']}"
-            edit_button_key = f"edit_{row['ID']}"
-            delete_button_key = f"delete_{row['ID']}"
-            
-            btn_col1, btn_col2, btn_col3 = st.columns(3)
-            with btn_col1:
-                if st.button("✓", key=check_button_key, help="Controleer deze praktijk"):
-                    with st.spinner(f"Controleren van {row['Naam']}..."):
-                        result = website_checker.check_single_website(
-                            row['Website'],
-                            user['userId'],
-                            row['ID']
-                        )
-                        
-                        if result['success']:
-                            status_text = "open voor inschrijving" if result['status'] == 'ACCEPTING' else \
-                                         "gesloten voor inschrijving" if result['status'] == 'NOT_ACCEPTING' else \
-                                         "onbekende status"
-                            
-                            if result.get('statusChanged'):
-                                st.success(f"Status is gewijzigd! {row['Naam']} is nu {status_text}.")
-                            else:
-                                st.info(f"Status ongewijzigd. {row['Naam']} is {status_text}.")
-                        else:
-                            st.error(f"Fout bij controleren van praktijk: {result.get('message', 'Onbekende fout')}")
-                        
-                        # Refresh practices
-                        st.rerun()
-            with btn_col2:
-                if st.button("🖊️", key=edit_button_key, help="Bewerk deze praktijk"):
-                    st.session_state.show_edit_form = True
-                    st.session_state.edit_practice_id = row['ID']
-                    st.session_state.show_add_form = False
-                    st.rerun()
-            with btn_col3:
-                if st.button("🗑️", key=delete_button_key, help="Verwijder deze praktijk"):
-                    if data_layer.delete_practice(row['ID']):
-                        st.success(f"{row['Naam']} verwijderd.")
-                        st.rerun()
-                    else:
-                        st.error(f"Fout bij verwijderen van {row['Naam']}.")
-        
-        status_text = row['Status Tekst']
-        last_checked = row['Laatst gecontroleerd'] if row['Laatst gecontroleerd'] else "Nog niet gecontroleerd"
-        st.caption(f"{status_text} | Laatst gecontroleerd: {last_checked}")
-        st.divider()
\ No newline at end of file
+    for practice_id in practice_ids:
+        practice_row(practice_id)
+
+metrics.observe('page_render_seconds', time.perf_counter() - render_started, page='practices')
+profiler.stop_rerun()
@@ -1,17 +1,22 @@
 import streamlit as st
+import time
 
 # Import modules
-from modules.auth_service import AuthService
-from modules.data_layer import DataLayer
+from modules.services import get_services
+from modules.metrics import metrics
+from modules.profiler import profiler
 
-# Initialize services
-@st.cache_resource
-def initialize_services():
-    data_layer = DataLayer()
-    auth_service = AuthService(data_layer)
-    return data_layer, auth_service
+render_started = time.perf_counter()
+profiler.start_rerun('settings')
+
+# Initialize services, shared by all pages
+data_layer, auth_service, website_checker = get_services()
 
-data_layer, auth_service = initialize_services()
+@st.cache_resource
+def initialize_page_snapshots():
+    # Only the admin section reads the snapshots
+    from modules.page_snapshots import PageSnapshotStore
+    return PageSnapshotStore()
 
 # Page config
 st.set_page_config(
@@ -24,6 +29,7 @@ st.set_page_config(
 if 'user' not in st.session_state or not st.session_state.user:
     st.warning("Je bent niet ingelogd. Ga terug naar de hoofdpagina om in te loggen.")
     st.page_link("/", label="Terug naar inloggen", icon="🏠")
+    profiler.stop_rerun()
     st.stop()
 
 # Page title
@@ -110,4 +116,156 @@ if user.get('isAdmin', False):
         # In a real application, this would save to environment variables or secure storage
         st.session_state['apps_script_url'] = apps_script_url
         st.session_state['spreadsheet_id'] = spreadsheet_id
-        st.success("Systeeminstellingen opgeslagen!")
\ No newline at end of file
+        st.success("Systeeminstellingen opgeslagen!")
+    st.divider()
+    st.write("**Controlehistorie**")
+    st.caption("Voegt in het tabblad van de huidige maand opeenvolgende controles zonder statuswijziging samen tot één rij met firstSeen, lastSeen en count. Statuswijzigingen blijven volledig bewaard.")
+    if st.button("Controlehistorie comprimeren"):
+        with st.spinner("Comprimeren van de controlehistorie..."):
+            result = data_layer.compact_check_history()
+        st.success(
+            f"Controlehistorie gecomprimeerd: {result['rowsBefore']} → {result['rowsAfter']} rijen, "
+            f"{result['cellsBefore']} → {result['cellsAfter']} cellen ({result['reduction']:.0%} kleiner)."
+        )
+    
+    st.write("**Archief**")
+    st.caption("Controles en logs worden per maand in een eigen tabblad opgeslagen. Afgesloten maanden worden gecomprimeerd naar de archiefmap en uit de spreadsheet verwijderd.")
+    if st.button("Afgesloten maanden archiveren"):
+        with st.spinner("Archiveren van afgesloten maanden..."):
+            result = data_layer.archive_partitions()
+        if not result:
+            st.info("Geen spreadsheet verbonden, er is niets te archiveren.")
+        for sheet_key, sheet_result in result.items():
+            archived = ', '.join(f"{p['partition']} ({p['rows']} rijen)" for p in sheet_result['archived']) or 'geen'
+            st.success(
+                f"{data_layer.sheet_names[sheet_key]}: {sheet_result['migrated']} rijen naar maandtabbladen verplaatst, "
+                f"gearchiveerd: {archived}."
+            )
+    
+    st.write("**Datacache**")
+    st.caption("De zoekindex en de feed van statuswijzigingen worden periodiek als snapshot op schijf bewaard. Na een herstart worden ze uit de snapshot geladen en worden alleen de rijen gelezen die sindsdien zijn toegevoegd.")
+    cache_stats = data_layer.cache_stats
+    if cache_stats:
+        source = "snapshot" if cache_stats['source'] == 'snapshot' else "Google Sheets"
+        st.write(
+            f"Klaar na de start in {cache_stats['readySeconds']:.1f} s, geladen uit {source} "
+            f"({cache_stats['rowsRead']} praktijkrijen gelezen)."
+        )
+    if data_layer.cache_snapshot.saved_at:
+        st.write(f"Laatste snapshot: {data_layer.cache_snapshot.saved_at}")
+    if st.button("Snapshot nu opslaan"):
+        size = data_layer.cache_snapshot.save()
+        if size:
+            st.success(f"Snapshot opgeslagen ({size / 2**20:.1f} MB).")
+        else:
+            st.info("Geen nieuwe gegevens om op te slaan.")
+    
+    st.write("**Praktijktellers**")
+    st.caption("Het aantal praktijken per status wordt per gebruiker en in totaal bijgehouden bij elke nieuwe, verwijderde of gewijzigde praktijk, zodat de tegels op de startpagina en het dashboard niet alle praktijken hoeven te tellen. Wijzigingen buiten de app om worden elk uur rechtgezet door opnieuw te tellen (PRACTICE_COUNTERS_RECONCILE_INTERVAL).")
+    practice_counters = data_layer.get_practice_counters()
+    counter_totals = practice_counters.get()
+    st.write(
+        f"{counter_totals['total']} praktijken: {counter_totals['ACCEPTING']} open, "
+        f"{counter_totals['NOT_ACCEPTING']} gesloten en {counter_totals['UNKNOWN']} onbekend."
+    )
+    counter_users = practice_counters.users()
+    if counter_users:
+        st.dataframe(
+            [
+                {
+                    'Gebruiker': user_id,
+                    'Praktijken': counts['total'],
+                    'Open': counts['ACCEPTING'],
+                    'Gesloten': counts['NOT_ACCEPTING'],
+                    'Onbekend': counts['UNKNOWN']
+                }
+                for user_id, counts in sorted(counter_users.items(), key=lambda item: -item[1]['total'])
+            ],
+            hide_index=True
+        )
+    if practice_counters.last_reconciliation:
+        st.write(f"Laatste afstemming: {practice_counters.last_reconciliation['drift']} afwijkingen rechtgezet.")
+    if st.button("Tellers nu afstemmen"):
+        with st.spinner("Opnieuw tellen van alle praktijken..."):
+            result = data_layer.reconcile_practice_counters()
+        if result['drift']:
+            st.warning(f"{result['drift']} afwijkingen rechtgezet na het tellen van {result['practices']} praktijken.")
+        else:
+            st.success(f"Tellers kloppen met alle {result['practices']} praktijken.")
+    
+    st.write("**Paginasnapshots**")
+    st.caption("Van elke controle wordt de geanalyseerde tekst van de website lokaal bewaard (PAGE_SNAPSHOT_DB_PATH). Per praktijk wordt één basisversie gecomprimeerd opgeslagen en elke volgende versie als verschil daarmee; een ongewijzigde pagina kost alleen een verwijzing.")
+    page_snapshots = initialize_page_snapshots()
+    snapshot_stats = page_snapshots.stats()
+    if snapshot_stats['versions']:
+        st.write(
+            f"{snapshot_stats['versions']} versies van {snapshot_stats['practices']} praktijken, "
+            f"{snapshot_stats['storedBytes'] / 1024:.1f} kB opgeslagen voor {snapshot_stats['pageBytes'] / 1024:.1f} kB tekst "
+            f"({snapshot_stats['storedBytes'] / snapshot_stats['versions']:.0f} bytes per controle)."
+        )
+    snapshot_practice_id = st.text_input("Praktijk-ID", key="snapshot_practice_id")
+    if snapshot_practice_id:
+        snapshot_versions = page_snapshots.versions(snapshot_practice_id)
+        if not snapshot_versions:
+            st.info("Geen snapshots voor deze praktijk.")
+        else:
+            snapshot_timestamp = st.selectbox(
+                "Versie",
+                [version['timestamp'] for version in snapshot_versions],
+                format_func=lambda timestamp: timestamp[:19].replace('T', ' ')
+            )
+            st.text_area("Geanalyseerde tekst", page_snapshots.get(snapshot_practice_id, snapshot_timestamp), height=200, disabled=True)
+    
+    st.write("**Metrieken**")
+    st.caption("Looptijden en tellers van de bridge naar het Apps Script, de DataLayer, de websitecontroles en het renderen van pagina's. Zet METRICS_ENABLED=true om ze te verzamelen; met METRICS_PORT worden ze ook in Prometheus-formaat aangeboden op /metrics.")
+    if not metrics.enabled:
+        st.info("Metrieken staan uit.")
+    else:
+        counters, histograms = metrics.summary()
+        if histograms:
+            st.dataframe(histograms, hide_index=True, use_container_width=True, column_config={
+                name: st.column_config.NumberColumn(format="%.4g") for name in ('mean', 'p50', 'p95', 'p99')
+            })
+        if counters:
+            st.dataframe(counters, hide_index=True, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Prometheus-export downloaden",
+                data=metrics.render_prometheus(),
+                file_name="metrics.txt",
+                mime="text/plain"
+            )
+        with col2:
+            if st.button("Metrieken wissen"):
+                metrics.reset()
+                st.rerun()
+    
+    st.write("**Profiling**")
+    st.caption(f"Als profiling aan staat, wordt elke rerun van een pagina en elke controle van alle websites van een gebruiker met cProfile geprofileerd. De profielen worden als .prof-bestand in {profiler.directory} bewaard (de laatste {profiler.keep}) en zijn te openen met pstats, snakeviz of flameprof.")
+    profiler.enabled = st.toggle("Profiling aan", value=profiler.enabled)
+    profiles = profiler.list_profiles()
+    if profiles:
+        st.dataframe(
+            [{
+                'profiel': p['name'],
+                'soort': p['kind'],
+                'voor': p['target'],
+                'seconden': p['seconds'],
+                'sessies': p['sessions'],
+                'praktijken': p['practices']
+            } for p in profiles],
+            hide_index=True,
+            use_container_width=True,
+            column_config={'seconden': st.column_config.NumberColumn(format="%.3f")}
+        )
+        selected = st.selectbox("Profiel bekijken", [p['name'] for p in profiles])
+        with open(profiler.profile_path(selected), 'rb') as file:
+            st.download_button("Profiel downloaden (.prof)", data=file.read(), file_name=f"{selected}.prof")
+        with st.expander("Functies met de hoogste cumulatieve tijd"):
+            st.code(profiler.format_stats(selected), language=None)
+    else:
+        st.info("Nog geen profielen opgeslagen.")
+
+metrics.observe('page_render_seconds', time.perf_counter() - render_started, page='settings')
+profiler.stop_rerun()